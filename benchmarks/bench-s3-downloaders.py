@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the Runpod network volume downloaders in ../s3-api-downloader.
+
+Starts an in-process S3 stand-in (s3_standin.py), fills it with a synthetic
+volume and drives each downloader through one full cycle against it. Each
+downloader runs in a fresh child process so its peak RSS can be measured.
+Results are printed and saved as JSON for regression tracking.
+
+Examples:
+    python benchmarks/bench-s3-downloaders.py
+    python benchmarks/bench-s3-downloaders.py --files 2000 --depth 2 --latency-ms 20 boto3
+    python benchmarks/bench-s3-downloaders.py --set DOWNLOAD_WORKERS=32 --label workers-32
+    python benchmarks/bench-s3-downloaders.py --max-gets 8 --label throttled
+"""
+
+import argparse
+import ast
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from s3_standin import S3StandIn
+
+DOWNLOADER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 's3-api-downloader')
+# Run name -> (downloader script, transport backend); 'asyncio' runs the asyncio engine
+DOWNLOADERS = {
+    'boto3': ('downloader_boto', 'boto3'),
+    'http': ('downloader_boto', 'http'),
+    'asyncio': ('downloader_boto', 'asyncio'),
+    'cli': ('downloader', 'cli'),
+}
+
+BUCKET = 'benchvolume'
+REMOTE_FOLDER = 'ComfyUI/output'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='benchmark the s3 downloaders against a local stand-in')
+    parser.add_argument('downloaders', nargs='*', default=list(DOWNLOADERS),
+                        help=f"downloaders to run (default: {' '.join(DOWNLOADERS)})")
+    parser.add_argument('--files', type=int, default=300, help='number of files in the volume')
+    parser.add_argument('--sizes', choices=['fixed', 'uniform', 'lognormal'], default='lognormal',
+                        help='file size distribution')
+    parser.add_argument('--min-size', type=int, default=4 * 1024, help='smallest file in bytes')
+    parser.add_argument('--max-size', type=int, default=8 * 1024 * 1024, help='largest file in bytes')
+    parser.add_argument('--median-size', type=int, default=256 * 1024,
+                        help='median file size in bytes (fixed and lognormal)')
+    parser.add_argument('--depth', type=int, default=1, help='folder levels below the remote folder')
+    parser.add_argument('--fanout', type=int, default=4, help='subfolders per folder')
+    parser.add_argument('--latency-ms', type=float, default=0, help='latency added to every request')
+    parser.add_argument('--max-gets', type=int, default=0,
+                        help='object GETs served at once before the stand-in answers 503 SlowDown')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the synthetic volume')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='override a downloader setting, e.g. DOWNLOAD_WORKERS=16 (repeatable)')
+    parser.add_argument('--label', default='local', help='label stored with the results')
+    parser.add_argument('--output', help='results file (default: bench-s3-downloaders-<label>-<time>.json)')
+    return parser.parse_args()
+
+
+def generate_volume(args):
+    """
+    Build the synthetic volume.
+
+    Returns:
+        dict: Object key mapped to its body
+    """
+    rng = random.Random(args.seed)
+    # Same bytes as Random.randbytes(), which needs Python 3.9
+    block = rng.getrandbits(8 * args.max_size).to_bytes(args.max_size, 'little') if args.max_size else b''
+
+    folders = ['']
+    for _ in range(args.depth):
+        folders = [f"{folder}job_{index:03d}/" for folder in folders for index in range(args.fanout)]
+
+    objects = {}
+    for index in range(args.files):
+        if args.sizes == 'fixed':
+            size = args.median_size
+        elif args.sizes == 'uniform':
+            size = rng.randint(args.min_size, args.max_size)
+        else:
+            size = int(rng.lognormvariate(0, 1.0) * args.median_size)
+        size = min(max(size, args.min_size), args.max_size)
+
+        key = f"{REMOTE_FOLDER}/{folders[index % len(folders)]}ComfyUI_{index:05d}_.mp4"
+        # Prefix with the key so every object has its own content and ETag
+        offset = rng.randrange(0, max(1, args.max_size - size + 1))
+        objects[key] = (key.encode() + block[offset:offset + size])[:size]
+    return objects
+
+
+def peak_rss_mb(who):
+    """Peak resident set size of this process or its children, in MB."""
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_downloader(name, endpoint_url, local_dir, overrides, phase_done, continue_event):
+    """
+    Child process: list the volume once, then run one full download cycle.
+
+    Args:
+        name: Key of DOWNLOADERS
+        endpoint_url: Stand-in endpoint
+        local_dir: Download directory for this run
+        overrides: Dict of module settings to override
+        phase_done: Queue receiving ('listed', seconds, files) and the final result
+        continue_event: Event set by the parent once it has read the listing counters
+    """
+    sys.path.insert(0, DOWNLOADER_DIR)
+    from sync_engine import Settings, SyncEngine
+    from transports import create_transport
+
+    module_name, transport_name = DOWNLOADERS[name]
+    module = __import__(module_name)
+    module.ACCESS_KEY = 'bench'
+    module.SECRET_KEY = 'bench'
+    module.NETWORK_VOLUME_ID = BUCKET
+    module.DATACENTER = 'us-east-1'
+    module.ENDPOINT_URL = endpoint_url
+    module.REMOTE_FOLDER = REMOTE_FOLDER
+    module.LOCAL_DOWNLOAD_DIR = local_dir
+    if transport_name == 'asyncio':
+        module.ENGINE = 'asyncio'
+    else:
+        module.TRANSPORT = transport_name
+    module.JOURNAL_PATH = local_dir + '.journal.db'
+    settings = Settings(module, **overrides)
+
+    def create_engine():
+        if settings.ENGINE == 'asyncio':
+            from async_engine import AsyncEngine
+            return AsyncEngine(settings)
+        return SyncEngine(settings, transport)
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        transport = None if settings.ENGINE == 'asyncio' else create_transport(settings)
+
+        # Listing advances the delta watermarks, so the cycle gets its own engine
+        start = time.monotonic()
+        engine = create_engine()
+        listed = len(engine.list_remote_files())
+        engine.close()
+        phase_done.put(('listed', time.monotonic() - start, listed))
+        continue_event.wait()
+
+        engine = create_engine()
+        start = time.monotonic()
+        processed = engine.process_files()
+        elapsed = time.monotonic() - start
+        engine.close()
+
+    phase_done.put(('cycle', elapsed, processed, peak_rss_mb(resource.RUSAGE_SELF),
+                    peak_rss_mb(resource.RUSAGE_CHILDREN)))
+
+
+def available(name):
+    """Return None if a downloader can run here, or the reason it cannot."""
+    transport_name = DOWNLOADERS[name][1]
+    if transport_name == 'boto3':
+        try:
+            import boto3  # noqa: F401
+        except ImportError:
+            return 'boto3 not installed'
+    elif transport_name == 'cli' and shutil.which('aws') is None:
+        return 'aws cli not found'
+    return None
+
+
+def bench(name, server, objects, overrides):
+    """Run one downloader against a freshly seeded volume and return its result entry."""
+    reason = available(name)
+    if reason:
+        return {'downloader': name, 'skipped': reason}
+
+    for key in server.keys():
+        server.delete(key)
+    for key, data in objects.items():
+        server.put(key, data)
+    server.reset_counters()
+
+    context = multiprocessing.get_context('spawn')
+    phase_done = context.Queue()
+    continue_event = context.Event()
+    local_dir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    child = context.Process(
+        target=run_downloader,
+        args=(name, server.endpoint_url, local_dir, overrides, phase_done, continue_event)
+    )
+    child.start()
+    try:
+        _, list_time, listed = phase_done.get()
+        list_requests, _ = server.snapshot()
+        server.reset_counters()
+        continue_event.set()
+        _, cycle_time, processed, rss_mb, child_rss_mb = phase_done.get()
+        cycle_requests, bytes_sent = server.snapshot()
+    finally:
+        child.join()
+        shutil.rmtree(local_dir, ignore_errors=True)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(f"{local_dir}.journal.db{suffix}"):
+                os.remove(f"{local_dir}.journal.db{suffix}")
+
+    total_bytes = sum(len(data) for data in objects.values())
+    return {
+        'downloader': name,
+        'list': {
+            'seconds': round(list_time, 4),
+            'files': listed,
+            'requests': list_requests,
+        },
+        'cycle': {
+            'seconds': round(cycle_time, 4),
+            'processed': processed,
+            'remaining': len(server.keys()),
+            'files_per_s': round(processed / cycle_time, 2) if cycle_time else None,
+            'mb_per_s': round(total_bytes / (1024 * 1024) / cycle_time, 2) if cycle_time else None,
+            'bytes_sent': bytes_sent,
+            'requests': cycle_requests,
+            'request_count': sum(cycle_requests.values()),
+        },
+        'peak_rss_mb': round(rss_mb, 1),
+        'peak_child_rss_mb': round(child_rss_mb, 1),
+    }
+
+
+def main():
+    args = parse_args()
+    unknown = [name for name in args.downloaders if name not in DOWNLOADERS]
+    if unknown:
+        print(f"unknown downloader(s): {', '.join(unknown)}")
+        sys.exit(1)
+
+    overrides = {}
+    for setting in args.set:
+        name, _, value = setting.partition('=')
+        try:
+            overrides[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            overrides[name] = value
+
+    objects = generate_volume(args)
+    total_mb = sum(len(data) for data in objects.values()) / (1024 * 1024)
+    print(f"volume: {len(objects)} file(s), {total_mb:.1f} MB, depth {args.depth}, "
+          f"latency {args.latency_ms:g} ms" + (f", max {args.max_gets} GETs" if args.max_gets else ""))
+
+    server = S3StandIn(BUCKET, latency=args.latency_ms / 1000, max_gets=args.max_gets)
+    server.start()
+    results = []
+    try:
+        for name in args.downloaders:
+            result = bench(name, server, objects, overrides)
+            results.append(result)
+            if 'skipped' in result:
+                print(f"{name}: skipped ({result['skipped']})")
+                continue
+            cycle = result['cycle']
+            print(f"{name}: list={result['list']['seconds']:.2f}s "
+                  f"cycle={cycle['seconds']:.2f}s files/s={cycle['files_per_s']} "
+                  f"MB/s={cycle['mb_per_s']} requests={cycle['request_count']} "
+                  f"remaining={cycle['remaining']} rss={result['peak_rss_mb']}MB "
+                  f"child_rss={result['peak_child_rss_mb']}MB")
+    finally:
+        server.stop()
+
+    output = args.output or f"bench-s3-downloaders-{args.label}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w') as results_file:
+        json.dump({
+            'label': args.label,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': {
+                'files': args.files,
+                'total_mb': round(total_mb, 2),
+                'sizes': args.sizes,
+                'min_size': args.min_size,
+                'max_size': args.max_size,
+                'median_size': args.median_size,
+                'depth': args.depth,
+                'fanout': args.fanout,
+                'latency_ms': args.latency_ms,
+                'max_gets': args.max_gets,
+                'seed': args.seed,
+                'overrides': overrides,
+            },
+            'results': results,
+        }, results_file, indent=2)
+    print(f"\nsaved results: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Listing completeness check for the Runpod network volume downloaders in ../s3-api-downloader.
+
+Seeds the S3 stand-in (s3_standin.py) with keys that sort right next to a
+subfolder ('run1/' next to 'run10', 'run1.png', 'run1-') and enough files to
+truncate every page, then lists the volume with each transport, both page by
+page and with key-range shards. Every seeded key must be listed exactly once.
+Exits with status 1 if a listing misses or repeats a key.
+
+Examples:
+    python benchmarks/check-s3-listing.py
+    python benchmarks/check-s3-listing.py --page-size 7 http
+"""
+
+import argparse
+import os
+import sys
+from contextlib import redirect_stdout
+
+from s3_standin import S3StandIn
+
+DOWNLOADER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 's3-api-downloader')
+TRANSPORTS = ('http', 'boto3', 'asyncio')
+
+BUCKET = 'checkvolume'
+REMOTE_FOLDER = 'ComfyUI/output'
+
+
+def seeded_keys():
+    """Return the keys of the check volume: siblings of subfolders, and fillers on every side of them."""
+    keys = []
+    for folder in ('run1', 'run2', 'a'):
+        keys += [f"{REMOTE_FOLDER}/{folder}/ComfyUI_{index:05d}_.png" for index in range(12)]
+        keys += [f"{REMOTE_FOLDER}/{folder}{suffix}" for suffix in ('0', '00', '.png', '-', '0/x.png')]
+    keys += [f"{REMOTE_FOLDER}/ComfyUI_{index:05d}_.png" for index in range(40)]
+    keys += [f"{REMOTE_FOLDER}/z{index:03d}.png" for index in range(40)]
+    return keys
+
+
+def list_keys(transport_name, endpoint_url, shard_workers):
+    """List the check volume with one transport and return the listed keys."""
+    sys.path.insert(0, DOWNLOADER_DIR)
+    import downloader_boto as module
+    from sync_engine import Settings, SyncEngine
+    from transports import create_transport
+
+    module.ACCESS_KEY = 'check'
+    module.SECRET_KEY = 'check'
+    module.NETWORK_VOLUME_ID = BUCKET
+    module.DATACENTER = 'us-east-1'
+    module.ENDPOINT_URL = endpoint_url
+    module.REMOTE_FOLDER = REMOTE_FOLDER
+    module.JOURNAL_PATH = ''
+    overrides = {'LIST_SHARD_WORKERS': shard_workers, 'DELTA_LISTING': False}
+    if transport_name == 'asyncio':
+        overrides['ENGINE'] = 'asyncio'
+    else:
+        overrides['TRANSPORT'] = transport_name
+    settings = Settings(module, **overrides)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        if settings.ENGINE == 'asyncio':
+            from async_engine import AsyncEngine
+            engine = AsyncEngine(settings)
+        else:
+            engine = SyncEngine(settings, create_transport(settings))
+        try:
+            return engine.list_remote_files()
+        finally:
+            engine.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='check that the downloaders list every key of the stand-in')
+    parser.add_argument('transports', nargs='*', default=list(TRANSPORTS),
+                        help=f"transports to check (default: {' '.join(TRANSPORTS)})")
+    parser.add_argument('--page-size', type=int, default=5, help='entries per listing page')
+    args = parser.parse_args()
+
+    expected = sorted(seeded_keys())
+    server = S3StandIn(BUCKET, page_size=args.page_size)
+    server.start()
+    failed = False
+    try:
+        for key in expected:
+            server.put(key, b'x')
+        for transport_name in args.transports:
+            if transport_name == 'boto3':
+                try:
+                    import boto3  # noqa: F401
+                except ImportError:
+                    print(f"{transport_name}: skipped (boto3 not installed)")
+                    continue
+            for shard_workers in (1, 8):
+                listed = list_keys(transport_name, server.endpoint_url, shard_workers)
+                missing = sorted(set(expected) - set(listed))
+                repeated = len(listed) - len(set(listed))
+                status = 'ok' if not missing and not repeated else 'FAILED'
+                failed = failed or status != 'ok'
+                print(f"{transport_name} ({shard_workers} shard worker(s)): {len(listed)} of {len(expected)} "
+                      f"key(s) listed, {len(missing)} missing, {repeated} repeated: {status}")
+                for key in missing:
+                    print(f"  missing: {key}")
+    finally:
+        server.stop()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+"""
+In-process S3-compatible stand-in server for benchmarking the Runpod network volume downloaders.
+
+Implements the subset of the S3 API the downloaders use, with path-style addressing
+and no signature checks: ListObjectsV2 (Prefix, Delimiter, StartAfter, MaxKeys,
+ContinuationToken), HeadBucket, HeadObject, GetObject (Range, If-Match),
+DeleteObject and DeleteObjects. Objects live in memory. Every request can be
+delayed by a fixed latency, and requests are counted per operation. With
+max_gets set, object GETs beyond that many in flight are refused with
+503 SlowDown, like a throttling endpoint. With page_size set, listings return
+at most that many entries per page, so small volumes exercise pagination.
+
+Usage:
+    server = S3StandIn('volume', latency=0.02)
+    server.start()
+    server.put('ComfyUI/output/ComfyUI_00001_.mp4', b'...')
+    # endpoint: server.endpoint_url
+    server.stop()
+"""
+
+import base64
+import bisect
+import hashlib
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+S3_NAMESPACE = 'http://s3.amazonaws.com/doc/2006-03-01/'
+LAST_MODIFIED = '2025-01-01T00:00:00.000Z'
+
+
+class StandInHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that accepts bursts of new connections like a real endpoint."""
+
+    # The socketserver default of 5 drops connections when a client opens many at once
+    request_queue_size = 1024
+
+
+class S3StandIn:
+    """Single-bucket, in-memory S3 stand-in served from a background thread."""
+
+    def __init__(self, bucket, latency=0.0, host='127.0.0.1', port=0, max_gets=0, page_size=1000):
+        """
+        Args:
+            bucket: Bucket name (the network volume ID the downloaders use)
+            latency: Seconds added to every request
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free port)
+            max_gets: Object GETs served at once before answering 503 SlowDown (0 = unlimited)
+            page_size: Most entries returned per listing page (S3 returns up to 1000)
+        """
+        self.bucket = bucket
+        self.latency = latency
+        self.max_gets = max_gets
+        self.page_size = page_size
+        self.active_gets = 0
+        self.lock = threading.Lock()
+        self.objects = {}  # key -> (data, etag)
+        self.sorted_keys = []
+        self.counters = {}
+        self.bytes_sent = 0
+        self.httpd = StandInHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def endpoint_url(self):
+        """URL to pass as the downloaders' ENDPOINT_URL."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Start serving in a background thread."""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def put(self, key, data, etag=None):
+        """
+        Store an object.
+
+        Args:
+            key: Object key
+            data: Object body (bytes)
+            etag: ETag to report (defaults to the MD5 of the body)
+        """
+        etag = etag or hashlib.md5(data).hexdigest()
+        with self.lock:
+            if key not in self.objects:
+                bisect.insort(self.sorted_keys, key)
+            self.objects[key] = (data, etag)
+
+    def delete(self, key):
+        """Remove an object if it exists."""
+        with self.lock:
+            if self.objects.pop(key, None) is not None:
+                del self.sorted_keys[bisect.bisect_left(self.sorted_keys, key)]
+
+    def keys(self):
+        """Return all keys in sorted order."""
+        with self.lock:
+            return list(self.sorted_keys)
+
+    def reset_counters(self):
+        """Reset the request and byte counters."""
+        with self.lock:
+            self.counters = {}
+            self.bytes_sent = 0
+
+    def snapshot(self):
+        """Return a copy of the request counters and the bytes sent so far."""
+        with self.lock:
+            return dict(self.counters), self.bytes_sent
+
+    def _count(self, operation, sent=0):
+        with self.lock:
+            self.counters[operation] = self.counters.get(operation, 0) + 1
+            self.bytes_sent += sent
+
+    def list_objects(self, prefix, delimiter, start_after, max_keys, skip_prefix=None):
+        """
+        List keys the way ListObjectsV2 does.
+
+        Args:
+            skip_prefix: Common prefix a continuation token ended on; its keys are skipped
+
+        Returns:
+            tuple: (list of (key, size, etag), list of common prefixes, truncated flag,
+                    last returned key or prefix)
+        """
+        contents = []
+        prefixes = []
+        with self.lock:
+            index = bisect.bisect_right(self.sorted_keys, start_after) if start_after else 0
+            if skip_prefix:
+                # The first key after the whole common prefix, which may equal its successor string
+                index = max(index, bisect.bisect_left(
+                    self.sorted_keys, skip_prefix[:-1] + chr(ord(skip_prefix[-1]) + 1)))
+            index = max(index, bisect.bisect_left(self.sorted_keys, prefix))
+            while index < len(self.sorted_keys):
+                key = self.sorted_keys[index]
+                if not key.startswith(prefix):
+                    break
+                if len(contents) + len(prefixes) >= max_keys:
+                    last = max([entry[0] for entry in contents] + prefixes)
+                    return contents, prefixes, True, last
+                rest = key[len(prefix):]
+                if delimiter and delimiter in rest:
+                    common = prefix + rest[:rest.index(delimiter) + len(delimiter)]
+                    if not prefixes or prefixes[-1] != common:
+                        prefixes.append(common)
+                    # Skip the rest of this common prefix
+                    index = bisect.bisect_left(
+                        self.sorted_keys, common[:-1] + chr(ord(common[-1]) + 1))
+                    continue
+                data, etag = self.objects[key]
+                contents.append((key, len(data), etag))
+                index += 1
+        return contents, prefixes, False, None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _parse(self):
+                parts = urlsplit(self.path)
+                path = unquote(parts.path).lstrip('/')
+                bucket, _, key = path.partition('/')
+                query = {name: values[0] for name, values in parse_qs(parts.query, keep_blank_values=True).items()}
+                return bucket, key, query
+
+            def _send(self, status, body=b'', headers=None, operation=None, content_length=None):
+                if server.latency:
+                    time.sleep(server.latency)
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                # HEAD responses report the object's length without sending a body
+                self.send_header('Content-Length', str(len(body) if content_length is None else content_length))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+                if operation:
+                    server._count(operation, len(body) if self.command != 'HEAD' else 0)
+
+            def _error(self, status, code, operation):
+                body = (f'<?xml version="1.0" encoding="UTF-8"?>'
+                        f'<Error><Code>{code}</Code><Message>{code}</Message></Error>').encode()
+                self._send(status, body, {'Content-Type': 'application/xml'}, operation)
+
+            def _read_body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(length) if length else b''
+
+            def do_HEAD(self):
+                bucket, key, _ = self._parse()
+                if bucket != server.bucket:
+                    return self._send(404, operation='HeadBucket' if not key else 'HeadObject')
+                if not key:
+                    return self._send(200, operation='HeadBucket')
+                with server.lock:
+                    entry = server.objects.get(key)
+                if entry is None:
+                    return self._send(404, operation='HeadObject')
+                data, etag = entry
+                self._send(200, b'', self._object_headers(etag), 'HeadObject', content_length=len(data))
+
+            def _object_headers(self, etag):
+                return {
+                    'ETag': f'"{etag}"',
+                    'Last-Modified': formatdate(1735689600, usegmt=True),
+                    'Content-Type': 'application/octet-stream',
+                    'Accept-Ranges': 'bytes',
+                }
+
+            def do_GET(self):
+                bucket, key, query = self._parse()
+                if bucket != server.bucket:
+                    return self._error(404, 'NoSuchBucket', 'ListObjectsV2' if not key else 'GetObject')
+                if not key:
+                    return self._list(query)
+                with server.lock:
+                    entry = server.objects.get(key)
+                if entry is None:
+                    return self._error(404, 'NoSuchKey', 'GetObject')
+                data, etag = entry
+                with server.lock:
+                    throttled = server.max_gets and server.active_gets >= server.max_gets
+                    if not throttled:
+                        server.active_gets += 1
+                if throttled:
+                    return self._error(503, 'SlowDown', 'Throttled')
+                try:
+                    self._get_object(data, etag)
+                finally:
+                    with server.lock:
+                        server.active_gets -= 1
+
+            def _get_object(self, data, etag):
+                if_match = self.headers.get('If-Match')
+                if if_match and if_match.strip('"') != etag:
+                    return self._error(412, 'PreconditionFailed', 'GetObject')
+                headers = self._object_headers(etag)
+                byte_range = self.headers.get('Range')
+                if byte_range and byte_range.startswith('bytes='):
+                    start_text, _, end_text = byte_range[len('bytes='):].partition('-')
+                    if start_text:
+                        start = int(start_text)
+                        end = min(int(end_text), len(data) - 1) if end_text else len(data) - 1
+                    else:
+                        start = max(len(data) - int(end_text), 0)
+                        end = len(data) - 1
+                    headers['Content-Range'] = f'bytes {start}-{end}/{len(data)}'
+                    return self._send(206, data[start:end + 1], headers, 'GetObject')
+                self._send(200, data, headers, 'GetObject')
+
+            def _list(self, query):
+                prefix = query.get('prefix', '')
+                delimiter = query.get('delimiter', '')
+                max_keys = min(int(query.get('max-keys') or 1000), 1000, server.page_size)
+                start_after = query.get('start-after', '')
+                token = query.get('continuation-token')
+                skip_prefix = None
+                if token:
+                    resume = base64.urlsafe_b64decode(token.encode()).decode()
+                    if delimiter and resume.endswith(delimiter):
+                        # Continue after the whole common prefix
+                        skip_prefix = resume
+                    else:
+                        start_after = max(start_after, resume)
+                contents, prefixes, truncated, last = server.list_objects(prefix, delimiter, start_after, max_keys,
+                                                                          skip_prefix)
+                parts = [
+                    '<?xml version="1.0" encoding="UTF-8"?>',
+                    f'<ListBucketResult xmlns="{S3_NAMESPACE}">',
+                    f'<Name>{escape(server.bucket)}</Name>',
+                    f'<Prefix>{escape(prefix)}</Prefix>',
+                    f'<KeyCount>{len(contents) + len(prefixes)}</KeyCount>',
+                    f'<MaxKeys>{max_keys}</MaxKeys>',
+                    f'<IsTruncated>{"true" if truncated else "false"}</IsTruncated>',
+                ]
+                if delimiter:
+                    parts.append(f'<Delimiter>{escape(delimiter)}</Delimiter>')
+                if start_after and not token:
+                    parts.append(f'<StartAfter>{escape(start_after)}</StartAfter>')
+                if truncated:
+                    next_token = base64.urlsafe_b64encode(last.encode()).decode()
+                    parts.append(f'<NextContinuationToken>{next_token}</NextContinuationToken>')
+                for key, size, etag in contents:
+                    parts.append(
+                        f'<Contents><Key>{escape(key)}</Key><LastModified>{LAST_MODIFIED}</LastModified>'
+                        f'<ETag>&quot;{etag}&quot;</ETag><Size>{size}</Size>'
+                        f'<StorageClass>STANDARD</StorageClass></Contents>'
+                    )
+                for common in prefixes:
+                    parts.append(f'<CommonPrefixes><Prefix>{escape(common)}</Prefix></CommonPrefixes>')
+                parts.append('</ListBucketResult>')
+                self._send(200, ''.join(parts).encode(), {'Content-Type': 'application/xml'}, 'ListObjectsV2')
+
+            def do_DELETE(self):
+                bucket, key, _ = self._parse()
+                self._read_body()
+                if bucket != server.bucket:
+                    return self._error(404, 'NoSuchBucket', 'DeleteObject')
+                server.delete(key)
+                self._send(204, operation='DeleteObject')
+
+            def do_POST(self):
+                bucket, _, query = self._parse()
+                body = self._read_body()
+                if bucket != server.bucket:
+                    return self._error(404, 'NoSuchBucket', 'DeleteObjects')
+                if 'delete' not in query:
+                    return self._error(501, 'NotImplemented', 'Unsupported')
+                root = ElementTree.fromstring(body)
+                namespace = root.tag[:root.tag.index('}') + 1] if root.tag.startswith('{') else ''
+                quiet = (root.findtext(f'{namespace}Quiet') or '').lower() == 'true'
+                parts = ['<?xml version="1.0" encoding="UTF-8"?>', f'<DeleteResult xmlns="{S3_NAMESPACE}">']
+                for obj in root.findall(f'{namespace}Object'):
+                    key = obj.findtext(f'{namespace}Key')
+                    server.delete(key)
+                    if not quiet:
+                        parts.append(f'<Deleted><Key>{escape(key)}</Key></Deleted>')
+                parts.append('</DeleteResult>')
+                self._send(200, ''.join(parts).encode(), {'Content-Type': 'application/xml'}, 'DeleteObjects')
+
+        return Handler
+
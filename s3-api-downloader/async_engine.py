@@ -0,0 +1,925 @@
+"""
+asyncio engine for the Runpod network volume downloaders (ENGINE = 'asyncio').
+
+A drop-in alternative to the thread-based SyncEngine: listing, ranged GETs,
+streaming writes to disk and deletes all run as coroutines on one event loop,
+over a bounded pool of keep-alive HTTP/1.1 connections to the endpoint.
+Requests are signed with the same SigV4 signer as the 'http' transport, so no
+extra packages are needed. Hundreds of transfers can be in flight on a single
+core; ASYNC_MAX_CONNECTIONS caps the open connections and ASYNC_DOWNLOAD_TASKS
+the files processed at once.
+
+Scheduling, delta listing, filters, the journal and all reporting are shared
+with SyncEngine. Disk writes are issued directly from the loop in 1 MB chunks.
+"""
+
+import asyncio
+import os
+import ssl
+import time
+from contextlib import asynccontextmanager
+
+from concurrency import is_retryable, retry_delay
+from integrity import StreamChecksum, confirmed_part_size
+from sync_engine import (
+    CycleStats, DeleteBatcher, ListingStats, PartialDownload, PrefixListing, QueuedKeys, SyncEngine, key_midpoint,
+    report_missing_trigger
+)
+from transports import (
+    RequestCounter, SigV4Signer, TransportError, delete_request, error_code, list_query,
+    parse_delete_result, parse_list_page
+)
+
+# Seconds to wait for a connection to open, or for any read on it
+CONNECT_TIMEOUT = 30
+READ_TIMEOUT = 60
+
+CHUNK_SIZE = 1024 * 1024
+
+# Seconds between checks of the disk budget while downloads are paused,
+# and of the post-processing queue while it is full
+BUDGET_POLL_INTERVAL = 1
+POST_PROCESS_POLL_INTERVAL = 0.1
+
+
+class AsyncResponse:
+    """HTTP/1.1 response whose body is read from the connection on demand."""
+
+    def __init__(self, reader, method, status, headers):
+        """
+        Args:
+            reader: asyncio.StreamReader of the connection
+            method: Request method (HEAD responses have no body)
+            status: Status code
+            headers: Dict of lowercase header names to values
+        """
+        self.reader = reader
+        self.status = status
+        self.headers = headers
+        self.keep_alive = headers.get('connection', '').lower() != 'close'
+        self.chunked = 'chunked' in headers.get('transfer-encoding', '').lower()
+        self.remaining = None
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            self.remaining = 0
+        elif not self.chunked:
+            if 'content-length' in headers:
+                self.remaining = int(headers['content-length'])
+            else:
+                # Body ends when the server closes the connection
+                self.keep_alive = False
+        self.complete = self.remaining == 0
+
+    async def _read(self, coroutine):
+        """Await a read on the connection with READ_TIMEOUT."""
+        return await asyncio.wait_for(coroutine, READ_TIMEOUT)
+
+    async def iter_chunks(self, size=CHUNK_SIZE):
+        """
+        Yield the body in chunks of at most size bytes.
+
+        Raises:
+            ConnectionError: If the connection closes before the body is complete
+        """
+        if self.complete:
+            return
+        if self.chunked:
+            while True:
+                line = await self._read(self.reader.readline())
+                chunk_size = int(line.split(b';')[0].strip() or b'0', 16)
+                if chunk_size == 0:
+                    # Skip optional trailers up to the blank line
+                    while (await self._read(self.reader.readline())).strip():
+                        pass
+                    break
+                while chunk_size:
+                    data = await self._read(self.reader.read(min(size, chunk_size)))
+                    if not data:
+                        raise ConnectionResetError("connection closed inside a chunk")
+                    chunk_size -= len(data)
+                    yield data
+                await self._read(self.reader.readexactly(2))
+        elif self.remaining is None:
+            while True:
+                data = await self._read(self.reader.read(size))
+                if not data:
+                    break
+                yield data
+        else:
+            while self.remaining:
+                data = await self._read(self.reader.read(min(size, self.remaining)))
+                if not data:
+                    raise ConnectionResetError(f"connection closed with {self.remaining} byte(s) missing")
+                self.remaining -= len(data)
+                yield data
+        self.complete = True
+
+    async def read(self):
+        """Read and return the whole body."""
+        return b''.join([chunk async for chunk in self.iter_chunks()])
+
+
+async def read_response(reader, method):
+    """
+    Read a status line and headers from a connection.
+
+    Returns:
+        AsyncResponse: Response with its body unread
+
+    Raises:
+        ConnectionResetError: If the connection was closed before a response arrived
+    """
+    status_line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+    if not status_line:
+        raise ConnectionResetError("connection closed before the response")
+    parts = status_line.decode('latin-1').split(None, 2)
+    status = int(parts[1])
+    headers = {}
+    while True:
+        line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+        if not line.strip():
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return AsyncResponse(reader, method, status, headers)
+
+
+class PooledConnection:
+    """One open connection; reused is True once it has served a request."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reused = False
+
+
+class ConnectionPool:
+    """
+    Bounded pool of keep-alive connections to one endpoint.
+    At most max_connections are open or being opened at any time; callers
+    wait for a free slot. The most recently used idle connection is reused
+    first, so rarely used ones are the ones the server times out.
+    """
+
+    def __init__(self, host, port, ssl_context, max_connections):
+        """
+        Args:
+            host: Endpoint host name
+            port: Endpoint port
+            ssl_context: ssl.SSLContext for HTTPS, or None for plain HTTP
+            max_connections: Maximum open connections
+        """
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.slots = asyncio.Semaphore(max(1, max_connections))
+        self.idle = []
+
+    async def acquire(self, fresh=False):
+        """Take an idle connection (unless fresh) or open a new one once a slot is free."""
+        await self.slots.acquire()
+        try:
+            if self.idle and not fresh:
+                return self.idle.pop()
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=self.ssl_context,
+                                        server_hostname=self.host if self.ssl_context else None),
+                CONNECT_TIMEOUT
+            )
+            return PooledConnection(reader, writer)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, connection):
+        """Return a connection whose response was fully read."""
+        connection.reused = True
+        self.idle.append(connection)
+        self.slots.release()
+
+    def discard(self, connection):
+        """Close a connection that cannot be reused."""
+        connection.writer.close()
+        self.slots.release()
+
+    def put_back(self, connection, response):
+        """Release a connection if its response was read completely and may be kept alive, else discard it."""
+        if response.complete and response.keep_alive:
+            self.release(connection)
+        else:
+            self.discard(connection)
+
+    def close(self):
+        """Close every idle connection."""
+        for connection in self.idle:
+            connection.writer.close()
+        self.idle = []
+
+
+class AsyncS3Client(RequestCounter):
+    """SigV4-signed S3 requests for one network volume over a ConnectionPool."""
+
+    name = 'asyncio'
+    supports_ranges = True
+    supports_verify = True
+    supports_bulk = False
+
+    def __init__(self, settings):
+        """
+        Args:
+            settings: Settings with the volume, endpoint, credentials and ASYNC_MAX_CONNECTIONS
+        """
+        super().__init__()
+        self.settings = settings
+        self.signer = SigV4Signer(settings)
+        self.pool = None
+
+    def _pool(self):
+        """Return the connection pool, creating it on first use inside the event loop."""
+        if self.pool is None:
+            host, _, port = self.signer.host.partition(':')
+            secure = self.signer.secure
+            self.pool = ConnectionPool(
+                host, int(port or (443 if secure else 80)),
+                ssl.create_default_context() if secure else None,
+                self.settings.ASYNC_MAX_CONNECTIONS
+            )
+        return self.pool
+
+    @asynccontextmanager
+    async def request(self, operation, method, key='', query=None, headers=None, body=b''):
+        """
+        Send a signed request and yield the response with its body unread.
+        The connection goes back to the pool if the body was read completely.
+        A reused connection that turns out to be closed is retried once on a
+        new one.
+
+        Raises:
+            TransportError: If the request fails or returns an error status
+        """
+        pool = self._pool()
+        path = self.signer.path(key)
+        response = None
+        with self.timed(operation, key or (query or {}).get('prefix')):
+            for attempt in range(2):
+                request_headers = {name.lower(): value for name, value in (headers or {}).items()}
+                target = self.signer.sign(method, path, query or {}, request_headers, body)
+                if body:
+                    request_headers['content-length'] = str(len(body))
+                try:
+                    connection = await pool.acquire(fresh=attempt > 0)
+                except (OSError, asyncio.TimeoutError) as e:
+                    raise TransportError(f"{method} {path}: could not connect: {e}") from e
+                head = f"{method} {target} HTTP/1.1\r\n" + ''.join(
+                    f"{name}: {value}\r\n" for name, value in request_headers.items()) + "\r\n"
+                try:
+                    connection.writer.write(head.encode() + body)
+                    await connection.writer.drain()
+                    response = await read_response(connection.reader, method)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    pool.discard(connection)
+                    # The server may close an idle keep-alive connection; retry on a new one
+                    if attempt or not connection.reused:
+                        raise TransportError(f"{method} {path}: {e}") from e
+                except (OSError, asyncio.TimeoutError, ValueError) as e:
+                    pool.discard(connection)
+                    raise TransportError(f"{method} {path}: {e!r}") from e
+
+            if response.status >= 300:
+                try:
+                    code = error_code(response.status, await response.read())
+                finally:
+                    pool.put_back(connection, response)
+                raise TransportError(f"{method} {path} returned {response.status} ({code})", code)
+
+        try:
+            yield response
+        finally:
+            pool.put_back(connection, response)
+
+    async def head_bucket(self):
+        async with self.request('head', 'HEAD'):
+            pass
+
+    async def head_object(self, key):
+        async with self.request('head', 'HEAD', key) as response:
+            return int(response.headers.get('content-length') or 0), response.headers.get('etag')
+
+    async def first_part_size(self, key):
+        async with self.request('head', 'HEAD', key, query={'partNumber': '1'}) as response:
+            return int(response.headers.get('content-length') or 0) or None
+
+    async def list_page(self, prefix, start_after=None):
+        async with self.request('list', 'GET', query=list_query(prefix, start_after)) as response:
+            return parse_list_page(await response.read())
+
+    async def delete(self, key):
+        async with self.request('delete', 'DELETE', key) as response:
+            await response.read()
+
+    async def delete_many(self, keys):
+        body, headers = delete_request(keys)
+        async with self.request('delete', 'POST', query={'delete': ''}, headers=headers, body=body) as response:
+            return parse_delete_result(await response.read())
+
+    def close(self):
+        """Close the idle connections."""
+        if self.pool is not None:
+            self.pool.close()
+
+
+class AsyncDeleteBatcher(DeleteBatcher):
+    """DeleteBatcher whose batches are sent as tasks on the event loop instead of from threads."""
+
+    def __init__(self, client, settings, on_deleted, on_failed=None):
+        """
+        Args:
+            client: AsyncS3Client used for the removals
+            settings: Settings with the batch size, interval and attempts
+            on_deleted: Callable invoked with each key confirmed deleted
+            on_failed: Callable invoked with each key given up on, or None
+        """
+        self.transport = client
+        self.settings = settings
+        self.on_deleted = on_deleted
+        self.on_failed = on_failed
+        self.batch_size = min(max(1, settings.DELETE_BATCH_SIZE), 1000)
+        self.pending = []  # (key, attempts) tuples
+        self.retries = []  # (due time, key, attempts) tuples
+        self.oldest_time = None
+        self.tasks = set()
+        self.timer = asyncio.ensure_future(self._flush_on_interval())
+
+    def add(self, key, attempts=0):
+        """Queue a downloaded key for removal, sending the batch if it is full."""
+        if not self.pending:
+            self.oldest_time = time.monotonic()
+        self.pending.append((key, attempts))
+        if len(self.pending) >= self.batch_size:
+            self._send(self._take_batch())
+
+    async def close(self):
+        """Send every waiting key, waiting out the backoff of retries, and stop the timer."""
+        self.timer.cancel()
+        while self.pending or self.retries or self.tasks:
+            batch = self._take_batch() or self._take_retries()
+            if batch:
+                self._send(batch)
+            elif self.tasks:
+                await asyncio.gather(*list(self.tasks))
+            else:
+                await asyncio.sleep(max(0, min(due for due, _, _ in self.retries) - time.monotonic()))
+
+    def _send(self, batch):
+        """Start a task that deletes one batch."""
+        task = asyncio.ensure_future(self._delete_batch(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def _requeue(self, retries):
+        """Hold (due time, key, attempts) retries until the timer sends them."""
+        self.retries.extend(retries)
+
+    async def _flush_on_interval(self):
+        """Background task that sends batches older than DELETE_BATCH_INTERVAL and retries that are due."""
+        interval = max(0.1, self.settings.DELETE_BATCH_INTERVAL)
+        while True:
+            await asyncio.sleep(min(interval, 0.5))
+            if self.oldest_time is not None and time.monotonic() - self.oldest_time >= interval:
+                self._send(self._take_batch())
+            retries = self._take_retries()
+            if retries:
+                self._send(retries)
+
+    async def _delete_batch(self, batch):
+        """Send one multi-object delete and requeue every key not confirmed deleted."""
+        errors = {}
+        deleted = set()
+
+        try:
+            if len(batch) == 1:
+                key = batch[0][0]
+                await self.transport.delete(key)
+                deleted.add(key)
+            else:
+                deleted, errors = await self.transport.delete_many([key for key, _ in batch])
+        except TransportError as e:
+            errors = {key: str(e) for key, _ in batch}
+        except Exception as e:
+            errors = {key: f"unexpected error: {e}" for key, _ in batch}
+        self._settle(batch, deleted, errors)
+
+
+class AsyncEngine(SyncEngine):
+    """
+    SyncEngine whose cycles run as coroutines on a private event loop.
+    The loop (and with it the connection pool) lives as long as the engine,
+    so keep-alive connections are reused across cycles.
+    """
+
+    def __init__(self, settings):
+        """
+        Args:
+            settings: Settings for this volume
+        """
+        self.loop = asyncio.new_event_loop()
+        self.slot_freed = None
+        super().__init__(settings, AsyncS3Client(settings))
+
+    def worker_count(self):
+        """Number of files processed at once (the ceiling for adaptive concurrency)."""
+        return max(1, self.settings.ASYNC_DOWNLOAD_TASKS)
+
+    def close(self):
+        """Write and close the journal, close the connections and the event loop."""
+        super().close()
+        self.cancel_tasks()
+        self.transport.close()
+        self.loop.close()
+
+    def cancel_tasks(self):
+        """Cancel the tasks left behind by an interrupted cycle (e.g. Ctrl+C) and let them unwind."""
+        while True:
+            pending = asyncio.all_tasks(self.loop)
+            if not pending:
+                return
+            for task in pending:
+                task.cancel()
+            try:
+                self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            except KeyboardInterrupt:
+                # A task was waiting on a future that holds the original interrupt
+                pass
+
+    def check_bucket(self):
+        """Send a HeadBucket request for the network volume."""
+        self.loop.run_until_complete(self.transport.head_bucket())
+
+    def list_remote_files(self):
+        """
+        List all files in the remote folder recursively.
+
+        Returns:
+            list: List of file keys (paths)
+        """
+        async def collect():
+            return [obj['Key'] async for obj in self.iter_remote_files_async()]
+        return self.loop.run_until_complete(collect())
+
+    def process_files(self, objs=None):
+        """
+        Download and remove all files from the remote folder.
+
+        Args:
+            objs: Object entries to process instead of listing the folder, or None
+
+        Returns:
+            int: Number of files processed
+        """
+        return self.loop.run_until_complete(self.process_files_async(objs))
+
+    def describe_triggered(self, objs):
+        """Fill in the Size and ETag of triggered entries with concurrent HEAD requests."""
+        return self.loop.run_until_complete(self.describe_triggered_async(objs))
+
+    async def describe_triggered_async(self, objs):
+        """Coroutine behind describe_triggered(), for use on the running event loop."""
+        async def describe(obj):
+            try:
+                size, etag = await self.transport.head_object(obj['Key'])
+            except TransportError as e:
+                report_missing_trigger(obj['Key'], e)
+                return None
+            return dict(obj, Size=size, ETag=etag)
+
+        described = await asyncio.gather(*(describe(obj) for obj in objs))
+        return [obj for obj in described if obj is not None]
+
+    async def iter_remote_files_async(self):
+        """
+        Yield every file in the remote folder as soon as its folder is listed.
+        Up to LIST_WORKERS folders are listed at the same time.
+
+        Yields:
+            dict: Object entry from the listing (Key, Size, ETag)
+        """
+        prefix = self.root_prefix()
+        path_filter = self.path_filter()
+        listing_stats = ListingStats()
+        slots = asyncio.Semaphore(max(1, self.settings.LIST_WORKERS))
+        pending = {}
+
+        def queue_folder(folder_prefix):
+            for current, start_after in self.folders_to_list(folder_prefix, prefix, listing_stats, path_filter):
+                task = asyncio.ensure_future(self.list_prefix_level_async(current, start_after, slots))
+                pending[task] = (current, start_after)
+
+        start_time = time.monotonic()
+        queue_folder(prefix)
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    listed_prefix, start_after = pending.pop(task)
+                    listing = task.result()
+                    # Queue subdirectories as soon as their parent is known
+                    for subdir_prefix in self.record_level(listing_stats, listed_prefix, start_after, listing):
+                        queue_folder(subdir_prefix)
+                    for obj in self.accepted_files(listing_stats, listing, prefix, path_filter):
+                        yield obj
+        finally:
+            for task in pending:
+                task.cancel()
+        self.report_listing(listing_stats, time.monotonic() - start_time, path_filter)
+
+    async def list_prefix_level_async(self, prefix, start_after, slots):
+        """
+        List a single level of a prefix; large folders continue as parallel key ranges.
+
+        Args:
+            prefix: S3 prefix (folder path) to list
+            start_after: Only list keys that sort after this key, or None for all
+            slots: Semaphore limiting concurrent folder listings
+
+        Returns:
+            PrefixListing: Files and subfolders of the folder, or None on error
+        """
+        try:
+            async with slots:
+                response = await self.transport.list_page(prefix, start_after)
+        except Exception as e:
+            self.report_list_error(prefix, e)
+            return None
+
+        listing = PrefixListing()
+        next_start = listing.add_page(response, prefix)
+        if next_start is not None:
+            await self.list_prefix_shards_async(prefix, listing, next_start)
+            listing.finish_large(prefix)
+        return listing
+
+    async def list_prefix_shards_async(self, prefix, listing, start_after):
+        """
+        List the rest of a large folder as key ranges, LIST_SHARD_WORKERS at a time,
+        splitting a range at its midpoint key whenever it returns a full page.
+
+        Args:
+            prefix: S3 prefix (folder path) to list
+            listing: PrefixListing to merge the pages into
+            start_after: Key after which the unlisted part of the folder starts
+        """
+        slots = asyncio.Semaphore(max(1, self.settings.LIST_SHARD_WORKERS))
+        pending = {}
+
+        async def list_range(low):
+            async with slots:
+                return await self.transport.list_page(prefix, low)
+
+        def queue_range(low, high):
+            # Ranges are (low, high]; keys are split relative to the folder prefix
+            middle = key_midpoint(low[len(prefix):], high[len(prefix):] if high else None)
+            bounds = [low, high] if middle is None else [low, prefix + middle, high]
+            for range_low, range_high in zip(bounds, bounds[1:]):
+                pending[asyncio.ensure_future(list_range(range_low))] = (range_low, range_high)
+
+        queue_range(start_after, None)
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                low, high = pending.pop(task)
+                try:
+                    response = task.result()
+                except Exception as e:
+                    print(f"✗ Error listing prefix '{prefix}' after '{low}': {e}")
+                    listing.complete = False
+                    continue
+                next_start = listing.add_page(response, prefix, high)
+                if next_start is not None:
+                    queue_range(next_start, high)
+
+    async def download_file_async(self, remote_path, local_path, size=None, etag=None, stats=None):
+        """
+        Download a file, as parallel byte ranges if it is at least LARGE_FILE_THRESHOLD bytes,
+        retrying failures within the cycle (see SyncEngine.download_file).
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        settings = self.settings
+        attempts = max(1, settings.RETRY_ATTEMPTS)
+        for attempt in range(attempts):
+            error, verified = await self.attempt_download_async(remote_path, local_path, size, etag)
+            if self.record_download_result(remote_path, error, verified, stats):
+                return True
+            if attempt + 1 == attempts or not is_retryable(error):
+                return False
+            delay = retry_delay(attempt, settings.RETRY_BASE_DELAY, settings.RETRY_MAX_DELAY)
+            print(f"  ↻ Retrying {remote_path} in {delay:.1f}s (attempt {attempt + 2}/{attempts})")
+            if stats is not None:
+                stats.record_retry()
+            await asyncio.sleep(delay)
+        return False
+
+    async def attempt_download_async(self, remote_path, local_path, size=None, etag=None):
+        """
+        Download a file once, holding room in the disk budget and an adaptive
+        concurrency slot if enabled.
+
+        Returns:
+            tuple: (the error the download failed with or None on success,
+                    True if the content was verified against the ETag)
+        """
+        disk_budget = self.disk_budget
+        if disk_budget is not None:
+            while not disk_budget.try_acquire(size):
+                await asyncio.sleep(BUDGET_POLL_INTERVAL)
+        concurrency = self.concurrency
+        if concurrency is not None:
+            if self.slot_freed is None:
+                self.slot_freed = asyncio.Event()
+            while not concurrency.try_acquire():
+                self.slot_freed.clear()
+                await self.slot_freed.wait()
+        start_time = time.monotonic()
+        error = None
+        verified = False
+        try:
+            # Create local directory if it doesn't exist
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+            part_size = None
+            if self.needs_part_size(size, etag):
+                try:
+                    part_size = confirmed_part_size(etag, size, await self.transport.first_part_size(remote_path))
+                except TransportError:
+                    pass
+            ranged, range_size = self.ranged_part_size(size, etag, part_size)
+            if ranged:
+                verified = await self.download_large_file_async(remote_path, local_path, size, etag, range_size,
+                                                                confirmed=part_size is not None)
+            else:
+                checksum = StreamChecksum(remote_path, etag, size, part_size) if self.verify else None
+                await self.download_small_file_async(remote_path, local_path, checksum)
+                verified = checksum is not None and checksum.verified
+
+        except Exception as e:
+            error = e
+        finally:
+            if concurrency is not None:
+                concurrency.release(time.monotonic() - start_time, size, error)
+                self.slot_freed.set()
+            if disk_budget is not None:
+                disk_budget.release(size, [local_path] if error is None else ())
+        return error, verified
+
+    async def traced_chunks(self, response, key):
+        """Yield the body of a response chunk by chunk, recording each read as a 'body' span."""
+        chunks = response.iter_chunks()
+        while True:
+            with self.tracer.span('body', 'transfer', key):
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    return
+            yield chunk
+
+    async def download_small_file_async(self, remote_path, local_path, checksum=None):
+        """
+        Stream an object into a temporary file and rename it into place,
+        feeding every chunk to checksum (see integrity.py) if given.
+        """
+        temp_path = local_path + '.download'
+        try:
+            async with self.transport.request('get', 'GET', remote_path) as response:
+                with open(temp_path, 'wb') as local_file:
+                    async for chunk in self.traced_chunks(response, remote_path):
+                        with self.tracer.span('write', 'transfer', remote_path):
+                            local_file.write(chunk)
+                        if checksum is not None:
+                            checksum.update(chunk)
+            if checksum is not None:
+                checksum.verify()
+            os.replace(temp_path, local_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    async def download_large_file_async(self, remote_path, local_path, size, etag, part_size=None, confirmed=False):
+        """
+        Fetch a large file as concurrent byte ranges into a resumable temporary file
+        (see PartialDownload), PART_WORKERS ranges at a time.
+
+        Returns:
+            bool: True if the parts were verified against the ETag (see SyncEngine.download_large_file)
+        """
+        part_workers = max(1, self.settings.PART_WORKERS)
+        partial = PartialDownload(local_path, size, etag, part_size or self.settings.PART_SIZE,
+                                  verify=part_size is not None, confirmed=confirmed)
+        partial.report(part_workers)
+        slots = asyncio.Semaphore(part_workers)
+
+        async def fetch_part(index):
+            start, end = partial.part_range(index)
+            headers = {'Range': f"bytes={start}-{end}"}
+            if etag:
+                headers['If-Match'] = etag
+            async with slots:
+                async with self.transport.request('get', 'GET', remote_path, headers=headers) as response:
+                    with open(partial.temp_path, 'r+b') as temp_file:
+                        temp_file.seek(start)
+                        async for chunk in self.traced_chunks(response, remote_path):
+                            with self.tracer.span('write', 'transfer', remote_path):
+                                temp_file.write(chunk)
+                            partial.add_written(index, chunk)
+            partial.mark_done(index)
+
+        tasks = [asyncio.ensure_future(fetch_part(index)) for index in partial.missing]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return partial.finish(remote_path)
+
+    async def process_file_async(self, obj, stats, delete_batcher=None):
+        """
+        Download a single file and remove it from the network volume (see SyncEngine.process_file).
+
+        Args:
+            obj: Object entry from the listing (Key, Size, ETag)
+            stats: CycleStats for this cycle
+            delete_batcher: AsyncDeleteBatcher, or None to remove the file right away
+        """
+        remote_path = obj['Key']
+        size = obj.get('Size')
+        etag = obj.get('ETag')
+        journal = self.journal
+        local_path = os.path.join(self.settings.LOCAL_DOWNLOAD_DIR, remote_path)
+
+        print(f"\nProcessing: {remote_path}")
+
+        if self.already_downloaded(obj):
+            print(f"  ✓ Already downloaded (journal): {remote_path}")
+        elif self.link_duplicate(obj, local_path, stats):
+            await self.post_process_async(obj, local_path)
+        else:
+            if journal is not None:
+                journal.record(remote_path, 'downloading', etag, size)
+            if not await self.download_file_async(remote_path, local_path, size, etag, stats):
+                print(f"  ⚠ Skipping removal due to download failure: {remote_path}")
+                stats.record_failure(remote_path)
+                return
+            self.record_downloaded(obj, local_path, stats)
+            await self.post_process_async(obj, local_path)
+
+        # Only remove if download was successful
+        await self.finish_file_async(obj, stats, delete_batcher)
+
+    async def post_process_async(self, obj, local_path):
+        """Hand a file to the post-processing hooks, if any, waiting while the stage is full."""
+        post_processor = self.post_processor
+        if post_processor is not None:
+            while not post_processor.try_submit(local_path, obj):
+                await asyncio.sleep(POST_PROCESS_POLL_INTERVAL)
+
+    async def finish_file_async(self, obj, stats, delete_batcher=None):
+        """Remove a downloaded file right away, or queue it for batch removal (see SyncEngine.finish_file)."""
+        remote_path = obj['Key']
+        if delete_batcher is not None:
+            delete_batcher.add(remote_path)
+            return
+        try:
+            await self.transport.delete(remote_path)
+            print(f"  ✓ Removed: {remote_path}")
+            stats.record_removed(remote_path)
+        except Exception as e:
+            print(f"  ✗ Failed to remove {remote_path}: {e}")
+            print(f"  ⚠ File downloaded but not removed from remote: {remote_path}")
+            stats.record_failure(remote_path)
+
+    async def download_worker_async(self, work_queue, stats, delete_batcher, queued_keys=None):
+        """Take object entries from the queue and process them until a None sentinel arrives."""
+        while True:
+            obj = await work_queue.get()
+            if obj is None:
+                return
+            try:
+                if self.still_owned(obj):
+                    with self.tracer.span('file', 'engine', obj['Key']):
+                        await self.process_file_async(obj, stats, delete_batcher)
+            finally:
+                if queued_keys is not None:
+                    queued_keys.release(obj['Key'])
+
+    async def feed_triggers_async(self, work_queue, stats, queued_keys, listing_done):
+        """
+        Queue keys announced through the trigger endpoint into the running cycle
+        until its listing ends (see SyncEngine.feed_triggers). The blocking wait
+        for keys runs in the default executor so it does not stall the loop.
+        """
+        while not listing_done.is_set():
+            keys = await self.loop.run_in_executor(None, self.triggers.wait, 1.0)
+            if not keys:
+                continue
+            print(f"  Triggered: {len(keys)} key(s), joining the running cycle")
+            try:
+                objs = await self.describe_triggered_async(self.select_triggered(keys))
+            except Exception as e:
+                print(f"  ✗ Error checking triggered keys, leaving them to the listing: {e}")
+                continue
+            for obj in objs:
+                if queued_keys.claim(obj['Key'], triggered=True):
+                    self.record_queued(obj, stats)
+                    await work_queue.put(obj)
+
+    async def iter_owned_files_async(self):
+        """Yield the listed files this instance is responsible for (see SyncEngine.iter_owned_files)."""
+        if self.fleet is None:
+            async for obj in self.iter_remote_files_async():
+                yield obj
+            return
+        self.check_fleet()
+        skipped_count = 0
+        async for obj in self.iter_remote_files_async():
+            if self.fleet.owns(obj['Key']):
+                yield obj
+            else:
+                skipped_count += 1
+        self.report_fleet(skipped_count)
+
+    async def iter_objects_async(self, objs):
+        """Yield given object entries, in place of iter_remote_files_async()."""
+        for obj in objs:
+            yield obj
+
+    async def process_files_async(self, objs=None):
+        """
+        Download and remove all files from the remote folder, or only the
+        given object entries (see SyncEngine.process_files).
+        Listed keys go into a bounded queue drained by ASYNC_DOWNLOAD_TASKS
+        coroutines, so transfers start while listing is still running.
+
+        Args:
+            objs: Object entries to process instead of listing the folder, or None
+
+        Returns:
+            int: Number of files processed
+        """
+        settings = self.settings
+        journal = self.journal
+        metrics = self.metrics
+        stats = CycleStats(journal, self.watermarks, metrics)
+        delete_batcher = None
+        if settings.DELETE_BATCH_SIZE > 1:
+            delete_batcher = AsyncDeleteBatcher(self.transport, settings, stats.record_removed,
+                                                stats.record_failure)
+        task_count = self.worker_count()
+        work_queue = asyncio.Queue(maxsize=max(1, settings.DOWNLOAD_QUEUE_SIZE))
+        self.work_queue = work_queue
+        queued_keys = None
+        if self.triggers is not None and objs is None:
+            queued_keys = QueuedKeys()
+            listing_done = asyncio.Event()
+
+        self.transport.take_counts()
+        if metrics is not None and objs is None:
+            metrics.cycle_started()
+        self.tracer.begin_cycle()
+        start_time = time.monotonic()
+        workers = [
+            asyncio.ensure_future(self.download_worker_async(work_queue, stats, delete_batcher, queued_keys))
+            for _ in range(task_count)
+        ]
+        feeder = None
+        if queued_keys is not None:
+            feeder = asyncio.ensure_future(self.feed_triggers_async(work_queue, stats, queued_keys, listing_done))
+        try:
+            source = self.iter_owned_files_async() if objs is None else self.iter_objects_async(objs)
+            async for obj in source:
+                # Skip files a trigger already queued
+                if queued_keys is not None and not queued_keys.claim(obj['Key']):
+                    continue
+                self.record_queued(obj, stats)
+                # Waits while the queue is full, which pauses listing
+                await work_queue.put(obj)
+        finally:
+            if feeder is not None:
+                listing_done.set()
+                self.triggers.wake()
+                await feeder
+            for _ in workers:
+                await work_queue.put(None)
+            await asyncio.gather(*workers)
+            if delete_batcher is not None:
+                await delete_batcher.close()
+            if journal is not None:
+                journal.flush()
+        elapsed = max(time.monotonic() - start_time, 1e-6)
+
+        self.report_transfer(stats, elapsed, task_count)
+        self.prune_dedup_store()
+        self.tracer.end_cycle()
+
+        return stats.processed_count
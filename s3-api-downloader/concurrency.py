@@ -0,0 +1,230 @@
+"""
+Adaptive download concurrency and retry delays for the Runpod network volume downloaders.
+
+AdaptiveConcurrency is an AIMD (additive increase, multiplicative decrease)
+controller for the number of downloads in flight:
+
+- Starting from MIN_CONCURRENCY, every healthy download raises the limit by one
+  (doubling it per round trip) until the first cut; after that the limit grows
+  by one per full window of downloads
+- A throttling response (503 / SlowDown) halves the limit
+- Download latency rising above LATENCY_TOLERANCE times its best recent level
+  trims the limit by 10%
+
+At most one cut is made per window of downloads, since everything in flight
+when the endpoint pushes back reports the same congestion. Failed downloads are
+retried within the cycle after retry_delay(), an exponential backoff with full jitter.
+
+FairShare splits a fixed number of slots (listing requests or downloads)
+between the volumes of the multi-volume daemon (see multi_volume.py).
+"""
+
+import random
+import threading
+
+# Error codes (or HTTP statuses) the endpoint uses to ask clients to slow down
+THROTTLE_CODES = {'503', '429', 'SlowDown', 'ServiceUnavailable', 'Throttling', 'ThrottlingException',
+                  'RequestLimitExceeded', 'TooManyRequests'}
+
+# Errors that will not go away by retrying within the cycle
+PERMANENT_CODES = {'404', 'NoSuchKey', '403', 'AccessDenied', '412', 'PreconditionFailed'}
+
+THROTTLE_DECREASE = 0.5
+LATENCY_DECREASE = 0.9
+
+# Weight of a new sample in the latency average, and how fast the best level
+# is allowed to creep up (so a lasting change of file sizes is learned)
+LATENCY_SMOOTHING = 0.1
+BASELINE_DRIFT = 0.001
+
+# Samples averaged before latency is compared with the baseline
+LATENCY_MIN_SAMPLES = 20
+
+
+def is_throttle(error):
+    """Return True if an exception is the endpoint throttling requests."""
+    return getattr(error, 'code', None) in THROTTLE_CODES
+
+
+def is_retryable(error):
+    """Return True if a failed download is worth retrying within the cycle."""
+    return getattr(error, 'code', None) not in PERMANENT_CODES
+
+
+def retry_delay(attempt, base_delay, max_delay):
+    """
+    Seconds to wait before a retry: uniform between 0 and base_delay * 2**attempt,
+    capped at max_delay ("full jitter", so throttled workers do not retry in lockstep).
+
+    Args:
+        attempt: Number of failed attempts so far, starting at 0
+        base_delay: Upper bound of the first delay in seconds
+        max_delay: Upper bound of any delay in seconds
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on concurrent downloads, shared by all workers of an engine.
+    Threads wait in acquire(); event loop code polls try_acquire() instead.
+    Every acquired slot is given back with release(), which also feeds the
+    outcome of the download into the controller.
+    """
+
+    def __init__(self, settings, max_limit):
+        """
+        Args:
+            settings: Settings with MIN_CONCURRENCY and LATENCY_TOLERANCE
+            max_limit: Highest limit (the number of download workers or tasks)
+        """
+        self.max_limit = max(1, max_limit)
+        self.min_limit = min(max(1, settings.MIN_CONCURRENCY), self.max_limit)
+        self.latency_tolerance = settings.LATENCY_TOLERANCE
+        self.condition = threading.Condition()
+        self.limit = float(self.min_limit)
+        self.in_flight = 0
+        self.slow_start = True
+        self.completions = 0
+        self.next_cut = 0  # completions before another cut is allowed
+        self.latency = None  # smoothed seconds per download (per MB for large files)
+        self.latency_samples = 0
+        self.baseline = None  # best smoothed latency seen
+        self.throttled_count = 0
+        self.low = self.high = self.min_limit
+
+    def try_acquire(self):
+        """Take a download slot if one is free; returns True if taken."""
+        with self.condition:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def acquire(self):
+        """Block until a download slot is free and take it."""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, elapsed, size=None, error=None):
+        """
+        Give back a download slot and adjust the limit to the outcome.
+
+        Args:
+            elapsed: Seconds the download took
+            size: Bytes downloaded, if known
+            error: Exception the download failed with, or None on success
+        """
+        with self.condition:
+            # Only grow when the limit was actually what held downloads back
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self.completions += 1
+            if error is not None:
+                if is_throttle(error):
+                    self.throttled_count += 1
+                    self._cut(THROTTLE_DECREASE, f"endpoint throttling ({error.code})")
+            elif self._latency_rising(elapsed, size):
+                self._cut(LATENCY_DECREASE, "latency rising")
+            elif saturated:
+                self.limit = min(self.max_limit, self.limit + (1 if self.slow_start else 1 / self.limit))
+                self.high = max(self.high, int(self.limit))
+            self.condition.notify_all()
+
+    def take_cycle_stats(self):
+        """
+        Return and reset the numbers reported after each cycle.
+
+        Returns:
+            tuple: (current limit, lowest limit, highest limit, throttled responses)
+        """
+        with self.condition:
+            stats = (int(self.limit), self.low, self.high, self.throttled_count)
+            self.low = self.high = int(self.limit)
+            self.throttled_count = 0
+            return stats
+
+    def _latency_rising(self, elapsed, size):
+        """Add a latency sample; return True if the average is above LATENCY_TOLERANCE x baseline."""
+        # Large files are compared per MB so a big video does not look like congestion
+        sample = elapsed / max(1.0, (size or 0) / (1024 * 1024))
+        if self.latency is None:
+            self.latency = sample
+        else:
+            self.latency += LATENCY_SMOOTHING * (sample - self.latency)
+        self.latency_samples += 1
+        if self.latency_samples < LATENCY_MIN_SAMPLES:
+            return False
+        if self.baseline is None:
+            self.baseline = self.latency
+        self.baseline = min(self.latency, self.baseline * (1 + BASELINE_DRIFT))
+        return self.latency_tolerance > 0 and self.latency > self.latency_tolerance * self.baseline
+
+    def _cut(self, factor, reason):
+        """Multiply the limit by factor, at most once per window of downloads."""
+        if self.completions < self.next_cut:
+            return
+        previous = int(self.limit)
+        self.limit = max(float(self.min_limit), self.limit * factor)
+        self.slow_start = False
+        self.next_cut = self.completions + previous
+        # Relearn the latency average at the new level
+        self.latency = None
+        self.latency_samples = 0
+        self.low = min(self.low, int(self.limit))
+        if int(self.limit) != previous:
+            print(f"  ⚠ Concurrency {previous} -> {int(self.limit)}: {reason}")
+
+
+class FairShare:
+    """
+    Slots of one kind of work shared by several owners (the volumes of the
+    multi-volume daemon). An owner may use every free slot while the others
+    are idle; once slots run out, each freed slot goes to the waiting owner
+    holding the fewest, so a busy owner cannot starve the others.
+    """
+
+    def __init__(self, capacity):
+        """
+        Args:
+            capacity: Slots held at once by all owners together
+        """
+        self.capacity = max(1, capacity)
+        self.condition = threading.Condition()
+        self.in_use = 0
+        self.held = {}  # owner -> slots held
+        self.waiting = {}  # owner -> threads waiting for a slot
+
+    def acquire(self, owner):
+        """Block until owner is entitled to a free slot and take it."""
+        with self.condition:
+            self.waiting[owner] = self.waiting.get(owner, 0) + 1
+            try:
+                while not self._may_take(owner):
+                    self.condition.wait()
+            finally:
+                self.waiting[owner] -= 1
+                if not self.waiting[owner]:
+                    del self.waiting[owner]
+            self.held[owner] = self.held.get(owner, 0) + 1
+            self.in_use += 1
+
+    def release(self, owner):
+        """Give back a slot taken by owner."""
+        with self.condition:
+            self.held[owner] -= 1
+            self.in_use -= 1
+            self.condition.notify_all()
+
+    def held_by(self, owner):
+        """Return the number of slots owner holds."""
+        with self.condition:
+            return self.held.get(owner, 0)
+
+    def _may_take(self, owner):
+        """Return True if a slot is free and no waiting owner holds fewer than owner."""
+        if self.in_use >= self.capacity:
+            return False
+        return self.held.get(owner, 0) <= min(self.held.get(waiter, 0) for waiter in self.waiting)
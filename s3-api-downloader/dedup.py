@@ -0,0 +1,132 @@
+"""
+Content-addressed store of downloaded files for the Runpod network volume downloaders.
+
+With DEDUP_DIR set, every downloaded file is also hardlinked into DEDUP_DIR
+under a name made of its ETag and size. When a listed file has the ETag and
+size of a stored one (a re-emitted preview, a rerun with a fixed seed), its
+local copy is created as another hardlink instead of downloading the body;
+the remote file is then removed as usual.
+
+- DEDUP_DIR must be on the same filesystem as LOCAL_DOWNLOAD_DIR
+- Hardlinks share their content, so downloaded files must be replaced
+  (written to a new file), not edited in place
+- Stored files no longer linked from anywhere else are removed once their
+  last link changed more than DEDUP_RETENTION seconds ago
+"""
+
+import errno
+import os
+import re
+import threading
+import time
+
+# Seconds between scans of the store for entries to remove
+PRUNE_INTERVAL = 3600
+
+
+def entry_name(etag, size):
+    """
+    Return the store file name for an ETag and size, or None if either is unknown.
+    Multipart ETags ("<md5>-<parts>") are kept as they are, so two uploads
+    of the same bytes with different part sizes are stored twice.
+    """
+    if not etag or size is None:
+        return None
+    return f"{re.sub(r'[^0-9A-Za-z-]', '', etag)}-{size}"
+
+
+class DedupStore:
+    """Hardlink store of downloaded files, indexed by ETag and size."""
+
+    def __init__(self, settings):
+        """
+        Args:
+            settings: Settings with DEDUP_DIR and DEDUP_RETENTION
+        """
+        self.path = settings.DEDUP_DIR
+        self.retention = settings.DEDUP_RETENTION
+        self.lock = threading.Lock()
+        self.enabled = True
+        self.last_prune = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def entry_path(self, obj):
+        """Return the store path of a listed object, or None without ETag and size."""
+        name = entry_name(obj.get('ETag'), obj.get('Size'))
+        return os.path.join(self.path, name) if name else None
+
+    def link(self, obj, local_path):
+        """
+        Create local_path as a hardlink to a stored file with the same ETag and size.
+
+        Args:
+            obj: Object entry from the listing (Key, Size, ETag)
+            local_path: Local destination path
+
+        Returns:
+            bool: True if the local copy was created from the store
+        """
+        entry = self.entry_path(obj) if self.enabled else None
+        if entry is None:
+            return False
+        try:
+            if os.path.getsize(entry) != obj['Size']:
+                return False
+        except OSError:
+            return False
+        temp_path = local_path + '.link'
+        try:
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+            os.link(entry, temp_path)
+            os.replace(temp_path, local_path)
+            return True
+        except OSError as e:
+            print(f"  ⚠ Cannot link {local_path} from the dedup store: {e}")
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+            return False
+
+    def add(self, obj, local_path):
+        """Hardlink a downloaded file into the store, unless an entry already exists."""
+        entry = self.entry_path(obj) if self.enabled else None
+        if entry is None or os.path.exists(entry):
+            return
+        try:
+            os.link(local_path, entry)
+        except FileExistsError:
+            pass
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                # Checked on first use; a cross-device store can never be filled
+                self.enabled = False
+                print(f"  ⚠ Dedup store {self.path} is not on the filesystem of the downloads; dedup disabled")
+            else:
+                print(f"  ⚠ Cannot add {local_path} to the dedup store: {e}")
+
+    def prune(self):
+        """
+        Remove stored files that are no longer linked from the download
+        directory, at most once per PRUNE_INTERVAL.
+
+        Returns:
+            int: Number of entries removed
+        """
+        with self.lock:
+            now = time.time()
+            if now - self.last_prune < PRUNE_INTERVAL:
+                return 0
+            self.last_prune = now
+        removed = 0
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                try:
+                    info = entry.stat(follow_symlinks=False)
+                    # A link count change (file deleted or moved away) updates ctime
+                    if info.st_nlink <= 1 and now - info.st_ctime > self.retention:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
@@ -0,0 +1,274 @@
+"""
+Local disk budget for the Runpod network volume downloaders.
+
+With DISK_BUDGET set, the engine keeps LOCAL_DOWNLOAD_DIR within that many
+bytes instead of downloading until the disk is full:
+
+- Every download reserves its listed size before it starts, so the files in
+  flight count towards the budget along with the files already on disk
+- New downloads pause once the files on disk plus the reservations would go
+  over DISK_HIGH_WATERMARK of the budget, and resume when they drop below
+  DISK_LOW_WATERMARK; waiting downloads hold their worker, which in turn
+  pauses the listing, so nothing is relisted or retried while the disk is full
+- With DISK_EVICTION on (it is off by default), consumed files downloaded
+  more than DISK_MIN_RETENTION seconds ago are deleted oldest first while
+  downloads are paused, until usage is back below the low-water mark. A file
+  counts as consumed once the post-processing hooks finished it without an
+  error, or once a consumer created `<file>` + DISK_CONSUMED_SUFFIX next to
+  it; any other file is never evicted, however old
+
+Files on disk are tracked in an in-memory index: the download directory is
+scanned once at startup (leaving out the temporary and resume files of
+downloads in progress, and consumed markers), and afterwards every finished
+download is added to the index. Files found by the scan count towards the
+budget, but only their consumed markers make them evictable. While paused,
+the indexed files are checked again every few seconds (one stat per file, not
+a directory walk), so files that downstream consumers moved or deleted free
+their space. Files written into the directory by
+anything else are not seen until the next start.
+
+With DEDUP_DIR set, the store is not counted even if it lies inside the
+download directory, since its entries are hardlinks of downloaded files. An
+evicted file's store entry is removed along with it; otherwise the store
+would keep the evicted bytes on disk.
+
+A download larger than the room below the high-water mark still starts when
+no other download is in flight, so an oversized file cannot stall the engine
+forever; it then pauses the downloads after it. In bulk mode a whole folder
+chunk is one download, so usage can overshoot by up to one chunk.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds between checks of the indexed files while downloads are paused
+REFRESH_INTERVAL = 5
+
+# Files a download writes before its result is renamed into place: ranged
+# parts and their resume state, single-GET bodies, dedup links, JSON state
+TEMP_SUFFIXES = ('.part', '.part.json', '.download', '.link', '.tmp')
+
+
+def format_size(size):
+    """Format a byte count in MB, or GB from 10 GB up, for the log."""
+    if size >= 10 * 1024 ** 3:
+        return f"{size / 1024 ** 3:.0f} GB"
+    return f"{size / (1024 * 1024):.0f} MB"
+
+
+class DiskBudget:
+    """
+    Bytes used in the download directory and reserved by downloads in flight,
+    shared by all workers of an engine. Threads wait in acquire(); event loop
+    code polls try_acquire() instead. Every reservation is given back with
+    release(), which also indexes the files the download wrote.
+    """
+
+    def __init__(self, settings):
+        """
+        Args:
+            settings: Settings with LOCAL_DOWNLOAD_DIR, DISK_BUDGET, the
+                watermarks, the eviction policy, DISK_CONSUMED_SUFFIX and DEDUP_DIR
+        """
+        self.root = settings.LOCAL_DOWNLOAD_DIR
+        self.store = os.path.abspath(settings.DEDUP_DIR) if settings.DEDUP_DIR else None
+        self.budget = settings.DISK_BUDGET
+        self.high = int(self.budget * settings.DISK_HIGH_WATERMARK)
+        self.low = min(self.high, int(self.budget * settings.DISK_LOW_WATERMARK))
+        self.eviction = settings.DISK_EVICTION
+        self.min_retention = settings.DISK_MIN_RETENTION
+        self.consumed_suffix = settings.DISK_CONSUMED_SUFFIX
+        self.condition = threading.Condition()
+        self.files = OrderedDict()  # path -> (size, time added), oldest first
+        self.consumed = set()  # indexed paths the post-processing hooks finished
+        self.used = 0
+        self.reserved = 0
+        self.in_flight = 0
+        self.paused = False
+        self.last_refresh = 0
+        self.evicted_count = 0
+        self.evicted_bytes = 0
+        self.scan()
+
+    def scan(self):
+        """Index the files already in the download directory (outside the dedup store), oldest first."""
+        found = []
+        for directory, subdirectories, names in os.walk(self.root):
+            # Stored files are hardlinks of downloads; counting them would count those twice
+            subdirectories[:] = [name for name in subdirectories
+                                 if os.path.abspath(os.path.join(directory, name)) != self.store]
+            for name in names:
+                if name.endswith(TEMP_SUFFIXES) or (self.consumed_suffix and name.endswith(self.consumed_suffix)):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    status = os.stat(path)
+                except OSError:
+                    continue
+                found.append((status.st_mtime, path, status.st_size))
+        with self.condition:
+            for modified, path, size in sorted(found):
+                self.files[path] = (size, modified)
+                self.used += size
+
+    @property
+    def total(self):
+        """Bytes on disk plus bytes reserved by downloads in flight."""
+        return self.used + self.reserved
+
+    def try_acquire(self, size):
+        """
+        Reserve room for a download if the budget allows it.
+
+        Args:
+            size: Listed size of the file (None or 0 if unknown)
+
+        Returns:
+            bool: True if reserved; release() must follow
+        """
+        size = size or 0
+        with self.condition:
+            if self.paused:
+                if self.total > self.low:
+                    self._relieve()
+                if self.total > self.low:
+                    return False
+                self.paused = False
+                print(f"  ✓ Disk budget: resuming downloads "
+                      f"({format_size(self.total)} of {format_size(self.budget)})")
+            if self.in_flight and self.total + size > self.high:
+                self._pause()
+                return False
+            self.reserved += size
+            self.in_flight += 1
+            if self.total > self.high:
+                self._pause()
+            return True
+
+    def acquire(self, size):
+        """Block until the budget has room for a download and reserve it."""
+        with self.condition:
+            while not self.try_acquire(size):
+                self.condition.wait(REFRESH_INTERVAL)
+
+    def release(self, size, paths=()):
+        """
+        Give back the reservation of a download. The files it wrote are
+        indexed in the same step, so their bytes never go uncounted.
+
+        Args:
+            size: Size passed to acquire()
+            paths: Local paths of the files the download wrote (missing ones are skipped)
+        """
+        written = []
+        for path in paths:
+            try:
+                written.append((path, os.path.getsize(path)))
+            except OSError:
+                pass
+        with self.condition:
+            now = time.time()
+            for path, file_size in written:
+                previous = self.files.pop(path, None)
+                if previous is not None:
+                    self.used -= previous[0]
+                # A new download of the same path has not been consumed yet
+                self.consumed.discard(path)
+                self.files[path] = (file_size, now)
+                self.used += file_size
+            self.reserved -= size or 0
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def mark_consumed(self, path):
+        """Allow eviction of a downloaded file, e.g. once the post-processing hooks finished it."""
+        with self.condition:
+            if path in self.files:
+                self.consumed.add(path)
+
+    def is_consumed(self, path):
+        """True if a file was marked consumed or its consumer created the marker file. Caller holds the lock."""
+        return path in self.consumed or bool(self.consumed_suffix
+                                             and os.path.exists(path + self.consumed_suffix))
+
+    def _pause(self):
+        """Stop admitting downloads until usage drops below the low-water mark. Caller holds the lock."""
+        if not self.paused:
+            self.paused = True
+            print(f"  ⚠ Disk budget: {format_size(self.total)} of {format_size(self.budget)} in use, "
+                  f"pausing new downloads")
+            self._relieve()
+
+    def _relieve(self):
+        """
+        Drop indexed files that are gone (at most every REFRESH_INTERVAL seconds)
+        and evict old files down to the low-water mark. Caller holds the lock.
+        """
+        now = time.time()
+        if now - self.last_refresh >= REFRESH_INTERVAL:
+            self.last_refresh = now
+            for path, (size, added) in list(self.files.items()):
+                try:
+                    current = os.path.getsize(path)
+                except OSError:
+                    current = 0
+                if current != size:
+                    self.used += current - size
+                    if current:
+                        self.files[path] = (current, added)
+                    else:
+                        del self.files[path]
+                        self.consumed.discard(path)
+        if not self.eviction:
+            return
+        evicted = 0
+        freed = 0
+        stored = None
+        for path, (size, added) in list(self.files.items()):
+            if self.total <= self.low or now - added < self.min_retention:
+                break
+            if not self.is_consumed(path):
+                continue
+            del self.files[path]
+            self.consumed.discard(path)
+            self.used -= size
+            try:
+                status = os.stat(path)
+                if status.st_nlink > 1 and self.store is not None:
+                    if stored is None:
+                        stored = self._stored_files()
+                    entry = stored.pop((status.st_dev, status.st_ino), None)
+                    if entry is not None:
+                        os.remove(entry)
+                os.remove(path)
+                if self.consumed_suffix and os.path.exists(path + self.consumed_suffix):
+                    os.remove(path + self.consumed_suffix)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"  ⚠ Disk budget: could not evict {path}: {e}")
+                continue
+            evicted += 1
+            freed += size
+        if evicted:
+            self.evicted_count += evicted
+            self.evicted_bytes += freed
+            print(f"  ✓ Disk budget: evicted {evicted} consumed file(s) older than {self.min_retention}s, "
+                  f"freed {format_size(freed)}")
+
+    def _stored_files(self):
+        """Return the dedup store entries by (device, inode)."""
+        stored = {}
+        try:
+            with os.scandir(self.store) as entries:
+                for entry in entries:
+                    try:
+                        status = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    stored[(status.st_dev, status.st_ino)] = entry.path
+        except OSError:
+            pass
+        return stored
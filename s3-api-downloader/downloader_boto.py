@@ -2,15 +2,13 @@
 """
 Perpetual file downloader for Runpod network volumes using Boto3.
 Downloads all files from a remote folder and removes them after successful download.
-Uses Boto3 library instead of AWS CLI.
+Uses Boto3 library instead of AWS CLI by default; the sync logic lives in
+sync_engine.py and is shared with downloader.py.
 """
 
-import boto3
-from botocore.exceptions import ClientError
-import os
-import time
 import sys
-from pathlib import Path
+
+from sync_engine import Settings, run
 
 # Refer to https://docs.runpod.io/storage/s3-api for datacenters and endpoint URLs
 
@@ -20,297 +18,195 @@ NETWORK_VOLUME_ID = 'VOLUME_ID_HERE' # pulled from network volume page, e.g. jn6
 DATACENTER = 'us-ks-2' # e.g. us-ks-2; lowercase for Boto3. See docs page
 ENDPOINT_URL = 'https://s3api-us-ks-2.runpod.io/' # each DC has its own endpoint
 
+# Transport backend (see transports.py): 'boto3', 'http' (built-in SigV4 client),
+# 'cli' (AWS CLI), or 'auto' to time each available backend against the endpoint
+# at startup (PROBE_REQUESTS listings each) and use the fastest
+TRANSPORT = 'boto3'
+PROBE_REQUESTS = 3
+
+# Engine running each cycle: 'threads' (worker threads over TRANSPORT) or 'asyncio'
+# (see async_engine.py: one event loop with its own SigV4 client; TRANSPORT is ignored)
+ENGINE = 'threads'
+
+# asyncio engine only: files processed concurrently (the ceiling for adaptive
+# concurrency below, in place of DOWNLOAD_WORKERS), and the most keep-alive
+# connections open to the endpoint at once (requests wait for a free one)
+ASYNC_DOWNLOAD_TASKS = 256
+ASYNC_MAX_CONNECTIONS = 128
+
 # Remote folder to monitor (empty string means root of network volume)
 REMOTE_FOLDER = 'ComfyUI/output'  # Change this to monitor a specific folder
 
 # Local download directory
 LOCAL_DOWNLOAD_DIR = './downloads'
 
-# Check interval in seconds
-CHECK_INTERVAL = 30
+# Glob rules relative to REMOTE_FOLDER (see path_filters.py); excluded folders are never listed
+INCLUDE_PATTERNS = []  # e.g. ['*.mp4']; empty downloads every file
+EXCLUDE_PATTERNS = []  # e.g. ['temp', 'previews/**']
 
+# Check interval in seconds; with adaptive polling this is the longest wait when idle
+CHECK_INTERVAL = 30
 
-def create_s3_client():
-    """
-    Create and return a configured S3 client for Runpod.
-    
-    Returns:
-        boto3.client: Configured S3 client
-    """
-    try:
-        client = boto3.client(
-            's3',
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name=DATACENTER,
-            endpoint_url=ENDPOINT_URL
-        )
-        print("✓ S3 client created successfully")
-        return client
-    except Exception as e:
-        print(f"✗ Failed to create S3 client: {e}")
-        sys.exit(1)
-
-
-def list_remote_files(s3_client):
-    """
-    List all files in the remote folder recursively.
-    Uses delimiter-based listing to avoid Runpod pagination bug.
-    
-    Args:
-        s3_client: Boto3 S3 client
-        
-    Returns:
-        list: List of file keys (paths)
-    """
-    prefix = REMOTE_FOLDER.rstrip('/') + '/' if REMOTE_FOLDER else ''
-    return list_files_in_prefix(s3_client, prefix)
-
-
-def list_files_in_prefix(s3_client, prefix):
-    """
-    List files in a specific prefix using delimiter to avoid pagination issues.
-    Recursively processes subdirectories.
-    
-    Args:
-        s3_client: Boto3 S3 client
-        prefix: S3 prefix (folder path) to list
-        
-    Returns:
-        list: List of file keys (paths)
-    """
-    files = []
-    
-    try:
-        # Use delimiter to list one level at a time (avoids pagination bug)
-        response = s3_client.list_objects_v2(
-            Bucket=NETWORK_VOLUME_ID,
-            Prefix=prefix,
-            Delimiter='/'
-        )
-        
-        # Get files in current directory
-        if 'Contents' in response:
-            for obj in response['Contents']:
-                key = obj['Key']
-                # Skip the prefix itself and empty directories
-                if key != prefix and not key.endswith('/'):
-                    files.append(key)
-        
-        # Get subdirectories and recurse into them
-        if 'CommonPrefixes' in response:
-            for prefix_obj in response['CommonPrefixes']:
-                subdir_prefix = prefix_obj['Prefix']
-                # Recursively list files in subdirectory
-                subfiles = list_files_in_prefix(s3_client, subdir_prefix)
-                files.extend(subfiles)
-                
-    except ClientError as e:
-        error_code = e.response['Error']['Code']
-        if error_code == 'NoSuchBucket':
-            print(f"✗ Network volume '{NETWORK_VOLUME_ID}' not found")
-        else:
-            print(f"✗ Error listing prefix '{prefix}': {e}")
-    except Exception as e:
-        print(f"✗ Unexpected error listing prefix '{prefix}': {e}")
-    
-    return files
-
-
-def download_file(s3_client, remote_path, local_path):
-    """
-    Download a file from the network volume.
-    
-    Args:
-        s3_client: Boto3 S3 client
-        remote_path: Key (path) on the network volume
-        local_path: Local destination path
-        
-    Returns:
-        bool: True if successful, False otherwise
-    """
-    try:
-        # Create local directory if it doesn't exist
-        os.makedirs(os.path.dirname(local_path), exist_ok=True)
-        
-        # Download the file
-        s3_client.download_file(NETWORK_VOLUME_ID, remote_path, local_path)
-        print(f"  ✓ Downloaded: {remote_path}")
-        return True
-        
-    except ClientError as e:
-        print(f"  ✗ Failed to download {remote_path}: {e}")
-        return False
-    except Exception as e:
-        print(f"  ✗ Unexpected error downloading {remote_path}: {e}")
-        return False
-
-
-def remove_remote_file(s3_client, remote_path):
-    """
-    Remove a file from the network volume.
-    
-    Args:
-        s3_client: Boto3 S3 client
-        remote_path: Key (path) on the network volume
-        
-    Returns:
-        bool: True if successful, False otherwise
-    """
-    try:
-        s3_client.delete_object(Bucket=NETWORK_VOLUME_ID, Key=remote_path)
-        print(f"  ✓ Removed: {remote_path}")
-        return True
-        
-    except ClientError as e:
-        print(f"  ✗ Failed to remove {remote_path}: {e}")
-        return False
-    except Exception as e:
-        print(f"  ✗ Unexpected error removing {remote_path}: {e}")
-        return False
-
-
-def process_files(s3_client):
-    """
-    Download and remove all files from the remote folder.
-    
-    Args:
-        s3_client: Boto3 S3 client
-        
-    Returns:
-        int: Number of files processed
-    """
-    files = list_remote_files(s3_client)
-    
-    if not files:
-        return 0
-    
-    print(f"\nFound {len(files)} file(s) to process")
-    
-    processed_count = 0
-    for remote_path in files:
-        # Create local path maintaining directory structure
-        local_path = os.path.join(LOCAL_DOWNLOAD_DIR, remote_path)
-        
-        print(f"\nProcessing: {remote_path}")
-        
-        # Download the file
-        if download_file(s3_client, remote_path, local_path):
-            # Only remove if download was successful
-            if remove_remote_file(s3_client, remote_path):
-                processed_count += 1
-            else:
-                print(f"  ⚠ File downloaded but not removed from remote")
-        else:
-            print(f"  ⚠ Skipping removal due to download failure")
-    
-    return processed_count
-
-
-def test_connection(s3_client):
-    """
-    Test the connection to the network volume.
-    
-    Args:
-        s3_client: Boto3 S3 client
-        
-    Returns:
-        bool: True if connection successful
-    """
-    try:
-        # Try to list buckets to verify connection
-        s3_client.head_bucket(Bucket=NETWORK_VOLUME_ID)
-        print(f"✓ Successfully connected to network volume: {NETWORK_VOLUME_ID}")
-        return True
-    except ClientError as e:
-        error_code = e.response['Error']['Code']
-        if error_code == '404':
-            print(f"✗ Network volume '{NETWORK_VOLUME_ID}' not found")
-        elif error_code == '403':
-            print(f"✗ Access denied to network volume '{NETWORK_VOLUME_ID}'")
-            print("  Check your credentials and permissions")
-        else:
-            print(f"✗ Error connecting to network volume: {e}")
-        return False
-    except Exception as e:
-        print(f"✗ Unexpected error testing connection: {e}")
-        return False
-
-
-def check_boto3():
-    """Check if Boto3 is installed."""
-    try:
-        import boto3
-        print(f"✓ Boto3 found: version {boto3.__version__}")
-        return True
-    except ImportError:
-        print("✗ Boto3 not found. Please install it first:")
-        print("  pip install boto3")
-        return False
+# Adaptive polling checks again after MIN_CHECK_INTERVAL when a cycle found files and
+# doubles the wait (up to CHECK_INTERVAL) while idle. Folders that keep coming up
+# empty are relisted less often, up to every COLD_FOLDER_MAX_INTERVAL seconds.
+ADAPTIVE_POLLING = True
+MIN_CHECK_INTERVAL = 1
+COLD_FOLDER_MAX_INTERVAL = 300
+
+# Delta listing remembers the last key seen in each folder and only asks for keys
+# that sort after it (StartAfter), which suits ComfyUI's sequential file names.
+# Every folder is still fully relisted every FULL_RESCAN_INTERVAL seconds.
+DELTA_LISTING = True
+FULL_RESCAN_INTERVAL = 300
+
+# Files at least this large are fetched as concurrent byte ranges into a
+# resumable temporary file (0 disables ranged downloads)
+LARGE_FILE_THRESHOLD = 256 * 1024 * 1024
+
+# Size of each byte range and number of ranges fetched in parallel per large file
+PART_SIZE = 64 * 1024 * 1024
+PART_WORKERS = 8
+
+# Number of files downloaded (and removed) in parallel; 1 processes files one by one.
+# With adaptive concurrency this is the most downloads ever in flight.
+DOWNLOAD_WORKERS = 16
+
+# Adaptive concurrency (see concurrency.py) starts at MIN_CONCURRENCY downloads in
+# flight and raises the limit while downloads stay healthy. Throttling (503 SlowDown)
+# halves it; latency above LATENCY_TOLERANCE times its best level trims it.
+ADAPTIVE_CONCURRENCY = True
+MIN_CONCURRENCY = 2
+LATENCY_TOLERANCE = 3
+
+# Failed downloads are retried within the cycle up to RETRY_ATTEMPTS times in total,
+# waiting a random time up to RETRY_BASE_DELAY * 2^n seconds (at most RETRY_MAX_DELAY)
+RETRY_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 20
+
+# Number of folders listed in parallel while walking the remote folder
+LIST_WORKERS = 8
+
+# Folders with more than 1000 entries are listed as key ranges (StartAfter bounds,
+# no continuation tokens), up to this many ranges of one folder in parallel
+LIST_SHARD_WORKERS = 8
+
+# Maximum number of listed keys waiting for a download worker; listing pauses when full
+DOWNLOAD_QUEUE_SIZE = 1000
+
+# Remove downloaded files with multi-object DeleteObjects calls (max 1000 keys per call);
+# set to 1 to remove every file with its own DeleteObject call
+DELETE_BATCH_SIZE = 1000
+
+# Maximum seconds a downloaded file waits before its batch is removed
+DELETE_BATCH_INTERVAL = 5
+
+# Attempts per key before a failed batch removal is left for the next cycle
+DELETE_MAX_ATTEMPTS = 3
+
+# SQLite journal of each file's progress, so a restart skips finished downloads
+# and goes straight to removal (empty string disables the journal)
+JOURNAL_PATH = './sync-journal.db'
+
+# Journal updates are written in batches of this many, or at least this often (seconds)
+JOURNAL_BATCH_SIZE = 500
+JOURNAL_FLUSH_INTERVAL = 2
+
+# Serve Prometheus metrics at http://METRICS_HOST:METRICS_PORT/metrics (see metrics.py);
+# 0 disables the endpoint
+METRICS_PORT = 0
+METRICS_HOST = '127.0.0.1'
+
+# Write one Chrome trace per cycle to TRACE_DIR and print the TRACE_TOP_N
+# slowest spans (see tracing.py); '' disables tracing
+TRACE_DIR = ''
+TRACE_TOP_N = 10
+
+# Accept keys pushed by producers (POST /keys, see triggers.py) over HTTP on
+# TRIGGER_HOST:TRIGGER_PORT or over the Unix socket TRIGGER_SOCKET, and fetch
+# them right away; polling continues as a sweep for anything missed.
+# 0 / '' disable the endpoint
+TRIGGER_PORT = 0
+TRIGGER_HOST = '127.0.0.1'
+TRIGGER_SOCKET = ''
+
+# Keep a hardlink of every downloaded file in DEDUP_DIR, named by ETag and
+# size, and create later files with the same ETag and size as hardlinks
+# instead of downloading them (see dedup.py). Must be on the filesystem of
+# LOCAL_DOWNLOAD_DIR; '' disables the store
+DEDUP_DIR = ''
+DEDUP_RETENTION = 7 * 24 * 3600  # keep unlinked entries this many seconds
+
+# Hash every download while it streams to disk and compare it with the
+# object's ETag (MD5, or per-part MD5s for multipart uploads) before the
+# remote file is removed; a mismatch keeps the file on the volume and retries
+# it (see integrity.py). Not available with the 'cli' transport
+VERIFY_DOWNLOADS = True
+
+# Split the volume's keys with the other instances that share FLEET_DIR, by
+# consistent hashing over the live members (see fleet.py), so several hosts
+# can sync one volume without downloading a file twice. Each instance writes a
+# heartbeat every FLEET_HEARTBEAT_INTERVAL seconds; one silent for
+# FLEET_MEMBER_TIMEOUT seconds is dropped and its keys move to the others,
+# which wait FLEET_HANDOFF_DELAY seconds before taking over a moved key so the
+# previous owner can finish it. FLEET_DIR must be reachable by every instance
+# (a local directory for instances on one host, else a shared mount); ''
+# disables fleet mode
+FLEET_DIR = ''
+FLEET_MEMBER_ID = ''  # defaults to <hostname>-<pid>
+FLEET_HEARTBEAT_INTERVAL = 5
+FLEET_MEMBER_TIMEOUT = 30
+FLEET_HANDOFF_DELAY = 30
+
+# Relay mode: instead of downloading to LOCAL_DOWNLOAD_DIR, stream every file
+# into a bucket on a second S3-compatible endpoint and remove it from the
+# volume once the copy is complete and verified; nothing is written to disk.
+# Files larger than RELAY_PART_SIZE (at least 5 MB) use a multipart upload
+# with at most RELAY_WINDOW parts of a file uploading at a time, so each
+# download worker holds at most RELAY_WINDOW + 1 parts in memory. The relay
+# credentials default to ACCESS_KEY / SECRET_KEY; RELAY_TRANSPORT is 'http'
+# or 'boto3' (the source TRANSPORT must be one of them too); '' disables relay mode
+RELAY_ENDPOINT_URL = ''
+RELAY_BUCKET = ''
+RELAY_ACCESS_KEY = ''
+RELAY_SECRET_KEY = ''
+RELAY_REGION = 'us-east-1'
+RELAY_PREFIX = ''  # prepended to every relayed key
+RELAY_TRANSPORT = 'http'
+RELAY_PART_SIZE = 16 * 1024 * 1024
+RELAY_WINDOW = 4
+
+# Disk budget for LOCAL_DOWNLOAD_DIR in bytes (0 = unlimited). Downloads in
+# flight reserve their size; new downloads pause once the files on disk plus
+# the reservations exceed DISK_HIGH_WATERMARK of the budget and resume below
+# DISK_LOW_WATERMARK, so a full disk pauses the sync instead of failing every
+# download. With DISK_EVICTION on, consumed files downloaded more than
+# DISK_MIN_RETENTION seconds ago are deleted (oldest first) while paused. A
+# file is consumed once the post-processing hooks finished it, or once a
+# consumer created <file> + DISK_CONSUMED_SUFFIX next to it; no other file is
+# ever evicted (the remote copy is gone, so eviction cannot be undone)
+DISK_BUDGET = 0
+DISK_HIGH_WATERMARK = 0.9
+DISK_LOW_WATERMARK = 0.8
+DISK_EVICTION = False
+DISK_MIN_RETENTION = 3600
+DISK_CONSUMED_SUFFIX = '.consumed'
+
+# Post-processing hooks run on every downloaded file in a pool of
+# POST_PROCESS_WORKERS processes, overlapping with the next downloads. Each
+# hook is a top-level function hook(local_path, obj) or a 'module:function'
+# string; obj is the listing entry (Key, Size, ETag), and a returned path is
+# what the next hook receives (e.g. after a move). Downloads wait while
+# POST_PROCESS_QUEUE_SIZE files are queued; [] disables post-processing
+POST_PROCESS_HOOKS = []
+POST_PROCESS_WORKERS = 4
+POST_PROCESS_QUEUE_SIZE = 100
 
 
 def main():
     """Main loop that continuously monitors and downloads files."""
-    print("=" * 60)
-    print("Runpod Network Volume File Downloader (Boto3)")
-    print("=" * 60)
-    print(f"Network Volume: {NETWORK_VOLUME_ID}")
-    print(f"Datacenter: {DATACENTER}")
-    print(f"Endpoint: {ENDPOINT_URL}")
-    print(f"Remote folder: {REMOTE_FOLDER or '(root)'}")
-    print(f"Local directory: {LOCAL_DOWNLOAD_DIR}")
-    print(f"Check interval: {CHECK_INTERVAL}s")
-    print("=" * 60)
-    
-    # Check prerequisites
-    if not check_boto3():
-        sys.exit(1)
-    
-    # Create S3 client
-    s3_client = create_s3_client()
-    
-    # Test connection
-    if not test_connection(s3_client):
-        sys.exit(1)
-    
-    # Create local download directory
-    os.makedirs(LOCAL_DOWNLOAD_DIR, exist_ok=True)
-    print(f"✓ Local download directory ready: {LOCAL_DOWNLOAD_DIR}")
-    
-    print("\nStarting monitoring loop (Press Ctrl+C to stop)...\n")
-    
-    cycle_count = 0
-    total_processed = 0
-    
-    try:
-        while True:
-            cycle_count += 1
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            print(f"\n[{timestamp}] Cycle #{cycle_count}")
-            print("-" * 60)
-            
-            processed = process_files(s3_client)
-            total_processed += processed
-            
-            if processed > 0:
-                print(f"\n✓ Processed {processed} file(s) this cycle")
-                print(f"  Total processed: {total_processed}")
-            else:
-                print("No files found")
-            
-            print(f"\nWaiting {CHECK_INTERVAL}s before next check...")
-            time.sleep(CHECK_INTERVAL)
-            
-    except KeyboardInterrupt:
-        print("\n\n" + "=" * 60)
-        print("Shutting down gracefully...")
-        print(f"Total files processed: {total_processed}")
-        print("=" * 60)
-        sys.exit(0)
-    except Exception as e:
-        print(f"\n\n✗ Unexpected error: {e}")
-        print(f"Total files processed before error: {total_processed}")
-        sys.exit(1)
+    run(Settings(sys.modules[__name__]), "Runpod Network Volume File Downloader (Boto3)")
 
 
 if __name__ == "__main__":
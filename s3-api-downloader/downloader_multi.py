@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Perpetual file downloader for many Runpod network volumes in one process.
+Syncs every volume listed in VOLUMES, across any number of datacenters, with
+per-endpoint connection pools and listing and transfer capacity shared fairly
+between the volumes; the daemon lives in multi_volume.py and runs the same
+sync engine as downloader_boto.py.
+"""
+
+import sys
+
+from multi_volume import run_volumes
+from sync_engine import Settings
+
+# Refer to https://docs.runpod.io/storage/s3-api for datacenters and endpoint URLs
+
+# Defaults for every volume; any setting of downloader_boto.py can be set here
+# or in a single VOLUMES entry
+ACCESS_KEY = 'ACCESS_KEY_HERE' # begins with user_
+SECRET_KEY = 'SECRET_KEY_HERE' # begins with rps_
+TRANSPORT = 'boto3'
+REMOTE_FOLDER = 'ComfyUI/output'
+
+# Each volume downloads into LOCAL_DOWNLOAD_DIR/<volume id> and keeps its own
+# journal (JOURNAL_PATH with the volume id appended) unless its entry sets them
+LOCAL_DOWNLOAD_DIR = './downloads'
+JOURNAL_PATH = './sync-journal.db'
+
+# Volumes to sync: NETWORK_VOLUME_ID, DATACENTER and ENDPOINT_URL are required,
+# any other key overrides the default above for that volume only
+VOLUMES = [
+    {
+        'NETWORK_VOLUME_ID': 'VOLUME_ID_HERE',
+        'DATACENTER': 'eur-is-1',
+        'ENDPOINT_URL': 'https://s3api-eur-is-1.runpod.io/',
+    },
+    {
+        'NETWORK_VOLUME_ID': 'VOLUME_ID_HERE',
+        'DATACENTER': 'us-ks-2',
+        'ENDPOINT_URL': 'https://s3api-us-ks-2.runpod.io/',
+        'REMOTE_FOLDER': 'ComfyUI/output/videos',
+    },
+]
+
+# Downloads and listing requests in flight across all volumes. A volume may use
+# every slot while the others are idle; when volumes compete, each freed slot
+# goes to the waiting volume holding the fewest (see concurrency.py)
+TRANSFER_SLOTS = 32
+LIST_SLOTS = 16
+
+# Seconds between per-volume status reports (removed files, MB/s, backlog); 0 disables them
+STATUS_INTERVAL = 60
+
+
+def main():
+    """Main loop that continuously monitors and downloads files from every volume."""
+    run_volumes(Settings(sys.modules[__name__]), "Runpod Network Volume File Downloader (multi-volume)")
+
+
+if __name__ == "__main__":
+    main()
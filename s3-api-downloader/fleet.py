@@ -0,0 +1,265 @@
+"""
+Fleet mode for the Runpod network volume downloaders.
+
+With FLEET_DIR set, any number of instances can sync the same network volume:
+the keys are split between them by consistent hashing, so every file is
+downloaded and removed by exactly one instance and aggregate throughput grows
+with the number of hosts.
+
+- Every instance writes a heartbeat to the shared store each
+  FLEET_HEARTBEAT_INTERVAL seconds and reads everyone else's
+- Members whose heartbeat is older than FLEET_MEMBER_TIMEOUT are dropped;
+  a new member takes part two heartbeats after it joined, so the others have
+  seen it by then
+- Each member owns the keys that hash onto its points of a ring of
+  VIRTUAL_NODES points per member; when a member joins or dies, only the
+  keys next to its points move
+- A key that moved away from a member that is still alive is left alone for
+  FLEET_HANDOFF_DELAY seconds, so that member can finish a download and
+  batched removal it already started; keys of a dead member move at once
+- Whenever the keys an instance owns change, every folder is fully relisted
+  so that moved keys behind a delta listing watermark are seen again
+
+Membership is decided from the heartbeat timestamps, so every instance
+switches to a new key split at the same moment as long as the hosts' clocks
+agree (NTP). An instance that could not write its heartbeat for
+FLEET_MEMBER_TIMEOUT seconds stops taking keys, since the others have already
+handed them out.
+
+The store is a directory with one JSON file per member: a local directory is
+enough to run several instances on one host (e.g. for testing), while a mount
+shared by all hosts (NFS, EFS, ...) coordinates a real fleet. Any object with
+the same write / read_all / remove methods can stand in for DirectoryStore.
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import re
+import socket
+import threading
+import time
+
+# Ring points per member; more points spread the keys more evenly
+VIRTUAL_NODES = 64
+
+# Member files whose heartbeat is this many member timeouts old are deleted
+EXPIRY_TIMEOUTS = 10
+
+
+def ring_point(value):
+    """Return the position of a key or virtual node on the hash ring."""
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+def build_ring(members):
+    """
+    Return the hash ring of a set of members.
+
+    Returns:
+        tuple: (sorted ring points, member id owning each point)
+    """
+    ring = sorted((ring_point(f"{member_id}#{index}"), member_id)
+                  for member_id in members for index in range(VIRTUAL_NODES))
+    return [point for point, _ in ring], [member_id for _, member_id in ring]
+
+
+def ring_owner(ring, point):
+    """Return the member owning a point of a ring, or None for an empty ring."""
+    points, owners = ring
+    if not points:
+        return None
+    return owners[bisect.bisect(points, point) % len(points)]
+
+
+class DirectoryStore:
+    """Fleet membership as one JSON file per member in a directory all instances can reach."""
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Directory shared by the members
+
+        Raises:
+            OSError: If the directory cannot be created
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def member_path(self, member_id):
+        """Return the record file of a member."""
+        return os.path.join(self.path, re.sub(r'[^0-9A-Za-z._-]', '_', member_id) + '.json')
+
+    def write(self, member_id, record):
+        """Replace a member's record atomically."""
+        path = self.member_path(member_id)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(dict(record, member=member_id), f)
+        os.replace(temp_path, path)
+
+    def read_all(self):
+        """
+        Return the records of all members.
+
+        Returns:
+            dict: Member id -> record (joined and heartbeat timestamps)
+        """
+        records = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    with open(entry.path) as f:
+                        record = json.load(f)
+                    records[record['member']] = record
+                except (OSError, ValueError, KeyError):
+                    # Removed or replaced while reading; the next heartbeat sees it again
+                    pass
+        return records
+
+    def remove(self, member_id):
+        """Delete a member's record."""
+        try:
+            os.remove(self.member_path(member_id))
+        except FileNotFoundError:
+            pass
+
+
+class Fleet:
+    """
+    This instance's membership of the fleet: heartbeats from a daemon thread
+    and the consistent hash ring deciding which keys it owns.
+    """
+
+    def __init__(self, settings, store=None):
+        """
+        Args:
+            settings: Settings with FLEET_DIR, FLEET_MEMBER_ID, the heartbeat
+                timing and FLEET_HANDOFF_DELAY
+            store: Membership store, or None for a DirectoryStore in
+                FLEET_DIR/<volume id>
+
+        Raises:
+            OSError: If the first heartbeat cannot be written
+        """
+        self.member_id = settings.FLEET_MEMBER_ID or f"{socket.gethostname()}-{os.getpid()}"
+        self.interval = max(1, settings.FLEET_HEARTBEAT_INTERVAL)
+        self.timeout = max(settings.FLEET_MEMBER_TIMEOUT, 2 * self.interval)
+        self.handoff_delay = settings.FLEET_HANDOFF_DELAY
+        if store is None:
+            store = DirectoryStore(os.path.join(settings.FLEET_DIR, settings.NETWORK_VOLUME_ID))
+        self.store = store
+        self.lock = threading.Lock()
+        self.ring_lock = threading.Lock()
+        self.joined = time.time()
+        self.records = {}
+        self.last_heartbeat = 0
+        self.rings = {}  # frozenset of members -> hash ring
+        self.seen_split = None
+        self.stopped = threading.Event()
+        self.heartbeat()
+        self.thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self.thread.start()
+
+    def heartbeat(self):
+        """Write this member's heartbeat, read the others' and delete long-dead members."""
+        now = time.time()
+        self.store.write(self.member_id, {'joined': self.joined, 'heartbeat': now})
+        records = self.store.read_all()
+        for member_id, record in list(records.items()):
+            if now - record.get('heartbeat', 0) > EXPIRY_TIMEOUTS * self.timeout:
+                self.store.remove(member_id)
+                del records[member_id]
+        with self.lock:
+            self.records = records
+            self.last_heartbeat = now
+
+    def _heartbeat_loop(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.heartbeat()
+            except OSError as e:
+                print(f"  ⚠ Fleet heartbeat failed: {e}")
+
+    def join_delay(self):
+        """Seconds until this member starts taking keys."""
+        return max(0.0, self.joined + 2 * self.interval - time.time())
+
+    def split(self):
+        """
+        Work out the current key split from the heartbeat records. A member
+        takes part from two heartbeats after it joined until FLEET_MEMBER_TIMEOUT
+        after its last heartbeat, so every instance with the same records
+        agrees on the members and on when they last changed.
+
+        Returns:
+            tuple: (frozenset of active members, frozenset of the members
+                    active before the last change, seconds since that change)
+        """
+        now = time.time()
+        with self.lock:
+            records = self.records
+            last_heartbeat = self.last_heartbeat
+        spans = [(record.get('joined', now) + 2 * self.interval, record.get('heartbeat', 0) + self.timeout,
+                  member_id) for member_id, record in records.items()]
+        members = {member_id for start, end, member_id in spans if start <= now < end}
+        if now - last_heartbeat >= self.timeout:
+            # Silent for too long; the others have handed this member's keys out
+            members.discard(self.member_id)
+        changed_at = max((moment for start, end, _ in spans for moment in (start, end) if moment <= now), default=0)
+        previous = {member_id for start, end, member_id in spans if start < changed_at <= end}
+        return frozenset(members), frozenset(previous), now - changed_at
+
+    def ring_of(self, members):
+        """Return the (cached) hash ring of a set of members."""
+        with self.ring_lock:
+            ring = self.rings.get(members)
+            if ring is None:
+                if len(self.rings) >= 4:
+                    self.rings.clear()
+                ring = self.rings[members] = build_ring(members)
+            return ring
+
+    def split_changed(self):
+        """
+        Return True if the keys this member owns changed since the last call:
+        the active members changed, or a hand-off window ended.
+        """
+        members, _, since_change = self.split()
+        split = (members, since_change < self.handoff_delay)
+        changed = split != self.seen_split
+        self.seen_split = split
+        return changed
+
+    def other_members(self):
+        """Return the number of other members currently taking part in the key split."""
+        return len(self.split()[0] - {self.member_id})
+
+    def owns(self, key):
+        """
+        Return True if this member is responsible for key right now. Within
+        FLEET_HANDOFF_DELAY of a change, a key that moved here from a member
+        that is still alive is left to that member.
+        """
+        members, previous, since_change = self.split()
+        if self.member_id not in members:
+            return False
+        point = ring_point(key)
+        if ring_owner(self.ring_of(members), point) != self.member_id:
+            return False
+        if since_change >= self.handoff_delay:
+            return True
+        previous_owner = ring_owner(self.ring_of(previous), point)
+        return previous_owner in (None, self.member_id) or previous_owner not in members
+
+    def close(self):
+        """Stop the heartbeats and leave the fleet; the others take over this member's keys."""
+        self.stopped.set()
+        self.thread.join()
+        try:
+            self.store.remove(self.member_id)
+        except OSError:
+            pass
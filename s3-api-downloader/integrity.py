@@ -0,0 +1,214 @@
+"""
+Download integrity checks for the Runpod network volume downloaders.
+
+With VERIFY_DOWNLOADS on, every download is hashed while it streams to disk
+and compared with the object's ETag before the file is renamed into place, so
+no file is read twice:
+
+- Single-part ETags are the MD5 of the whole object
+- Multipart ETags ("<md5>-<parts>") are the MD5 of the concatenated part MD5s;
+  each upload part is hashed on its own and the results are combined
+
+The upload part size is not part of the ETag. It is asked for with a HEAD
+of part 1 (`?partNumber=1`); if the server does not say, it is inferred from
+the size and part count, trying the part sizes common S3 clients use, and if
+several fit, each is hashed and any match counts. Ranged downloads are
+verified by fetching one upload part per range, with the confirmed part size
+or when exactly one inferred size fits; otherwise the file is streamed with one
+GET, as single-part ETags need the bytes in order. ETags that are not
+MD5-shaped (e.g. objects encrypted with KMS) cannot be checked and are
+reported as unverified, as are multipart ETags that no inferred part size
+reproduces, since the guess may be wrong rather than the bytes.
+A mismatch against a known part size raises ChecksumMismatch, which blocks
+the remote removal.
+"""
+
+import hashlib
+import re
+
+from transports import TransportError
+
+MIB = 1024 * 1024
+
+# Part sizes used by common S3 clients (AWS CLI / boto3 start at 8 MiB and
+# double it for very large files, rclone uses 5 MiB, s3cmd 15 MiB, minio 16 MiB)
+COMMON_PART_SIZES = tuple(size * MIB for size in (5, 8, 15, 16, 32, 64, 128, 256, 512, 1024))
+
+ETAG_PATTERN = re.compile(r'^([0-9a-f]{32})(?:-([0-9]+))?$')
+
+
+class ChecksumMismatch(TransportError):
+    """A downloaded file whose content does not match the object's ETag."""
+
+    def __init__(self, key, expected, actual):
+        super().__init__(f"checksum mismatch for {key}: ETag {expected}, downloaded {actual}", 'BadDigest')
+
+
+def parse_etag(etag):
+    """
+    Split an ETag into its MD5 and part count.
+
+    Returns:
+        tuple or None: (md5 hex, number of parts or 0 for a single-part ETag),
+            or None if the ETag is not MD5-shaped
+    """
+    match = ETAG_PATTERN.match((etag or '').strip('"').lower())
+    if not match:
+        return None
+    return match.group(1), int(match.group(2) or 0)
+
+
+def upload_part_sizes(size, part_count):
+    """
+    Return the part sizes that split size bytes into exactly part_count parts:
+    the common client part sizes that fit, or else size / part_count rounded
+    up to a MiB.
+
+    Returns:
+        list: Candidate part sizes, smallest first (empty if none fits)
+    """
+    if size is None or part_count < 1 or size < part_count:
+        return []
+    candidates = [part_size for part_size in COMMON_PART_SIZES if -(-size // part_size) == part_count]
+    if not candidates:
+        guess = -(-size // part_count)
+        guess = -(-guess // MIB) * MIB
+        if -(-size // guess) == part_count:
+            candidates = [guess]
+    return sorted(candidates)
+
+
+def aligned_part_size(etag, size):
+    """
+    Return the upload part size of a multipart ETag if exactly one candidate
+    fits, so ranged downloads can hash each range as one upload part.
+
+    Returns:
+        int or None: Part size in bytes, or None for single-part, ambiguous
+            or non-MD5 ETags
+    """
+    parsed = parse_etag(etag)
+    if parsed is None or not parsed[1]:
+        return None
+    part_sizes = upload_part_sizes(size, parsed[1])
+    return part_sizes[0] if len(part_sizes) == 1 else None
+
+
+def confirmed_part_size(etag, size, first_part_size):
+    """
+    Check the size of part 1 reported by the server against a multipart ETag.
+
+    Args:
+        etag: ETag from the listing
+        size: Object size in bytes
+        first_part_size: Content-Length of `HEAD ?partNumber=1`, or None
+
+    Returns:
+        int or None: The upload part size, or None if the ETag is not multipart
+            or the reported size does not split the object into its part count
+    """
+    parsed = parse_etag(etag)
+    if parsed is None or not parsed[1] or not size or not first_part_size:
+        return None
+    return first_part_size if -(-size // first_part_size) == parsed[1] else None
+
+
+def multipart_etag(part_digests):
+    """Return the multipart ETag ("<md5>-<parts>") of binary part MD5s in order."""
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+class PartHasher:
+    """MD5s of consecutive part_size pieces of a stream."""
+
+    def __init__(self, part_size):
+        self.part_size = part_size
+        self.digests = []
+        self.hasher = hashlib.md5()
+        self.filled = 0
+
+    def update(self, chunk):
+        view = memoryview(chunk)
+        while view:
+            take = min(len(view), self.part_size - self.filled)
+            self.hasher.update(view[:take])
+            self.filled += take
+            view = view[take:]
+            if self.filled == self.part_size:
+                self.digests.append(self.hasher.digest())
+                self.hasher = hashlib.md5()
+                self.filled = 0
+
+    def etag(self):
+        digests = self.digests + ([self.hasher.digest()] if self.filled else [])
+        return multipart_etag(digests)
+
+
+class StreamChecksum:
+    """
+    Checks a download streamed in order against the object's ETag.
+    The transport feeds every chunk to update() and calls verify() before
+    renaming the file into place.
+    """
+
+    def __init__(self, key, etag, size, part_size=None):
+        """
+        Args:
+            key: Object key, for the error message
+            etag: ETag from the listing
+            size: Object size in bytes from the listing, if known
+            part_size: Upload part size confirmed by the server (see
+                confirmed_part_size), or None to try the common ones
+        """
+        self.key = key
+        self.verified = False
+        self.confirmed = part_size is not None
+        self.hasher = None
+        self.part_hashers = []
+        parsed = parse_etag(etag)
+        if parsed is None:
+            return
+        self.expected = f"{parsed[0]}-{parsed[1]}" if parsed[1] else parsed[0]
+        if parsed[1]:
+            part_sizes = [part_size] if part_size is not None else upload_part_sizes(size, parsed[1])
+            self.part_hashers = [PartHasher(candidate) for candidate in part_sizes]
+        else:
+            self.hasher = hashlib.md5()
+
+    @property
+    def checkable(self):
+        """True if the ETag can be compared with the downloaded content."""
+        return self.hasher is not None or bool(self.part_hashers)
+
+    def update(self, chunk):
+        """Hash the next chunk of the object."""
+        if self.hasher is not None:
+            self.hasher.update(chunk)
+        for part_hasher in self.part_hashers:
+            part_hasher.update(chunk)
+
+    def verify(self):
+        """
+        Compare the hashed content with the ETag.
+
+        Returns:
+            bool: True if verified, False if the ETag cannot be checked, or no
+                inferred part size reproduces a multipart ETag
+
+        Raises:
+            ChecksumMismatch: If the content does not match a single-part ETag,
+                or a multipart ETag with a confirmed part size
+        """
+        if self.hasher is not None:
+            actual = self.hasher.hexdigest()
+        elif self.part_hashers:
+            etags = [part_hasher.etag() for part_hasher in self.part_hashers]
+            if self.expected not in etags and not self.confirmed:
+                return False
+            actual = self.expected if self.expected in etags else etags[0]
+        else:
+            return False
+        if actual != self.expected:
+            raise ChecksumMismatch(self.key, self.expected, actual)
+        self.verified = True
+        return True
@@ -0,0 +1,348 @@
+"""
+Prometheus metrics for the Runpod network volume downloaders.
+
+With METRICS_PORT set, run() serves the Prometheus text format at
+http://METRICS_HOST:METRICS_PORT/metrics from a background thread:
+
+- Requests per operation (list, get, delete, head, put): latency histogram and errors by code
+- Files downloaded, removed, failed and retried, and bytes downloaded
+- Files and bytes served from the dedup store instead of being downloaded
+- Downloads verified against their ETag, unverifiable, or failing the check
+- Download queue depth and the adaptive concurrency limit
+- Cycle count and duration
+- Files listed but not yet removed, and the age of the oldest of them
+- Bytes counted against the disk budget, if one is set
+- Files run through the post-processing hooks, and the time each hook took
+
+Only the standard library is used; Counter, Gauge and Histogram implement the
+small part of the Prometheus client the engine needs.
+"""
+
+import math
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram buckets in seconds for single requests, whole cycles and post-processing hooks
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CYCLE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+HOOK_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_value(value):
+    """Format a sample value the way Prometheus expects."""
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def format_labels(names, values):
+    """Format a label set, e.g. {operation="get"}; empty without labels."""
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+def modified_timestamp(value):
+    """
+    Convert a listing's LastModified value to a Unix timestamp.
+
+    Args:
+        value: datetime (boto3) or ISO 8601 string (AWS CLI, XML listings)
+
+    Returns:
+        float or None: Seconds since the epoch, or None if unknown
+    """
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class Metric:
+    """A named metric with optional labels; values are kept per label value tuple."""
+
+    kind = ''
+
+    def __init__(self, name, help_text, labelnames=()):
+        """
+        Args:
+            name: Metric name
+            help_text: Description for the HELP line
+            labelnames: Names of the labels every sample carries
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def render(self):
+        """Return the exposition lines of this metric."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labelnames, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(labelnames, labels)} {format_value(value)}")
+        return lines
+
+    def samples(self):
+        """Yield (name suffix, label names, label values, value) for every sample."""
+        with self.lock:
+            items = sorted(self.values.items())
+        for labels, value in items:
+            yield '', self.labelnames, labels, value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        if not self.labelnames:
+            self.values[()] = 0
+
+    def inc(self, amount=1, labels=()):
+        """Add amount to the counter of the given label values."""
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        """Return the counter of the given label values."""
+        with self.lock:
+            return self.values.get(labels, 0)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, function=None):
+        """
+        Args:
+            name: Metric name
+            help_text: Description for the HELP line
+            function: Callable returning the current value at scrape time, or None to use set()
+        """
+        super().__init__(name, help_text)
+        self.function = function
+        self.values[()] = 0
+
+    def set(self, value):
+        with self.lock:
+            self.values[()] = value
+
+    def samples(self):
+        if self.function is not None:
+            yield '', (), (), self.function()
+        else:
+            yield from super().samples()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets, labelnames=()):
+        """
+        Args:
+            name: Metric name
+            help_text: Description for the HELP line
+            buckets: Ascending upper bounds of the buckets (+Inf is added)
+            labelnames: Names of the labels every sample carries
+        """
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        if not self.labelnames:
+            self.values[()] = ([0] * len(self.buckets), 0.0)
+
+    def observe(self, value, labels=()):
+        """Record one observation for the given label values."""
+        with self.lock:
+            counts, total = self.values.get(labels, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self.values[labels] = (counts, total + value)
+
+    def samples(self):
+        with self.lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self.values.items())
+        bucket_labels = self.labelnames + ('le',)
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield '_bucket', bucket_labels, labels + (format_value(bound),), cumulative
+            yield '_sum', self.labelnames, labels, total
+            yield '_count', self.labelnames, labels, cumulative
+
+
+class Metrics:
+    """
+    All metrics of one downloader process.
+    Transports report requests through observe_request(); CycleStats reports
+    files; run() reports cycles. Queue depth and the concurrency limit are
+    read from the engine when scraped.
+    """
+
+    def __init__(self, engine):
+        """
+        Args:
+            engine: SyncEngine (or AsyncEngine) whose queue and concurrency are exported
+        """
+        self.engine = engine
+        self.pending_lock = threading.Lock()
+        self.pending = {}  # key -> LastModified timestamp (or listing time) of listed, unremoved files
+        self.server = None
+        prefix = 'runpod_sync_'
+        self.request_duration = Histogram(
+            prefix + 'request_duration_seconds',
+            'Time until the response of each S3 request (whole command for the AWS CLI)',
+            REQUEST_BUCKETS, ('operation',))
+        self.request_errors = Counter(
+            prefix + 'request_errors_total', 'Failed S3 requests by error code', ('operation', 'code'))
+        self.downloaded_bytes = Counter(prefix + 'downloaded_bytes_total', 'Bytes downloaded')
+        self.downloaded_files = Counter(prefix + 'downloaded_files_total', 'Files downloaded')
+        self.removed_files = Counter(prefix + 'removed_files_total', 'Files downloaded and removed from the volume')
+        self.failed_files = Counter(prefix + 'failed_files_total', 'Files left on the volume after a failure')
+        self.retries = Counter(prefix + 'download_retries_total', 'Downloads retried within a cycle')
+        self.deduplicated_files = Counter(
+            prefix + 'deduplicated_files_total', 'Files linked from the dedup store instead of downloaded')
+        self.deduplicated_bytes = Counter(
+            prefix + 'deduplicated_bytes_total', 'Bytes not downloaded thanks to the dedup store')
+        self.verifications = Counter(
+            prefix + 'download_verifications_total',
+            'Downloads checked against their ETag by result (verified, unverified, mismatch)', ('result',))
+        self.cycles = Counter(prefix + 'cycles_total', 'Completed download cycles')
+        self.cycle_duration = Histogram(prefix + 'cycle_duration_seconds', 'Duration of each cycle', CYCLE_BUCKETS)
+        self.last_cycle = Gauge(prefix + 'last_cycle_timestamp_seconds', 'Unix time the last cycle finished')
+        self.post_processed = Counter(
+            prefix + 'post_processed_files_total', 'Files run through the post-processing hooks by result (ok, failed)',
+            ('result',))
+        self.post_process_duration = Histogram(
+            prefix + 'post_process_duration_seconds',
+            "Time each post-processing hook took per file, and the time files waited in the queue (stage 'queue')",
+            HOOK_BUCKETS, ('stage',))
+        self.metrics = [
+            self.request_duration, self.request_errors, self.downloaded_bytes, self.downloaded_files,
+            self.removed_files, self.failed_files, self.retries, self.deduplicated_files,
+            self.deduplicated_bytes, self.verifications, self.cycles, self.cycle_duration,
+            self.last_cycle, self.post_processed, self.post_process_duration,
+            Gauge(prefix + 'queue_depth', 'Listed files waiting for a download worker', self.queue_depth),
+            Gauge(prefix + 'download_concurrency', 'Downloads allowed in flight', self.concurrency_limit),
+            Gauge(prefix + 'pending_files', 'Listed files not yet removed from the volume', self.pending_count),
+            Gauge(prefix + 'oldest_pending_file_age_seconds',
+                  'Age of the oldest listed file not yet removed (0 if none)', self.oldest_pending_age),
+            Gauge(prefix + 'disk_budget_used_bytes',
+                  'Bytes in the download directory plus bytes reserved by downloads in flight', self.disk_used),
+        ]
+
+    def observe_request(self, operation, seconds, error=None):
+        """Record one S3 request of an operation and, if it failed, its error code."""
+        self.request_duration.observe(seconds, (operation,))
+        if error is not None:
+            self.request_errors.inc(labels=(operation, getattr(error, 'code', None) or 'error'))
+
+    def file_listed(self, obj):
+        """Track a listed file as pending until it is removed."""
+        modified = modified_timestamp(obj.get('LastModified')) or time.time()
+        with self.pending_lock:
+            self.pending.setdefault(obj['Key'], modified)
+
+    def file_downloaded(self, size):
+        self.downloaded_files.inc()
+        self.downloaded_bytes.inc(size)
+
+    def file_deduplicated(self, size):
+        self.deduplicated_files.inc()
+        self.deduplicated_bytes.inc(size)
+
+    def file_removed(self, key):
+        self.removed_files.inc()
+        with self.pending_lock:
+            self.pending.pop(key, None)
+
+    def file_failed(self, key):
+        self.failed_files.inc()
+
+    def file_post_processed(self, waited, timings, error=None):
+        """Record one file's run through the post-processing hooks."""
+        self.post_processed.inc(labels=('ok' if error is None else 'failed',))
+        self.post_process_duration.observe(waited, ('queue',))
+        for name, seconds in timings:
+            self.post_process_duration.observe(seconds, (name,))
+
+    def cycle_started(self):
+        """Forget pending files; the cycle's listing finds the ones still on the volume."""
+        with self.pending_lock:
+            self.pending = {}
+
+    def cycle_finished(self, seconds):
+        self.cycles.inc()
+        self.cycle_duration.observe(seconds)
+        self.last_cycle.set(time.time())
+
+    def queue_depth(self):
+        work_queue = getattr(self.engine, 'work_queue', None)
+        return work_queue.qsize() if work_queue is not None else 0
+
+    def concurrency_limit(self):
+        concurrency = self.engine.concurrency
+        return int(concurrency.limit) if concurrency is not None else self.engine.worker_count()
+
+    def disk_used(self):
+        disk_budget = getattr(self.engine, 'disk_budget', None)
+        return disk_budget.total if disk_budget is not None else 0
+
+    def pending_count(self):
+        with self.pending_lock:
+            return len(self.pending)
+
+    def oldest_pending_age(self):
+        with self.pending_lock:
+            oldest = min(self.pending.values(), default=None)
+        return max(0.0, time.time() - oldest) if oldest is not None else 0
+
+    def render(self):
+        """Return the exposition text of every metric."""
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+    def serve(self, host, port):
+        """
+        Serve /metrics from a daemon thread.
+
+        Raises:
+            OSError: If the address cannot be bound
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        """Stop serving."""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
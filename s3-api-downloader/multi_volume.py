@@ -0,0 +1,261 @@
+"""
+Multi-volume daemon for the Runpod network volume downloaders.
+
+run_volumes() syncs every entry of VOLUMES from one process, each volume in
+its own cycle loop thread with its own poll scheduler, watermarks and journal:
+
+- Volumes on the same endpoint with the same credentials and backend share
+  one client and its connection pool (see Transport.for_volume)
+- Listing requests and downloads of all volumes draw from two FairShare pools
+  of LIST_SLOTS and TRANSFER_SLOTS; a volume may use all of them while the
+  others are idle, but a freed slot always goes to the waiting volume holding
+  the fewest, so a busy volume cannot starve the others
+- Every STATUS_INTERVAL seconds a table shows each volume's removed files,
+  throughput, backlog (listed files not yet removed) and oldest pending file
+
+Each VOLUMES entry is a dict of settings overriding the script's constants.
+Unless an entry names its own, every volume downloads into
+LOCAL_DOWNLOAD_DIR/<volume id> and keeps its journal next to JOURNAL_PATH
+with the volume id appended. Volumes always run on the threads engine; the
+metrics and trigger endpoints are not served.
+"""
+
+import os
+import sys
+import threading
+import time
+
+from concurrency import FairShare
+from fleet import Fleet
+from metrics import Metrics
+from post_process import PostProcessor
+from relay import create_relay
+from sync_engine import Settings, SyncEngine
+from tracing import Tracer
+from transports import create_transport
+
+# Seconds to wait at shutdown for a volume's running cycle to finish before
+# its journal and connections are closed
+SHUTDOWN_TIMEOUT = 60
+
+
+def volume_settings(settings, volume):
+    """
+    Return the settings of one VOLUMES entry.
+
+    Args:
+        settings: Settings of the daemon
+        volume: Dict of settings overriding the daemon's for this volume
+
+    Returns:
+        Settings: Settings with a download directory, journal and trace
+            directory of its own unless the entry names them
+    """
+    volume_id = volume.get('NETWORK_VOLUME_ID', '')
+    overrides = {'LOCAL_DOWNLOAD_DIR': os.path.join(settings.LOCAL_DOWNLOAD_DIR, volume_id)}
+    if settings.JOURNAL_PATH:
+        root, extension = os.path.splitext(settings.JOURNAL_PATH)
+        overrides['JOURNAL_PATH'] = f"{root}-{volume_id}{extension}"
+    if settings.TRACE_DIR:
+        overrides['TRACE_DIR'] = os.path.join(settings.TRACE_DIR, volume_id)
+    overrides.update(volume)
+    overrides['ENGINE'] = 'threads'
+    return Settings(settings, **overrides)
+
+
+def endpoint_key(settings):
+    """Return what volumes must have in common to share one backend client."""
+    return (settings.ENDPOINT_URL, settings.DATACENTER.lower(), settings.ACCESS_KEY,
+            settings.SECRET_KEY, settings.TRANSPORT)
+
+
+class VolumeSync:
+    """One volume of the daemon: its engine, its cycle loop and its status counters."""
+
+    def __init__(self, settings, transport, list_slots, transfer_slots):
+        """
+        Args:
+            settings: Settings of the volume
+            transport: Backend of the volume (sharing its endpoint's client)
+            list_slots: FairShare of listing requests
+            transfer_slots: FairShare of downloads
+        """
+        self.settings = settings
+        self.name = f"{settings.NETWORK_VOLUME_ID} ({settings.DATACENTER})"
+        self.engine = SyncEngine(settings, transport)
+        self.engine.list_slots = list_slots
+        self.engine.transfer_slots = transfer_slots
+        # Not served; the status report reads its counters and pending files
+        self.metrics = self.engine.metrics = transport.metrics = Metrics(self.engine)
+        if settings.TRACE_DIR:
+            self.engine.tracer = transport.tracer = Tracer(settings)
+        if settings.FLEET_DIR:
+            self.engine.fleet = Fleet(settings)
+        self.cycle_count = 0
+        self.total_processed = 0
+        self.reported_bytes = 0
+        self.reported_files = 0
+
+    def run_cycles(self, stopped):
+        """
+        Run download cycles until stopped is set. An unexpected error ends
+        the cycle but not the loop, so one volume cannot stop the others.
+        """
+        if self.engine.fleet is not None and self.engine.fleet.join_delay() > 0:
+            # The other members pick up a new member at their next heartbeat
+            print(f"{self.name}: joining the fleet in {self.engine.fleet.join_delay():.0f}s...")
+            stopped.wait(self.engine.fleet.join_delay())
+        while not stopped.is_set():
+            self.cycle_count += 1
+            cycle_start = time.monotonic()
+            try:
+                processed = self.engine.process_files()
+            except Exception as e:
+                print(f"\n✗ {self.name}: unexpected error in cycle #{self.cycle_count}: {e}")
+                processed = 0
+            self.metrics.cycle_finished(time.monotonic() - cycle_start)
+            self.total_processed += processed
+            if processed > 0:
+                print(f"\n✓ {self.name}: processed {processed} file(s) in cycle #{self.cycle_count}, "
+                      f"{self.total_processed} in total")
+            if self.engine.scheduler is not None:
+                wait_time = self.engine.scheduler.next_wait(processed)
+            else:
+                wait_time = self.settings.CHECK_INTERVAL
+            stopped.wait(wait_time)
+
+    def take_status(self):
+        """
+        Return the status of the volume and reset the interval counters.
+
+        Returns:
+            tuple: (files removed and bytes downloaded since the last call,
+                    listed files not yet removed, age in seconds of the oldest of them)
+        """
+        removed = self.metrics.removed_files.value()
+        downloaded = self.metrics.downloaded_bytes.value()
+        files, self.reported_files = removed - self.reported_files, removed
+        size, self.reported_bytes = downloaded - self.reported_bytes, downloaded
+        return files, size, self.metrics.pending_count(), self.metrics.oldest_pending_age()
+
+
+def report_status(volumes, elapsed, list_slots, transfer_slots):
+    """Print one line per volume with its throughput and backlog over the last interval."""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(f"\n[{timestamp}] Volume status, last {elapsed:.0f}s "
+          f"({transfer_slots.in_use}/{transfer_slots.capacity} transfer slot(s), "
+          f"{list_slots.in_use}/{list_slots.capacity} listing slot(s) in use)")
+    print(f"  {'Volume':<32} {'Removed':>8} {'MB/s':>8} {'Backlog':>8} {'Oldest':>8} {'Slots':>6}")
+    for volume in volumes:
+        files, size, backlog, oldest = volume.take_status()
+        print(f"  {volume.name:<32} {files:>8} {size / (1024 * 1024) / elapsed:>8.1f} {backlog:>8} "
+              f"{oldest:>7.0f}s {transfer_slots.held_by(volume.engine):>6}")
+
+
+def run_volumes(settings, title):
+    """
+    Main loop that syncs every configured volume until interrupted.
+
+    Args:
+        settings: Settings of the daemon, with VOLUMES and the shared defaults
+        title: Banner title printed at startup
+    """
+    all_settings = [volume_settings(settings, volume) for volume in settings.VOLUMES]
+    endpoints = {}
+    for volume in all_settings:
+        endpoints.setdefault(endpoint_key(volume), []).append(volume)
+
+    print("=" * 60)
+    print(title)
+    print("=" * 60)
+    print(f"Volumes: {len(all_settings)} on {len(endpoints)} endpoint(s)")
+    for volume in all_settings:
+        print(f"  {volume.NETWORK_VOLUME_ID} ({volume.DATACENTER}): {volume.ENDPOINT_URL} "
+              f"{volume.REMOTE_FOLDER or '(root)'} -> {volume.LOCAL_DOWNLOAD_DIR}")
+    print(f"Transport: {settings.TRANSPORT}")
+    print(f"Shared capacity: {settings.TRANSFER_SLOTS} transfer slot(s), {settings.LIST_SLOTS} listing slot(s)")
+    print("=" * 60)
+
+    if not all_settings:
+        print("✗ No volumes configured; add entries to VOLUMES")
+        sys.exit(1)
+    if settings.ENGINE == 'asyncio' or any(volume.get('ENGINE') == 'asyncio' for volume in settings.VOLUMES):
+        print("⚠ The asyncio engine is not available in the multi-volume daemon; using worker threads")
+    if settings.METRICS_PORT or settings.TRIGGER_PORT or settings.TRIGGER_SOCKET:
+        print("⚠ The metrics and trigger endpoints are not served by the multi-volume daemon")
+
+    list_slots = FairShare(settings.LIST_SLOTS)
+    transfer_slots = FairShare(settings.TRANSFER_SLOTS)
+    volumes = []
+    for group in endpoints.values():
+        # One client per endpoint, its pool sized for every shared slot
+        # since any one volume may hold all of them
+        shared = create_transport(Settings(group[0], DOWNLOAD_WORKERS=settings.TRANSFER_SLOTS,
+                                           LIST_WORKERS=settings.LIST_SLOTS, LIST_SHARD_WORKERS=0))
+        if shared is None:
+            sys.exit(1)
+        for volume in group:
+            sync = VolumeSync(volume, shared.for_volume(volume), list_slots, transfer_slots)
+            if not sync.engine.test_connection():
+                print(f"⚠ Skipping volume {sync.name}")
+                sync.engine.close()
+                continue
+            if volume.RELAY_ENDPOINT_URL:
+                sync.engine.relay = create_relay(volume) if shared.supports_relay else None
+                if sync.engine.relay is None:
+                    print(f"⚠ Skipping volume {sync.name}: relay target unavailable")
+                    sync.engine.close()
+                    continue
+                print(f"✓ {sync.name}: relaying to {volume.RELAY_BUCKET}")
+            else:
+                os.makedirs(volume.LOCAL_DOWNLOAD_DIR, exist_ok=True)
+                if volume.POST_PROCESS_HOOKS:
+                    try:
+                        sync.engine.post_processor = PostProcessor(volume)
+                    except ValueError as e:
+                        print(f"⚠ Skipping volume {sync.name}: {e}")
+                        sync.engine.close()
+                        continue
+                    sync.engine.post_processor.metrics = sync.metrics
+                    sync.engine.post_processor.disk_budget = sync.engine.disk_budget
+            volumes.append(sync)
+    if not volumes:
+        sys.exit(1)
+    if settings.DEDUP_DIR:
+        print(f"✓ Dedup store shared by all volumes: {settings.DEDUP_DIR}")
+
+    print(f"\nStarting {len(volumes)} monitoring loop(s) (Press Ctrl+C to stop)...\n")
+
+    stopped = threading.Event()
+    threads = []
+    for volume in volumes:
+        thread = threading.Thread(target=volume.run_cycles, args=(stopped,), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    interval = settings.STATUS_INTERVAL
+    last_report = time.monotonic()
+    try:
+        while True:
+            time.sleep(interval or 3600)
+            if interval:
+                now = time.monotonic()
+                report_status(volumes, now - last_report, list_slots, transfer_slots)
+                last_report = now
+    except KeyboardInterrupt:
+        print("\n\n" + "=" * 60)
+        print("Shutting down gracefully...")
+        for volume in volumes:
+            print(f"  {volume.name}: {volume.total_processed} file(s) processed")
+        print("=" * 60)
+        sys.exit(0)
+    finally:
+        stopped.set()
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for volume, thread in zip(volumes, threads):
+            # A cycle still writing to the journal must finish before it is closed
+            thread.join(max(0, deadline - time.monotonic()))
+            if thread.is_alive():
+                print(f"⚠ {volume.name}: cycle still running after {SHUTDOWN_TIMEOUT}s, exiting without closing it")
+                continue
+            volume.engine.close()
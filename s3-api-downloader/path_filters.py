@@ -0,0 +1,149 @@
+"""
+Include/exclude glob rules shared by the Runpod network volume downloaders.
+
+Patterns are matched against paths relative to the monitored remote folder:
+
+- A pattern without '/' matches a single name, e.g. '*.mp4' or 'temp'
+- A pattern with '/' matches the whole relative path, e.g. 'jobs/*/final/*.mp4'
+- '*' and '?' never match '/', while a '**' segment matches any number of folders
+
+A file is skipped if an exclude pattern matches it or one of its parent folders.
+If include patterns are given, a file must also match at least one of them.
+Folders that are excluded, or that no include pattern can reach, are pruned and
+never listed.
+"""
+
+import re
+from fnmatch import translate
+
+
+def compile_segment(segment):
+    """
+    Compile one path segment of a glob pattern.
+
+    Args:
+        segment: Pattern segment without '/'
+
+    Returns:
+        re.Pattern or None: Compiled segment, or None for '**'
+    """
+    if segment == '**':
+        return None
+    return re.compile(translate(segment))
+
+
+def match_segments(pattern, parts):
+    """
+    Match compiled pattern segments against path segments.
+
+    Args:
+        pattern: List of compiled segments (None for '**')
+        parts: List of path segments
+
+    Returns:
+        bool: True if the whole path matches the whole pattern
+    """
+    if not pattern:
+        return not parts
+    if pattern[0] is None:
+        # '**' matches zero or more segments
+        return any(match_segments(pattern[1:], parts[i:]) for i in range(len(parts) + 1))
+    return bool(parts) and pattern[0].match(parts[0]) is not None and match_segments(pattern[1:], parts[1:])
+
+
+def could_match_below(pattern, parts):
+    """
+    Check whether a pattern could match something inside a folder.
+
+    Args:
+        pattern: List of compiled segments (None for '**')
+        parts: Path segments of the folder
+
+    Returns:
+        bool: False only if no path below the folder can match the pattern
+    """
+    for index, part in enumerate(parts):
+        if index >= len(pattern):
+            return False
+        if pattern[index] is None:
+            return True
+        if pattern[index].match(part) is None:
+            return False
+    return len(pattern) > len(parts)
+
+
+class PathFilter:
+    """Compiled include/exclude rules for remote file paths."""
+
+    def __init__(self, include_patterns=(), exclude_patterns=()):
+        """
+        Args:
+            include_patterns: Glob patterns a file must match (empty means all files)
+            exclude_patterns: Glob patterns for files and folders to skip
+        """
+        self.include_names, self.include_paths = self._compile(include_patterns)
+        self.exclude_names, self.exclude_paths = self._compile(exclude_patterns)
+        self.has_includes = bool(include_patterns)
+
+    @staticmethod
+    def _compile(patterns):
+        """Split patterns into name patterns and compiled path patterns."""
+        names = []
+        paths = []
+        for pattern in patterns:
+            pattern = pattern.strip('/')
+            if '/' in pattern:
+                paths.append([compile_segment(segment) for segment in pattern.split('/')])
+            else:
+                names.append(compile_segment(pattern) or re.compile('.*'))
+        return names, paths
+
+    @property
+    def active(self):
+        """True if any rule is configured."""
+        return bool(self.has_includes or self.exclude_names or self.exclude_paths)
+
+    def _is_excluded(self, parts):
+        """Check a file or folder path (as segments) against the exclude rules."""
+        if any(name.match(parts[-1]) for name in self.exclude_names):
+            return True
+        return any(match_segments(pattern, parts) for pattern in self.exclude_paths)
+
+    def prune_folder(self, relative_folder):
+        """
+        Check whether a folder can be skipped without listing it.
+        Parent folders are assumed to have been checked already.
+
+        Args:
+            relative_folder: Folder path relative to the remote folder (e.g., 'jobs/a/')
+
+        Returns:
+            bool: True if nothing inside the folder can be downloaded
+        """
+        parts = relative_folder.strip('/').split('/')
+        if not parts[0]:
+            return False
+        if self._is_excluded(parts):
+            return True
+        if self.has_includes and not self.include_names:
+            return not any(could_match_below(pattern, parts) for pattern in self.include_paths)
+        return False
+
+    def matches_file(self, relative_path):
+        """
+        Check whether a file should be downloaded.
+
+        Args:
+            relative_path: File path relative to the remote folder
+
+        Returns:
+            bool: True if the file passes the include and exclude rules
+        """
+        parts = relative_path.split('/')
+        if any(self._is_excluded(parts[:i]) for i in range(1, len(parts) + 1)):
+            return False
+        if not self.has_includes:
+            return True
+        if any(name.match(parts[-1]) for name in self.include_names):
+            return True
+        return any(match_segments(pattern, parts) for pattern in self.include_paths)
@@ -0,0 +1,207 @@
+"""
+Post-download processing stage for the Runpod network volume downloaders.
+
+With POST_PROCESS_HOOKS set, every file that lands in LOCAL_DOWNLOAD_DIR
+(downloaded, or linked from the dedup store) is handed to the hooks in a pool
+of POST_PROCESS_WORKERS processes, while the download workers go on with the
+next transfer. Hashing, thumbnailing or moving outputs no longer needs a
+second scan of the directory, and CPU-heavy hooks do not hold the GIL of the
+downloader.
+
+- A hook is a function hook(local_path, obj) taking the path of the file and
+  its listing entry (Key, Size, ETag); if it returns a string, that is the
+  path the next hook receives (e.g. after moving the file)
+- Hooks are given as functions or 'module:function' strings, and must be
+  defined at the top level of a module so the worker processes can import them
+- The hooks of one file run in order in the same process; a hook that raises
+  ends the chain for that file and is reported, but the remote file is
+  removed as usual since its download succeeded
+- At most POST_PROCESS_QUEUE_SIZE files are queued or running; a download
+  worker finishing a file waits while the stage is full, so slow hooks slow
+  the downloads down instead of piling up in memory
+- Each hook's run time, and the time files waited in the queue, are
+  reported after every cycle and exported as metrics
+
+The worker processes are started fresh (not forked from the threaded
+downloader) and import the hooks' modules; a script defining its own hooks
+must start the downloader under `if __name__ == "__main__":`, as the
+bundled scripts do. Files still queued when the downloader stops are
+processed before it exits.
+A file downloaded by an earlier run is not handed to the hooks again.
+"""
+
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def resolve_hook(hook):
+    """
+    Return the function a POST_PROCESS_HOOKS entry names.
+
+    Args:
+        hook: Function, or 'module:function' string
+
+    Raises:
+        ValueError: If a string does not name a function
+    """
+    if callable(hook):
+        return hook
+    module_name, _, function_name = str(hook).partition(':')
+    if not module_name or not function_name:
+        raise ValueError(f"post-processing hook '{hook}' is not a 'module:function' string")
+    try:
+        function = getattr(importlib.import_module(module_name), function_name)
+    except (ImportError, AttributeError) as e:
+        raise ValueError(f"cannot load post-processing hook '{hook}': {e}") from e
+    if not callable(function):
+        raise ValueError(f"post-processing hook '{hook}' is not callable")
+    return function
+
+
+def hook_name(hook):
+    """Return the name a hook is reported under."""
+    return getattr(hook, '__name__', repr(hook))
+
+
+def run_hooks(hooks, local_path, obj, queued_at):
+    """
+    Run the hooks of one file in a worker process.
+
+    Returns:
+        tuple: (seconds the file waited in the queue, list of (hook name,
+                seconds) for every hook that ran, error text or None)
+    """
+    waited = max(0.0, time.time() - queued_at)
+    timings = []
+    for hook in hooks:
+        start_time = time.perf_counter()
+        try:
+            result = hook(local_path, obj)
+        except Exception as e:
+            timings.append((hook_name(hook), time.perf_counter() - start_time))
+            # Exceptions from user code may not survive pickling; send their text
+            return waited, timings, f"{hook_name(hook)} raised {type(e).__name__}: {e}"
+        timings.append((hook_name(hook), time.perf_counter() - start_time))
+        if isinstance(result, (str, os.PathLike)):
+            local_path = os.fspath(result)
+    return waited, timings, None
+
+
+class StageStats:
+    """Run time of one hook since the last report."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+
+class PostProcessor:
+    """
+    Bounded process pool running the post-processing hooks. Threads wait in
+    submit(); event loop code polls try_submit() instead.
+    """
+
+    def __init__(self, settings):
+        """
+        Args:
+            settings: Settings with POST_PROCESS_HOOKS, POST_PROCESS_WORKERS
+                and POST_PROCESS_QUEUE_SIZE
+
+        Raises:
+            ValueError: If a hook cannot be loaded
+        """
+        self.hooks = [resolve_hook(hook) for hook in settings.POST_PROCESS_HOOKS]
+        self.workers = max(1, settings.POST_PROCESS_WORKERS)
+        self.queue_size = max(1, settings.POST_PROCESS_QUEUE_SIZE)
+        self.slots = threading.BoundedSemaphore(self.queue_size)
+        # Forking a process that runs download threads can copy a held lock; start clean interpreters
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.stages = {}  # hook name -> StageStats since the last report
+        self.processed_count = 0
+        self.failed_count = 0
+        self.wait_seconds = 0.0
+        # Set by run() when METRICS_PORT is configured (see metrics.py)
+        self.metrics = None
+        # Set by run() when DISK_BUDGET is configured; processed files become evictable
+        self.disk_budget = None
+
+    def submit(self, local_path, obj):
+        """Queue a file for the hooks, waiting while POST_PROCESS_QUEUE_SIZE files are queued."""
+        self.slots.acquire()
+        self._submit(local_path, obj)
+
+    def try_submit(self, local_path, obj):
+        """Queue a file for the hooks if the queue has room; returns True if queued."""
+        if not self.slots.acquire(blocking=False):
+            return False
+        self._submit(local_path, obj)
+        return True
+
+    def _submit(self, local_path, obj):
+        entry = {name: obj[name] for name in ('Key', 'Size', 'ETag', 'LastModified') if name in obj}
+        with self.lock:
+            self.pending += 1
+        try:
+            future = self.executor.submit(run_hooks, self.hooks, local_path, entry, time.time())
+        except Exception:
+            self._finished()
+            raise
+        future.add_done_callback(lambda done: self._record(obj['Key'], local_path, done))
+
+    def _finished(self):
+        with self.lock:
+            self.pending -= 1
+        self.slots.release()
+
+    def _record(self, key, local_path, future):
+        """Count the outcome of one file's hooks (called in the pool's result thread)."""
+        try:
+            waited, timings, error = future.result()
+        except Exception as e:
+            # The worker process died or the hooks could not be sent to it
+            waited, timings, error = 0.0, [], f"{type(e).__name__}: {e}"
+        with self.lock:
+            self.wait_seconds += waited
+            for name, seconds in timings:
+                stage = self.stages.setdefault(name, StageStats())
+                stage.count += 1
+                stage.seconds += seconds
+                stage.max_seconds = max(stage.max_seconds, seconds)
+            if error is None:
+                self.processed_count += 1
+            else:
+                self.failed_count += 1
+        if self.metrics is not None:
+            self.metrics.file_post_processed(waited, timings, error)
+        if error is not None:
+            print(f"  ⚠ Post-processing failed for {key}: {error}")
+        elif self.disk_budget is not None:
+            self.disk_budget.mark_consumed(local_path)
+        self._finished()
+
+    def take_stats(self):
+        """
+        Return the counters since the last call and reset them.
+
+        Returns:
+            tuple: (files processed, files failed, total seconds files waited
+                    in the queue, dict of hook name to StageStats, files still
+                    queued or running)
+        """
+        with self.lock:
+            stats = (self.processed_count, self.failed_count, self.wait_seconds, self.stages, self.pending)
+            self.processed_count = self.failed_count = 0
+            self.wait_seconds = 0.0
+            self.stages = {}
+        return stats
+
+    def close(self):
+        """Process the files still queued and stop the worker processes."""
+        self.executor.shutdown(wait=True)
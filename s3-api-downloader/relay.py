@@ -0,0 +1,258 @@
+"""
+Zero-disk relay mode for the Runpod network volume downloaders.
+
+With RELAY_ENDPOINT_URL set, files are not written to LOCAL_DOWNLOAD_DIR:
+each object's body is streamed from the network volume straight into an
+upload to a second S3-compatible bucket (RELAY_BUCKET), and the file is
+removed from the volume only once the copy is complete and verified.
+
+- Objects smaller than RELAY_PART_SIZE are sent with one PUT; larger ones
+  with a multipart upload of RELAY_PART_SIZE parts
+- At most RELAY_WINDOW parts of one file are uploading at a time; the GET
+  waits while the window is full, so a relay holds at most RELAY_WINDOW + 1
+  parts in memory, whatever the size of the file
+- Every PUT carries a Content-MD5 the target checks, and the ETag of every
+  part is compared with the MD5 sent
+- With VERIFY_DOWNLOADS on, the source bytes are also checked against the
+  source ETag before the upload is completed
+- After the upload, a HEAD of the target object must show the source size
+  and, for MD5-shaped ETags, the ETag of the bytes sent
+
+A source body shorter or longer than listed is caught before the PUT is
+sent or the multipart upload completed. A failed relay aborts its multipart
+upload and is retried like a download; the source file is left in place
+until a relay succeeds.
+"""
+
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from integrity import multipart_etag, parse_etag
+from transports import TransportError, create_transport
+
+# Smallest part S3 accepts in a multipart upload (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def iter_parts(chunks, part_size):
+    """
+    Regroup a stream of chunks into parts of part_size bytes.
+
+    Yields:
+        bytes: Parts in order, the last one possibly shorter; nothing for an empty stream
+    """
+    part = bytearray()
+    for chunk in chunks:
+        part += chunk
+        while len(part) >= part_size:
+            yield bytes(part[:part_size])
+            del part[:part_size]
+    if part:
+        yield bytes(part)
+
+
+class RelaySink:
+    """Uploads of relayed files to the target bucket."""
+
+    def __init__(self, settings, target):
+        """
+        Args:
+            settings: Settings with RELAY_PREFIX, RELAY_PART_SIZE, RELAY_WINDOW and DOWNLOAD_WORKERS
+            target: Transport of the target bucket
+        """
+        self.target = target
+        self.prefix = settings.RELAY_PREFIX
+        self.part_size = max(MIN_PART_SIZE, settings.RELAY_PART_SIZE)
+        self.window = max(1, settings.RELAY_WINDOW)
+        # Every download worker may have a full window of parts uploading
+        self.executor = ThreadPoolExecutor(max_workers=self.window * max(1, settings.DOWNLOAD_WORKERS),
+                                           thread_name_prefix='relay')
+
+    def target_key(self, key):
+        """Return the target key of a source key."""
+        return self.prefix + key
+
+    def copy(self, source, key, size=None, checksum=None):
+        """
+        Stream an object from the source into the target bucket.
+
+        Args:
+            source: Transport of the network volume
+            key: Source object key
+            size: Object size in bytes from the listing, if known
+            checksum: StreamChecksum of the source ETag, or None
+
+        Returns:
+            bool: True if the target object's ETag was checked against the bytes sent
+
+        Raises:
+            TransportError: If the copy failed or does not match
+        """
+        target_key = self.target_key(key)
+        chunks = source.get_stream(key)
+        if checksum is not None:
+            chunks = self._checked(chunks, checksum)
+        parts = iter_parts(chunks, self.part_size)
+        try:
+            first = next(parts, b'')
+            if len(first) < self.part_size:
+                check_size(key, len(first), size)
+                if checksum is not None:
+                    checksum.verify()
+                digest = hashlib.md5(first).digest()
+                etag = self.target.put_object(target_key, first, digest)
+                check_digest(target_key, etag, digest)
+                sent_size, expected = len(first), digest.hex()
+            else:
+                sent_size, expected = self._upload_parts(key, target_key, first, parts, size, checksum)
+        finally:
+            parts.close()
+        return self.check_target(target_key, sent_size, expected)
+
+    @staticmethod
+    def _checked(chunks, checksum):
+        """Feed every chunk of a stream to a checksum on its way through."""
+        for chunk in chunks:
+            checksum.update(chunk)
+            yield chunk
+
+    def _upload_parts(self, key, target_key, first, parts, size, checksum):
+        """
+        Upload an object as a multipart upload, at most window parts at a time.
+        The upload is aborted, never completed, if the source sent a different
+        number of bytes than listed.
+
+        Returns:
+            tuple: (bytes sent, expected multipart ETag)
+        """
+        upload_id = self.target.create_multipart_upload(target_key)
+        pending = {}
+        etags = {}
+        digests = []
+        sent_size = 0
+        try:
+            for number, part in enumerate(self._chain(first, parts), 1):
+                while len(pending) >= self.window:
+                    self._settle(pending, etags, wait(pending, return_when=FIRST_COMPLETED).done)
+                digest = hashlib.md5(part).digest()
+                digests.append(digest)
+                sent_size += len(part)
+                future = self.executor.submit(self.target.upload_part, target_key, upload_id, number, part, digest)
+                pending[future] = (number, digest)
+            check_size(key, sent_size, size)
+            if checksum is not None:
+                checksum.verify()
+            self._settle(pending, etags, wait(pending).done)
+            self.target.complete_multipart_upload(target_key, upload_id,
+                                                  [(number, etags[number]) for number in range(1, len(digests) + 1)])
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            wait(pending)
+            try:
+                self.target.abort_multipart_upload(target_key, upload_id)
+            except TransportError as e:
+                print(f"  ⚠ Could not abort the upload of {target_key}: {e}")
+            raise
+        return sent_size, multipart_etag(digests)
+
+    @staticmethod
+    def _chain(first, parts):
+        yield first
+        yield from parts
+
+    @staticmethod
+    def _settle(pending, etags, done):
+        """Collect finished part uploads, raising the first error."""
+        for future in done:
+            number, digest = pending.pop(future)
+            etag = future.result()
+            check_digest(f"part {number}", etag, digest)
+            etags[number] = etag
+
+    def check_target(self, target_key, size, expected):
+        """
+        Check the completed target object with a HEAD request.
+
+        Args:
+            target_key: Target object key
+            size: Bytes sent
+            expected: ETag of the bytes sent (MD5, or multipart "<md5>-<parts>")
+
+        Returns:
+            bool: True if the ETag matched, False if the target's ETag is not MD5-shaped
+
+        Raises:
+            TransportError: If the size or ETag does not match
+        """
+        target_size, etag = self.target.head_object(target_key)
+        if target_size != size:
+            raise TransportError(f"relayed copy of {target_key} has {target_size} bytes, sent {size}", 'BadDigest')
+        parsed = parse_etag(etag)
+        if parsed is None:
+            return False
+        actual = f"{parsed[0]}-{parsed[1]}" if parsed[1] else parsed[0]
+        if actual != expected:
+            raise TransportError(f"relayed copy of {target_key} has ETag {actual}, sent {expected}", 'BadDigest')
+        return True
+
+    def close(self):
+        """Wait for uploads in flight and stop the upload threads."""
+        self.executor.shutdown(wait=True)
+
+
+def check_size(key, sent_size, size):
+    """
+    Compare the bytes read from the source with the listed size, before the
+    upload is completed.
+
+    Raises:
+        TransportError: If the size is known and differs
+    """
+    if size is not None and sent_size != size:
+        raise TransportError(f"relayed {sent_size} bytes of {key}, listed with {size}", 'IncompleteBody')
+
+
+def check_digest(name, etag, digest):
+    """
+    Compare the ETag returned for an upload with the MD5 of the bytes sent.
+    ETags that are not a plain MD5 (e.g. encrypted buckets) are accepted;
+    the Content-MD5 header already made the target check the bytes.
+
+    Raises:
+        TransportError: If the ETag is a different MD5
+    """
+    parsed = parse_etag(etag)
+    if parsed is not None and not parsed[1] and parsed[0] != digest.hex():
+        raise TransportError(f"upload of {name} returned ETag {parsed[0]}, sent {digest.hex()}", 'BadDigest')
+
+
+def create_relay(settings):
+    """
+    Create the relay sink from the RELAY_* settings and check the target bucket.
+
+    Returns:
+        RelaySink: Sink, or None if the target cannot be used
+    """
+    # Settings of the source with the target's endpoint, bucket and credentials
+    target_settings = type(settings)(
+        settings,
+        ENDPOINT_URL=settings.RELAY_ENDPOINT_URL,
+        NETWORK_VOLUME_ID=settings.RELAY_BUCKET,
+        ACCESS_KEY=settings.RELAY_ACCESS_KEY or settings.ACCESS_KEY,
+        SECRET_KEY=settings.RELAY_SECRET_KEY or settings.SECRET_KEY,
+        DATACENTER=settings.RELAY_REGION,
+        TRANSPORT=settings.RELAY_TRANSPORT,
+    )
+    target = create_transport(target_settings)
+    if target is None:
+        return None
+    if not target.supports_relay:
+        print(f"✗ The {target.name} transport cannot upload relayed files; set RELAY_TRANSPORT to 'http' or 'boto3'")
+        return None
+    try:
+        target.head_bucket()
+    except TransportError as e:
+        print(f"✗ Cannot reach relay bucket {settings.RELAY_BUCKET} at {settings.RELAY_ENDPOINT_URL}: {e}")
+        return None
+    return RelaySink(settings, target)
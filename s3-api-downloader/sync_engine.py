@@ -0,0 +1,2266 @@
+"""
+Shared sync engine for the Runpod network volume downloaders.
+
+Lists the remote folder, downloads every file and removes it from the network
+volume once the download is confirmed, cycle after cycle. All S3 requests go
+through a transport backend (see transports.py), so downloader.py (AWS CLI)
+and downloader_boto.py (Boto3) share the same listing, scheduling, download
+pipeline, journal and batching logic.
+
+Settings come from the calling script's module constants; anything a script
+does not define falls back to DEFAULT_SETTINGS below.
+"""
+
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from concurrency import AdaptiveConcurrency, is_retryable, retry_delay
+from dedup import DedupStore
+from disk_budget import DiskBudget, format_size
+from fleet import Fleet
+from integrity import (ChecksumMismatch, StreamChecksum, aligned_part_size, confirmed_part_size, multipart_etag,
+                       parse_etag)
+from metrics import Metrics
+from path_filters import PathFilter
+from post_process import PostProcessor, hook_name
+from relay import create_relay
+from tracing import NULL_TRACER, Tracer
+from triggers import TriggerServer
+from transports import TransportError, create_transport
+
+# Defaults for every setting the engine reads (documented in downloader_boto.py)
+# Longest object key S3 accepts, in UTF-8 bytes
+MAX_KEY_BYTES = 1024
+
+DEFAULT_SETTINGS = {
+    'ACCESS_KEY': '',
+    'SECRET_KEY': '',
+    'NETWORK_VOLUME_ID': '',
+    'DATACENTER': '',
+    'ENDPOINT_URL': '',
+    'TRANSPORT': 'boto3',
+    'PROBE_REQUESTS': 3,
+    'ENGINE': 'threads',
+    'ASYNC_DOWNLOAD_TASKS': 256,
+    'ASYNC_MAX_CONNECTIONS': 128,
+    'REMOTE_FOLDER': '',
+    'LOCAL_DOWNLOAD_DIR': './downloads',
+    'INCLUDE_PATTERNS': [],
+    'EXCLUDE_PATTERNS': [],
+    'CHECK_INTERVAL': 30,
+    'ADAPTIVE_POLLING': True,
+    'MIN_CHECK_INTERVAL': 1,
+    'COLD_FOLDER_MAX_INTERVAL': 300,
+    'DELTA_LISTING': True,
+    'FULL_RESCAN_INTERVAL': 300,
+    'LARGE_FILE_THRESHOLD': 256 * 1024 * 1024,
+    'PART_SIZE': 64 * 1024 * 1024,
+    'PART_WORKERS': 8,
+    'DOWNLOAD_WORKERS': 16,
+    'ADAPTIVE_CONCURRENCY': True,
+    'MIN_CONCURRENCY': 2,
+    'LATENCY_TOLERANCE': 3,
+    'RETRY_ATTEMPTS': 4,
+    'RETRY_BASE_DELAY': 0.5,
+    'RETRY_MAX_DELAY': 20,
+    'LIST_WORKERS': 8,
+    'LIST_SHARD_WORKERS': 8,
+    'DOWNLOAD_QUEUE_SIZE': 1000,
+    'BULK_MODE': True,
+    'BULK_COPY_CHUNK_SIZE': 500,
+    'DELETE_BATCH_SIZE': 1000,
+    'DELETE_BATCH_INTERVAL': 5,
+    'DELETE_MAX_ATTEMPTS': 3,
+    'JOURNAL_PATH': './sync-journal.db',
+    'JOURNAL_BATCH_SIZE': 500,
+    'JOURNAL_FLUSH_INTERVAL': 2,
+    'METRICS_PORT': 0,
+    'METRICS_HOST': '127.0.0.1',
+    'TRACE_DIR': '',
+    'TRACE_TOP_N': 10,
+    'TRIGGER_PORT': 0,
+    'TRIGGER_HOST': '127.0.0.1',
+    'TRIGGER_SOCKET': '',
+    'DEDUP_DIR': '',
+    'DEDUP_RETENTION': 7 * 24 * 3600,
+    'VERIFY_DOWNLOADS': True,
+    'FLEET_DIR': '',
+    'FLEET_MEMBER_ID': '',
+    'FLEET_HEARTBEAT_INTERVAL': 5,
+    'FLEET_MEMBER_TIMEOUT': 30,
+    'FLEET_HANDOFF_DELAY': 30,
+    'RELAY_ENDPOINT_URL': '',
+    'RELAY_BUCKET': '',
+    'RELAY_ACCESS_KEY': '',
+    'RELAY_SECRET_KEY': '',
+    'RELAY_REGION': 'us-east-1',
+    'RELAY_PREFIX': '',
+    'RELAY_TRANSPORT': 'http',
+    'RELAY_PART_SIZE': 16 * 1024 * 1024,
+    'RELAY_WINDOW': 4,
+    'DISK_BUDGET': 0,
+    'DISK_HIGH_WATERMARK': 0.9,
+    'DISK_LOW_WATERMARK': 0.8,
+    'DISK_EVICTION': False,
+    'DISK_MIN_RETENTION': 3600,
+    'DISK_CONSUMED_SUFFIX': '.consumed',
+    'POST_PROCESS_HOOKS': [],
+    'POST_PROCESS_WORKERS': 4,
+    'POST_PROCESS_QUEUE_SIZE': 100,
+    # Multi-volume daemon only (documented in downloader_multi.py)
+    'VOLUMES': [],
+    'TRANSFER_SLOTS': 32,
+    'LIST_SLOTS': 16,
+    'STATUS_INTERVAL': 60,
+}
+
+
+class Settings:
+    """Engine settings: DEFAULT_SETTINGS overridden by a script's uppercase constants."""
+
+    def __init__(self, source=None, **overrides):
+        """
+        Args:
+            source: Module (or any object) whose uppercase attributes override the defaults
+            **overrides: Individual settings that take precedence over both
+        """
+        self.__dict__.update(DEFAULT_SETTINGS)
+        if source is not None:
+            self.__dict__.update({name: value for name, value in vars(source).items() if name.isupper()})
+        self.__dict__.update(overrides)
+
+
+class ListingStats:
+    """Counters for one walk of the remote folder."""
+
+    def __init__(self):
+        self.file_count = 0
+        self.prefix_count = 0
+        self.skipped_count = 0
+        self.error_count = 0
+        self.request_count = 0
+        self.delta_count = 0
+        self.response_bytes = 0
+        self.pruned_count = 0
+        self.filtered_count = 0
+
+
+class PollScheduler:
+    """
+    Decide how long to wait between cycles and which folders to relist.
+    The wait drops to MIN_CHECK_INTERVAL after a cycle that processed files and
+    doubles up to CHECK_INTERVAL while idle. Each folder keeps its own relist
+    interval: it is relisted every cycle while it yields files, and each empty
+    listing doubles its interval up to COLD_FOLDER_MAX_INTERVAL. Subfolders of
+    a skipped folder are still walked using its last known subfolder list.
+    """
+
+    def __init__(self, settings):
+        """
+        Args:
+            settings: Settings with the polling intervals
+        """
+        self.settings = settings
+        self.wait_time = settings.MIN_CHECK_INTERVAL
+        self.folders = {}  # prefix -> (interval, next due time, subfolder prefixes)
+
+    def is_due(self, prefix):
+        """Return True if the folder should be listed in this cycle."""
+        folder = self.folders.get(prefix)
+        return folder is None or time.monotonic() >= folder[1]
+
+    def cached_subdirs(self, prefix):
+        """Return the subfolders found the last time the folder was listed."""
+        return self.folders[prefix][2]
+
+    def record_listing(self, prefix, file_count, subdirs):
+        """
+        Update a folder's relist interval after listing it.
+
+        Args:
+            prefix: Folder prefix that was listed
+            file_count: Number of files found in the folder itself
+            subdirs: Subfolder prefixes found in the folder
+        """
+        if file_count:
+            interval = 0
+        else:
+            previous = self.folders.get(prefix, (0,))[0]
+            interval = min(max(previous * 2, self.settings.CHECK_INTERVAL),
+                           self.settings.COLD_FOLDER_MAX_INTERVAL)
+        self.folders[prefix] = (interval, time.monotonic() + interval, subdirs)
+
+    def next_wait(self, processed):
+        """
+        Return the seconds to wait before the next cycle.
+
+        Args:
+            processed: Number of files processed in the cycle that just ended
+        """
+        if processed:
+            self.wait_time = self.settings.MIN_CHECK_INTERVAL
+        else:
+            self.wait_time = min(max(self.wait_time * 2, self.settings.MIN_CHECK_INTERVAL, 1),
+                                 self.settings.CHECK_INTERVAL)
+        return self.wait_time
+
+
+class WatermarkStore:
+    """
+    Remember the last key listed in each folder for delta listing.
+    A delta listing passes the watermark as StartAfter, so only keys sorting
+    after it are returned. Subfolders that sort before the watermark are not
+    returned by such a listing, so the subfolders from the last full listing
+    are kept and merged in. A folder is fully relisted once its last full
+    listing is FULL_RESCAN_INTERVAL seconds old, or after rewind() when one of
+    its files could not be processed.
+    """
+
+    def __init__(self, settings):
+        """
+        Args:
+            settings: Settings with FULL_RESCAN_INTERVAL
+        """
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.folders = {}  # prefix -> (watermark, last full listing time, subfolder prefixes)
+
+    def start_after(self, prefix):
+        """
+        Return the StartAfter value for the next listing of a folder.
+
+        Returns:
+            str: Watermark key, or None if the folder needs a full listing
+        """
+        with self.lock:
+            folder = self.folders.get(prefix)
+        if folder is None or folder[0] is None:
+            return None
+        if time.monotonic() - folder[1] >= self.settings.FULL_RESCAN_INTERVAL:
+            return None
+        return folder[0]
+
+    def record_listing(self, prefix, files, subdirs, start_after):
+        """
+        Advance a folder's watermark after listing it.
+
+        Args:
+            prefix: Folder prefix that was listed
+            files: Object entries returned by the listing
+            subdirs: Subfolder prefixes returned by the listing
+            start_after: StartAfter value used, or None for a full listing
+
+        Returns:
+            list: All known subfolder prefixes of the folder
+        """
+        with self.lock:
+            watermark, full_time, known_subdirs = self.folders.get(prefix, (None, 0, []))
+            if start_after is None:
+                watermark, full_time, known_subdirs = None, time.monotonic(), subdirs
+            else:
+                known_subdirs = sorted(set(known_subdirs) | set(subdirs))
+            if files:
+                watermark = max(watermark or '', max(obj['Key'] for obj in files))
+            self.folders[prefix] = (watermark, full_time, known_subdirs)
+        return known_subdirs
+
+    def rewind(self, key):
+        """Make the next listing of a file's folder a full one, so the file is seen again."""
+        prefix = key[:key.rfind('/') + 1]
+        with self.lock:
+            folder = self.folders.get(prefix)
+            if folder is not None:
+                self.folders[prefix] = (None, folder[1], folder[2])
+
+    def rewind_all(self):
+        """Make the next listing of every folder a full one."""
+        with self.lock:
+            self.folders = {prefix: (None, folder[1], folder[2]) for prefix, folder in self.folders.items()}
+
+
+class PrefixListing:
+    """Files and subfolders found in one folder, merged from one or more pages."""
+
+    def __init__(self):
+        self.files = []
+        self.subdirs = []
+        self.request_count = 0
+        self.response_bytes = 0
+        self.complete = True
+        self.seen_subdirs = set()
+
+    def add_page(self, response, prefix, high=None):
+        """
+        Merge one listing page, keeping entries up to an upper bound.
+
+        Args:
+            response: Page returned by Transport.list_page
+            prefix: Folder prefix that was listed
+            high: Inclusive upper key bound of the range, or None for no bound
+
+        Returns:
+            str: StartAfter value to continue the range with, or None if the range is done
+        """
+        self.request_count += 1
+        self.response_bytes += response.get('ResponseBytes', 0)
+        last = None
+
+        # Get files in current directory
+        for obj in response.get('Contents', []):
+            key = obj['Key']
+            last = max(last or key, key)
+            # Skip the prefix itself, empty directories and keys of the next range
+            if key != prefix and not key.endswith('/') and (high is None or key <= high):
+                self.files.append(obj)
+
+        # Get subdirectories for the caller to descend into
+        for prefix_obj in response.get('CommonPrefixes', []):
+            subdir = prefix_obj['Prefix']
+            last = max(last or subdir, subdir)
+            # A subfolder can straddle two ranges, so it may be reported twice
+            if (high is None or subdir <= high) and subdir not in self.seen_subdirs:
+                self.seen_subdirs.add(subdir)
+                self.subdirs.append(subdir)
+
+        if not response.get('IsTruncated') or last is None or (high is not None and last >= high):
+            return None
+        # Continue after a subfolder's whole subtree
+        return subtree_end(last) if last.endswith('/') else last
+
+    def finish_large(self, prefix):
+        """Sort the files merged from parallel key ranges and report the folder."""
+        self.files.sort(key=lambda obj: obj['Key'])
+        print(f"Listed large folder {prefix or '(root)'}: {len(self.files)} file(s) "
+              f"in {self.request_count} request(s)")
+
+
+def subtree_end(folder):
+    """
+    Return the largest possible key under a folder prefix, for continuing a
+    listing after its whole subtree with StartAfter. Unlike the next prefix
+    ('run1/' -> 'run10'), it cannot skip a sibling key that sorts right after
+    the subtree, since StartAfter excludes the key it names.
+
+    Args:
+        folder: Folder prefix ending with '/'
+
+    Returns:
+        str: Key of MAX_KEY_BYTES bytes, sorting after every key in the subtree
+            and before every key outside it
+    """
+    room = MAX_KEY_BYTES - len(folder.encode())
+    # Keys sort by their UTF-8 bytes, which follows code point order; the
+    # largest character of each UTF-8 length that XML (listing responses) allows
+    tail = '\U0010ffff' * (room // 4) + {0: '', 1: '\x7f', 2: '\u07ff', 3: '\ufffd'}[room % 4]
+    return folder + tail
+
+
+def key_midpoint(low, high):
+    """
+    Return a key that sorts strictly between two keys, for splitting a key range.
+    Keys are treated as base-95 numbers over printable ASCII.
+
+    Args:
+        low: Lower key (exclusive)
+        high: Upper key, or None for the end of the key space
+
+    Returns:
+        str: Key between low and high, or None if none could be found
+    """
+    upper = high if high is not None else '~' * (len(low) + 1)
+    width = max(len(low), len(upper)) + 1
+
+    def to_number(key):
+        digits = [min(max(ord(char) - 32, 0), 94) for char in key.ljust(width, ' ')]
+        number = 0
+        for digit in digits:
+            number = number * 95 + digit
+        return number
+
+    number = (to_number(low) + to_number(upper)) // 2
+    chars = []
+    for _ in range(width):
+        number, digit = divmod(number, 95)
+        chars.append(chr(digit + 32))
+    middle = ''.join(reversed(chars)).rstrip(' ')
+
+    if low < middle and (high is None or middle < high):
+        return middle
+    return None
+
+
+def write_json_atomic(path, data):
+    """
+    Write JSON to a file via a temporary file and rename, so readers never see a partial file.
+
+    Args:
+        path: Destination path
+        data: JSON-serializable data
+    """
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as temp_file:
+        json.dump(data, temp_file)
+    os.replace(temp_path, path)
+
+
+class PartialDownload:
+    """
+    Preallocated temporary file and resume state of one ranged download.
+    Completed parts are recorded in `<name>.part.json` next to `<name>.part`,
+    and are only reused if the state refers to the same ETag, size and part size.
+    With verify set, the parts are upload parts of a multipart ETag: each one
+    is hashed as it is written, and finish() checks the combined ETag.
+    """
+
+    def __init__(self, local_path, size, etag, part_size, verify=False, confirmed=False):
+        """
+        Args:
+            local_path: Final local path
+            size: Object size in bytes
+            etag: Object ETag
+            part_size: Bytes per range request
+            verify: Hash every part and check the ETag in finish()
+            confirmed: True if the server confirmed part_size as the upload part
+                size; otherwise it is inferred and a mismatch is not conclusive
+        """
+        self.local_path = local_path
+        self.temp_path = local_path + '.part'
+        self.state_path = local_path + '.part.json'
+        self.size = size
+        self.etag = etag
+        self.part_size = max(1, part_size)
+        self.part_count = (size + self.part_size - 1) // self.part_size
+        self.lock = threading.Lock()
+        self.written = {}
+        self.verify = verify
+        self.confirmed = confirmed
+        self.hashers = {}
+        self.digests = {}  # part index -> MD5 hex of a completed part
+
+        # Resume only if the previous attempt targeted the same object and part layout
+        self.done_parts = set()
+        try:
+            with open(self.state_path) as state_file:
+                state = json.load(state_file)
+            if (state.get('etag') == etag and state.get('size') == size
+                    and state.get('part_size') == self.part_size and os.path.exists(self.temp_path)):
+                self.done_parts = set(state['done'])
+                self.digests = {int(index): digest for index, digest in state.get('md5', {}).items()}
+                if verify:
+                    # Parts finished without verification are fetched again
+                    self.done_parts &= set(self.digests)
+        except (OSError, ValueError, KeyError):
+            pass
+        self.resumed = bool(self.done_parts)
+
+        if not self.done_parts:
+            with open(self.temp_path, 'wb') as temp_file:
+                if hasattr(os, 'posix_fallocate') and size:
+                    os.posix_fallocate(temp_file.fileno(), 0, size)
+                else:
+                    temp_file.truncate(size)
+
+        self.missing = [index for index in range(self.part_count) if index not in self.done_parts]
+
+    def report(self, part_workers):
+        """Print the part layout of the download."""
+        print(f"  Ranged download: {self.size / (1024 * 1024):.1f} MB in {self.part_count} part(s) of "
+              f"{self.part_size / (1024 * 1024):.0f} MB, {part_workers} parallel"
+              + (f", resuming with {len(self.missing)} part(s) left" if self.resumed else ""))
+
+    def part_range(self, index):
+        """Return the inclusive (start, end) byte range of a part."""
+        start = index * self.part_size
+        return start, min(start + self.part_size, self.size) - 1
+
+    def add_written(self, index, chunk):
+        """Count (and with verify, hash) a chunk written for a part."""
+        self.written[index] = self.written.get(index, 0) + len(chunk)
+        if self.verify:
+            self.hashers.setdefault(index, hashlib.md5()).update(chunk)
+
+    def mark_done(self, index):
+        """
+        Record a fully written part in the state file.
+
+        Raises:
+            IOError: If the part received fewer bytes than its range holds
+        """
+        start, end = self.part_range(index)
+        written = self.written.pop(index, 0)
+        hasher = self.hashers.pop(index, None)
+        if written != end - start + 1:
+            raise IOError(f"part {index} returned {written} of {end - start + 1} bytes")
+        with self.lock:
+            self.done_parts.add(index)
+            if hasher is not None:
+                self.digests[index] = hasher.hexdigest()
+            write_json_atomic(self.state_path, {
+                'etag': self.etag, 'size': self.size, 'part_size': self.part_size,
+                'done': sorted(self.done_parts), 'md5': self.digests
+            })
+
+    def finish(self, key):
+        """
+        Rename the completed temporary file into place and drop the state file.
+
+        Args:
+            key: Object key, for the error message
+
+        Returns:
+            bool: True if the parts were verified against the ETag, False if
+                not verified or the inferred part size did not reproduce it
+
+        Raises:
+            ChecksumMismatch: If the combined part MD5s do not match the ETag
+                with a confirmed part size; the temporary file is discarded so
+                the next attempt starts over
+        """
+        verified = self.verify
+        if self.verify:
+            actual = multipart_etag([bytes.fromhex(self.digests[index]) for index in range(self.part_count)])
+            expected = self.etag.strip('"').lower()
+            if actual != expected:
+                if self.confirmed:
+                    os.remove(self.temp_path)
+                    os.remove(self.state_path)
+                    raise ChecksumMismatch(key, expected, actual)
+                # The object may have been uploaded with another part size
+                verified = False
+        os.replace(self.temp_path, self.local_path)
+        os.remove(self.state_path)
+        return verified
+
+
+class DeleteBatcher:
+    """
+    Collect keys whose downloads are confirmed and remove them in batches.
+    A batch is flushed once DELETE_BATCH_SIZE keys are waiting or the oldest
+    key has waited DELETE_BATCH_INTERVAL seconds. Keys that the response
+    reports as failed (or does not report at all) are retried by the timer
+    after retry_delay() backs off, never assumed deleted.
+    """
+
+    def __init__(self, transport, settings, on_deleted, on_failed=None):
+        """
+        Args:
+            transport: Transport used for the removals
+            settings: Settings with the batch size, interval and attempts
+            on_deleted: Callable invoked with each key confirmed deleted
+            on_failed: Callable invoked with each key given up on, or None
+        """
+        self.transport = transport
+        self.settings = settings
+        self.on_deleted = on_deleted
+        self.on_failed = on_failed
+        self.batch_size = min(max(1, settings.DELETE_BATCH_SIZE), 1000)
+        self.lock = threading.Lock()
+        self.pending = []  # (key, attempts) tuples
+        self.retries = []  # (due time, key, attempts) tuples
+        self.oldest_time = None
+        self.stopped = threading.Event()
+        self.timer = threading.Thread(target=self._flush_on_interval, daemon=True)
+        self.timer.start()
+
+    def add(self, key, attempts=0):
+        """Queue a downloaded key for removal, flushing if the batch is full."""
+        with self.lock:
+            if not self.pending:
+                self.oldest_time = time.monotonic()
+            self.pending.append((key, attempts))
+            batch = self._take_batch() if len(self.pending) >= self.batch_size else None
+        if batch:
+            self._delete_batch(batch)
+
+    def close(self):
+        """Flush every waiting key, waiting out the backoff of retries, and stop the timer."""
+        self.stopped.set()
+        self.timer.join()
+        while True:
+            with self.lock:
+                batch = self._take_batch() or self._take_retries()
+                wait_time = min(due for due, _, _ in self.retries) - time.monotonic() if self.retries else None
+            if batch:
+                self._delete_batch(batch)
+            elif wait_time is None:
+                return
+            else:
+                time.sleep(max(0, wait_time))
+
+    def _take_batch(self):
+        """Remove and return up to batch_size waiting keys. Caller holds the lock."""
+        batch = self.pending[:self.batch_size]
+        self.pending = self.pending[self.batch_size:]
+        self.oldest_time = time.monotonic() if self.pending else None
+        return batch
+
+    def _take_retries(self):
+        """Remove and return up to batch_size retries whose backoff has passed. Caller holds the lock."""
+        now = time.monotonic()
+        batch, waiting = [], []
+        for due, key, attempts in self.retries:
+            if due <= now and len(batch) < self.batch_size:
+                batch.append((key, attempts))
+            else:
+                waiting.append((due, key, attempts))
+        self.retries = waiting
+        return batch
+
+    def _requeue(self, retries):
+        """Hold (due time, key, attempts) retries until the timer sends them."""
+        with self.lock:
+            self.retries.extend(retries)
+
+    def _flush_on_interval(self):
+        """Background loop that flushes batches older than DELETE_BATCH_INTERVAL and retries that are due."""
+        interval = max(0.1, self.settings.DELETE_BATCH_INTERVAL)
+        while not self.stopped.wait(min(interval, 0.5)):
+            with self.lock:
+                due = self.oldest_time is not None and time.monotonic() - self.oldest_time >= interval
+                batches = [self._take_batch() if due else None, self._take_retries()]
+            for batch in batches:
+                if batch:
+                    self._delete_batch(batch)
+
+    def _delete_batch(self, batch):
+        """Send one multi-object delete and requeue every key not confirmed deleted."""
+        errors = {}
+        deleted = set()
+
+        try:
+            if len(batch) == 1:
+                key = batch[0][0]
+                self.transport.delete(key)
+                deleted.add(key)
+            else:
+                deleted, errors = self.transport.delete_many([key for key, _ in batch])
+        except TransportError as e:
+            errors = {key: str(e) for key, _ in batch}
+        except Exception as e:
+            errors = {key: f"unexpected error: {e}" for key, _ in batch}
+        self._settle(batch, deleted, errors)
+
+    def _settle(self, batch, deleted, errors):
+        """Report a batch's outcome and requeue (or give up on) keys not deleted."""
+        attempts = dict(batch)
+        if deleted:
+            print(f"  ✓ Removed {len(deleted)} file(s) in one batch")
+        for key in deleted:
+            self.on_deleted(key)
+
+        retries = []
+        for key, attempt in attempts.items():
+            if key in deleted:
+                continue
+            reason = errors.get(key, "not confirmed in DeleteObjects response")
+            if attempt + 1 < self.settings.DELETE_MAX_ATTEMPTS:
+                delay = retry_delay(attempt, self.settings.RETRY_BASE_DELAY, self.settings.RETRY_MAX_DELAY)
+                print(f"  ✗ Failed to remove {key} ({reason}), retrying in {delay:.1f}s")
+                retries.append((time.monotonic() + delay, key, attempt + 1))
+            else:
+                print(f"  ⚠ File downloaded but not removed from remote: {key} ({reason})")
+                if self.on_failed is not None:
+                    self.on_failed(key)
+        if retries:
+            self._requeue(retries)
+
+
+class StateJournal:
+    """
+    On-disk SQLite journal of each remote file's progress.
+    Rows are keyed by object key and remember the ETag and size they refer to,
+    with state 'listed', 'downloading', 'downloaded', 'relayed' (copied to the
+    relay bucket in relay mode, not yet removed) or 'deleted'. Updates are
+    buffered and written in batches of JOURNAL_BATCH_SIZE, or once
+    JOURNAL_FLUSH_INTERVAL seconds have passed since the last write.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=2):
+        """
+        Args:
+            path: SQLite database file
+            batch_size: Buffered updates that trigger a write
+            flush_interval: Seconds after which buffered updates are written
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            " key TEXT PRIMARY KEY, etag TEXT, size INTEGER, state TEXT, updated_at REAL)"
+        )
+        # Deleted files are only kept for a week
+        self.conn.execute(
+            "DELETE FROM objects WHERE state = 'deleted' AND updated_at < ?",
+            (time.time() - 7 * 24 * 3600,)
+        )
+        self.conn.commit()
+
+    def lookup(self, obj):
+        """
+        Return the journaled state of a listed object.
+
+        Args:
+            obj: Object entry from the listing (Key, Size, ETag)
+
+        Returns:
+            str: State, or None if the journal has no entry for this ETag and size
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, size, state FROM objects WHERE key = ?", (obj['Key'],)
+            ).fetchone()
+        if row and row[0] == obj.get('ETag') and row[1] == obj.get('Size'):
+            return row[2]
+        return None
+
+    def record(self, key, state, etag=None, size=None):
+        """
+        Buffer a state change, writing the buffer if it is full or old enough.
+        A 'listed' update never overrides progress made on the same ETag and size.
+
+        Args:
+            key: Object key (path)
+            state: 'listed', 'downloading', 'downloaded', 'relayed' or 'deleted'
+            etag: Object ETag, if known
+            size: Object size in bytes, if known
+        """
+        with self.lock:
+            self.pending.append((key, etag, size, state, time.time()))
+            due = (len(self.pending) >= self.batch_size
+                   or time.monotonic() - self.last_flush >= self.flush_interval)
+            if due:
+                self._flush()
+
+    def flush(self):
+        """Write all buffered updates."""
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        """Write all buffered updates and close the database."""
+        with self.lock:
+            self._flush()
+            self.conn.close()
+
+    def _flush(self):
+        """Write buffered updates in one transaction. Caller holds the lock."""
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        listed = [row for row in self.pending if row[3] == 'listed']
+        progress = [row for row in self.pending if row[3] != 'listed']
+        self.pending = []
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO objects (key, etag, size, state, updated_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET etag = excluded.etag, size = excluded.size,"
+                " state = excluded.state, updated_at = excluded.updated_at"
+                " WHERE objects.etag IS NOT excluded.etag OR objects.size IS NOT excluded.size"
+                " OR objects.state = 'deleted'",
+                listed
+            )
+            self.conn.executemany(
+                "INSERT INTO objects (key, etag, size, state, updated_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET etag = COALESCE(excluded.etag, objects.etag),"
+                " size = COALESCE(excluded.size, objects.size),"
+                " state = excluded.state, updated_at = excluded.updated_at",
+                progress
+            )
+
+
+class QueuedKeys:
+    """
+    Keys of one cycle that are queued or being processed, so that a key both
+    listed and announced through the trigger endpoint is only processed once.
+    A key announced during the cycle stays known until the cycle ends, since
+    the listing may still hold it in a page fetched before it was announced.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = set()
+        self.triggered = set()
+
+    def claim(self, key, triggered=False):
+        """
+        Reserve a key for the work queue.
+
+        Args:
+            key: Object key about to be queued
+            triggered: True for an announced key, False for a listed one
+
+        Returns:
+            bool: False if the key is already queued or being processed, or
+                is listed after it was announced this cycle
+        """
+        with self.lock:
+            if key in self.active or (not triggered and key in self.triggered):
+                return False
+            self.active.add(key)
+            if triggered:
+                self.triggered.add(key)
+            return True
+
+    def release(self, key):
+        """Forget a key once a worker is done with it."""
+        with self.lock:
+            self.active.discard(key)
+
+
+class CycleStats:
+    """Thread-safe counters for the files processed in one cycle."""
+
+    def __init__(self, journal=None, watermarks=None, metrics=None):
+        """
+        Args:
+            journal: StateJournal told about every removed file, or None
+            watermarks: WatermarkStore rewound for every failed file, or None
+            metrics: Metrics updated with every file, or None
+        """
+        self.journal = journal
+        self.watermarks = watermarks
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        # Files queued this cycle (counted under the lock, by the listing and trigger threads)
+        self.listed_count = 0
+        self.processed_count = 0
+        self.downloaded_count = 0
+        self.bytes_downloaded = 0
+        self.retry_count = 0
+        self.dedup_count = 0
+        self.bytes_deduplicated = 0
+        self.verification_counts = {}
+
+    def record_download(self, size):
+        """Count one downloaded file of the given size."""
+        with self.lock:
+            self.downloaded_count += 1
+            self.bytes_downloaded += size
+        if self.metrics is not None:
+            self.metrics.file_downloaded(size)
+
+    def record_dedup(self, size):
+        """Count one file created from the dedup store instead of being downloaded."""
+        with self.lock:
+            self.dedup_count += 1
+            self.bytes_deduplicated += size
+        if self.metrics is not None:
+            self.metrics.file_deduplicated(size)
+
+    def record_verification(self, result):
+        """Count one download checked against its ETag: 'verified', 'unverified' or 'mismatch'."""
+        with self.lock:
+            self.verification_counts[result] = self.verification_counts.get(result, 0) + 1
+        if self.metrics is not None:
+            self.metrics.verifications.inc(labels=(result,))
+
+    def record_retry(self, count=1):
+        """Count download attempts repeated within the cycle."""
+        with self.lock:
+            self.retry_count += count
+        if self.metrics is not None:
+            self.metrics.retries.inc(count)
+
+    def record_removed(self, remote_path):
+        """Count one file that was downloaded and removed from the remote."""
+        with self.lock:
+            self.processed_count += 1
+        if self.journal is not None:
+            self.journal.record(remote_path, 'deleted')
+        if self.metrics is not None:
+            self.metrics.file_removed(remote_path)
+
+    def record_failure(self, remote_path):
+        """Note a file that is left on the remote, so the next listing sees it again."""
+        if self.watermarks is not None:
+            self.watermarks.rewind(remote_path)
+        if self.metrics is not None:
+            self.metrics.file_failed(remote_path)
+
+
+class SyncEngine:
+    """
+    Download-and-remove cycles over one network volume folder.
+    Owns the state that lives across cycles: the poll scheduler, delta
+    listing watermarks and the state journal.
+    """
+
+    def __init__(self, settings, transport):
+        """
+        Args:
+            settings: Settings for this volume
+            transport: Transport backend used for every request
+        """
+        self.settings = settings
+        self.transport = transport
+        self.journal = None
+        if settings.JOURNAL_PATH:
+            self.journal = StateJournal(settings.JOURNAL_PATH, settings.JOURNAL_BATCH_SIZE,
+                                        settings.JOURNAL_FLUSH_INTERVAL)
+        self.dedup = DedupStore(settings) if settings.DEDUP_DIR else None
+        self.disk_budget = DiskBudget(settings) if settings.DISK_BUDGET else None
+        self.scheduler = PollScheduler(settings) if settings.ADAPTIVE_POLLING else None
+        self.watermarks = WatermarkStore(settings) if settings.DELTA_LISTING else None
+        self.concurrency = None
+        if settings.ADAPTIVE_CONCURRENCY:
+            self.concurrency = AdaptiveConcurrency(settings, self.worker_count())
+        # Set by run() when METRICS_PORT is configured (see metrics.py)
+        self.metrics = None
+        # Replaced by run() when TRACE_DIR is configured (see tracing.py)
+        self.tracer = NULL_TRACER
+        # Set by run() when FLEET_DIR is configured (see fleet.py)
+        self.fleet = None
+        # Set by run() when RELAY_ENDPOINT_URL is configured (see relay.py)
+        self.relay = None
+        # Set by run() when POST_PROCESS_HOOKS is configured (see post_process.py)
+        self.post_processor = None
+        # Set by run() when TRIGGER_PORT or TRIGGER_SOCKET is configured (see triggers.py)
+        self.triggers = None
+        # Set by the multi-volume daemon to the FairShare pools of listing
+        # requests and downloads shared with other volumes (see multi_volume.py)
+        self.list_slots = None
+        self.transfer_slots = None
+        self.work_queue = None
+
+    def worker_count(self):
+        """Number of downloads that may run at once (the ceiling for adaptive concurrency)."""
+        return max(1, self.settings.DOWNLOAD_WORKERS)
+
+    @property
+    def bulk(self):
+        """True if folders are downloaded with one bulk call per chunk of files."""
+        return self.settings.BULK_MODE and self.transport.supports_bulk and self.relay is None
+
+    def close(self):
+        """Finish post-processing and relayed uploads, write and close the journal and leave the fleet."""
+        if self.post_processor is not None:
+            self.post_processor.close()
+        if self.journal is not None:
+            self.journal.close()
+        if self.fleet is not None:
+            self.fleet.close()
+        if self.relay is not None:
+            self.relay.close()
+
+    def list_remote_files(self):
+        """
+        List all files in the remote folder recursively.
+        Uses delimiter-based listing to avoid Runpod pagination bug.
+
+        Returns:
+            list: List of file keys (paths)
+        """
+        return [obj['Key'] for obj in self.iter_remote_files()]
+
+    def iter_remote_files(self):
+        """
+        Yield every file in the remote folder as soon as its folder is listed.
+
+        Yields:
+            dict: Object entry from the listing (Key, Size, ETag)
+        """
+        prefix = self.root_prefix()
+        path_filter = self.path_filter()
+
+        start_time = time.monotonic()
+        listing_stats = ListingStats()
+        yield from self.iter_files_in_prefix(prefix, listing_stats, path_filter)
+        self.report_listing(listing_stats, time.monotonic() - start_time, path_filter)
+
+    def iter_owned_files(self):
+        """
+        Yield every file in the remote folder this instance is responsible
+        for, leaving the others to their fleet members (see fleet.py).
+        """
+        if self.fleet is None:
+            yield from self.iter_remote_files()
+            return
+        self.check_fleet()
+        skipped_count = 0
+        for obj in self.iter_remote_files():
+            if self.fleet.owns(obj['Key']):
+                yield obj
+            else:
+                skipped_count += 1
+        self.report_fleet(skipped_count)
+
+    def check_fleet(self):
+        """
+        Relist every folder in full after the keys owned by this instance
+        changed, since keys behind a delta listing watermark may have moved here.
+        """
+        if self.fleet.split_changed() and self.watermarks is not None:
+            self.watermarks.rewind_all()
+
+    def report_fleet(self, skipped_count):
+        """Print how the listed files were split with the other fleet members."""
+        if skipped_count:
+            print(f"Fleet: left {skipped_count} file(s) to {self.fleet.other_members()} other member(s)")
+
+    def still_owned(self, obj):
+        """Return False for a queued file that moved to another fleet member since it was listed."""
+        return self.fleet is None or self.fleet.owns(obj['Key'])
+
+    def root_prefix(self):
+        """Return the prefix of the monitored remote folder ('' for the volume root)."""
+        remote_folder = self.settings.REMOTE_FOLDER
+        return remote_folder.rstrip('/') + '/' if remote_folder else ''
+
+    def path_filter(self):
+        """Return the PathFilter built from the include and exclude settings."""
+        return PathFilter(self.settings.INCLUDE_PATTERNS, self.settings.EXCLUDE_PATTERNS)
+
+    def report_listing(self, listing_stats, elapsed, path_filter):
+        """Print the summary of one walk of the remote folder."""
+        print(f"Listed {listing_stats.file_count} file(s) in {listing_stats.prefix_count} "
+              f"folder(s) in {elapsed:.2f}s ({listing_stats.request_count} request(s), "
+              f"{listing_stats.response_bytes / 1024:.1f} KB"
+              + (f", {listing_stats.delta_count} delta" if listing_stats.delta_count else "")
+              + (f", skipped {listing_stats.skipped_count} quiet folder(s)" if listing_stats.skipped_count else "")
+              + ")")
+        if path_filter.active:
+            print(f"Filters pruned {listing_stats.pruned_count} folder(s) and "
+                  f"skipped {listing_stats.filtered_count} file(s)")
+
+    def iter_files_in_prefix(self, prefix, listing_stats, path_filter=None):
+        """
+        Walk all files below a prefix, breadth-first.
+        Every folder is listed with its own delimiter-based call, and up to
+        LIST_WORKERS sibling folders are listed at the same time. New folders
+        are only queued while the consumer keeps pulling keys, so a slow
+        consumer also slows down listing.
+
+        Args:
+            prefix: S3 prefix (folder path) to list
+            listing_stats: ListingStats updated as folders are listed
+            path_filter: PathFilter applied to paths relative to prefix, or None
+
+        Yields:
+            dict: Object entry from the listing
+        """
+        with ThreadPoolExecutor(max_workers=max(1, self.settings.LIST_WORKERS)) as pool:
+            pending = {}
+
+            def queue_folder(folder_prefix):
+                for current, start_after in self.folders_to_list(folder_prefix, prefix, listing_stats, path_filter):
+                    future = pool.submit(self.list_prefix_level, current, start_after)
+                    pending[future] = (current, start_after)
+
+            queue_folder(prefix)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    listed_prefix, start_after = pending.pop(future)
+                    listing = future.result()
+                    # Queue subdirectories as soon as their parent is known
+                    for subdir_prefix in self.record_level(listing_stats, listed_prefix, start_after, listing):
+                        queue_folder(subdir_prefix)
+                    yield from self.accepted_files(listing_stats, listing, prefix, path_filter)
+
+    def folders_to_list(self, folder_prefix, prefix, listing_stats, path_filter=None):
+        """
+        Decide which folders to list for a newly found folder.
+        Pruned folders are dropped, and folders that are not due are skipped
+        while their subfolders (from the scheduler's cache) are still visited.
+
+        Args:
+            folder_prefix: Folder that was found
+            prefix: Prefix of the monitored remote folder
+            listing_stats: ListingStats updated with pruned and skipped folders
+            path_filter: PathFilter applied to paths relative to prefix, or None
+
+        Returns:
+            list: (folder prefix, StartAfter value or None) for each folder to list
+        """
+        scheduler = self.scheduler
+        watermarks = self.watermarks
+        to_list = []
+        skipped = [folder_prefix]
+        while skipped:
+            current = skipped.pop()
+            if path_filter is not None and path_filter.prune_folder(current[len(prefix):]):
+                listing_stats.pruned_count += 1
+            elif scheduler is None or scheduler.is_due(current):
+                start_after = watermarks.start_after(current) if watermarks is not None else None
+                to_list.append((current, start_after))
+            else:
+                listing_stats.skipped_count += 1
+                skipped.extend(scheduler.cached_subdirs(current))
+        return to_list
+
+    def record_level(self, listing_stats, listed_prefix, start_after, listing):
+        """
+        Account for one listed folder and update the watermarks and scheduler.
+
+        Args:
+            listing_stats: ListingStats for this walk
+            listed_prefix: Folder prefix that was listed
+            start_after: StartAfter value used, or None for a full listing
+            listing: PrefixListing, or None if the listing failed
+
+        Returns:
+            list: Subfolder prefixes to visit next
+        """
+        if listing is None:
+            listing_stats.request_count += 1
+            listing_stats.error_count += 1
+            return []
+        subdirs = listing.subdirs
+        listing_stats.prefix_count += 1
+        listing_stats.request_count += listing.request_count
+        listing_stats.response_bytes += listing.response_bytes
+        if start_after is not None:
+            listing_stats.delta_count += 1
+        if not listing.complete:
+            # Some key ranges failed; relist this folder in full next cycle
+            listing_stats.error_count += 1
+            if self.watermarks is not None:
+                self.watermarks.rewind(listed_prefix)
+        else:
+            if self.watermarks is not None:
+                subdirs = self.watermarks.record_listing(listed_prefix, listing.files, subdirs, start_after)
+            if self.scheduler is not None:
+                self.scheduler.record_listing(listed_prefix, len(listing.files), subdirs)
+        return subdirs
+
+    def accepted_files(self, listing_stats, listing, prefix, path_filter=None):
+        """Return the files of a listed folder that pass the path filter."""
+        if listing is None:
+            return []
+        accepted = []
+        for obj in listing.files:
+            if path_filter is not None and not path_filter.matches_file(obj['Key'][len(prefix):]):
+                listing_stats.filtered_count += 1
+                continue
+            listing_stats.file_count += 1
+            accepted.append(obj)
+        return accepted
+
+    def list_prefix_level(self, prefix, start_after=None):
+        """
+        List a single level of a prefix using delimiter to avoid pagination issues.
+        If the first page is truncated, the rest of the folder is listed with
+        list_prefix_shards instead of continuation tokens.
+
+        Args:
+            prefix: S3 prefix (folder path) to list
+            start_after: Only list keys that sort after this key, or None for all
+
+        Returns:
+            PrefixListing: Files and subfolders of the folder, or None on error
+        """
+        try:
+            response = self.list_page(prefix, start_after)
+        except Exception as e:
+            self.report_list_error(prefix, e)
+            return None
+
+        listing = PrefixListing()
+        next_start = listing.add_page(response, prefix)
+        if next_start is not None:
+            self.list_prefix_shards(prefix, listing, next_start)
+            listing.finish_large(prefix)
+
+        return listing
+
+    def list_page(self, prefix, start_after=None):
+        """Request one listing page, holding a shared listing slot if the daemon set one up."""
+        if self.list_slots is None:
+            return self.transport.list_page(prefix, start_after)
+        self.list_slots.acquire(self)
+        try:
+            return self.transport.list_page(prefix, start_after)
+        finally:
+            self.list_slots.release(self)
+
+    def report_list_error(self, prefix, error):
+        """Print why the first page of a folder listing failed."""
+        if isinstance(error, TransportError):
+            if error.code == 'NoSuchBucket':
+                print(f"✗ Network volume '{self.settings.NETWORK_VOLUME_ID}' not found")
+            else:
+                print(f"✗ Error listing prefix '{prefix}': {error}")
+        else:
+            print(f"✗ Unexpected error listing prefix '{prefix}': {error}")
+
+    def list_prefix_shards(self, prefix, listing, start_after):
+        """
+        List the rest of a large folder as key ranges, LIST_SHARD_WORKERS at a time.
+        Each range is walked with StartAfter only (Runpod repeats continuation
+        tokens on large listings). Whenever a range returns a full page, the
+        remainder of that range is split in two at a midpoint key, so dense key
+        ranges are spread over more parallel requests.
+
+        Args:
+            prefix: S3 prefix (folder path) to list
+            listing: PrefixListing to merge the pages into
+            start_after: Key after which the unlisted part of the folder starts
+        """
+        with ThreadPoolExecutor(max_workers=max(1, self.settings.LIST_SHARD_WORKERS)) as pool:
+            pending = {}
+
+            def queue_range(low, high):
+                # Ranges are (low, high]; keys are split relative to the folder prefix
+                middle = key_midpoint(low[len(prefix):], high[len(prefix):] if high else None)
+                bounds = [low, high] if middle is None else [low, prefix + middle, high]
+                for range_low, range_high in zip(bounds, bounds[1:]):
+                    future = pool.submit(self.list_page, prefix, range_low)
+                    pending[future] = (range_low, range_high)
+
+            queue_range(start_after, None)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    low, high = pending.pop(future)
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        print(f"✗ Error listing prefix '{prefix}' after '{low}': {e}")
+                        listing.complete = False
+                        continue
+                    next_start = listing.add_page(response, prefix, high)
+                    if next_start is not None:
+                        queue_range(next_start, high)
+
+    def download_file(self, remote_path, local_path, size=None, etag=None, stats=None):
+        """
+        Download a file from the network volume.
+        Files of at least LARGE_FILE_THRESHOLD bytes use a resumable ranged
+        download if the transport supports byte ranges. A failed download is
+        retried up to RETRY_ATTEMPTS times in total, after an exponential
+        backoff with jitter, unless the error is permanent (e.g. the key is gone).
+
+        Args:
+            remote_path: Key (path) on the network volume
+            local_path: Local destination path
+            size: Object size in bytes from the listing, if known
+            etag: Object ETag from the listing, if known
+            stats: CycleStats counting the retries and verifications, or None
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        settings = self.settings
+        attempts = max(1, settings.RETRY_ATTEMPTS)
+        for attempt in range(attempts):
+            error, verified = self.attempt_download(remote_path, local_path, size, etag)
+            if self.record_download_result(remote_path, error, verified, stats):
+                return True
+            if attempt + 1 == attempts or not is_retryable(error):
+                return False
+            delay = retry_delay(attempt, settings.RETRY_BASE_DELAY, settings.RETRY_MAX_DELAY)
+            print(f"  ↻ Retrying {remote_path} in {delay:.1f}s (attempt {attempt + 2}/{attempts})")
+            if stats is not None:
+                stats.record_retry()
+            time.sleep(delay)
+        return False
+
+    @property
+    def verify(self):
+        """True if downloads are hashed while streaming and checked against their ETag."""
+        return self.settings.VERIFY_DOWNLOADS and self.transport.supports_verify
+
+    def needs_part_size(self, size, etag):
+        """True if a download will be verified against a multipart ETag, so its upload part size is worth a HEAD."""
+        parsed = parse_etag(etag)
+        return self.verify and bool(size) and parsed is not None and parsed[1] > 0
+
+    def upload_part_size(self, remote_path, size, etag):
+        """
+        Ask the server for the upload part size of an object verified against
+        a multipart ETag (see integrity.confirmed_part_size).
+
+        Returns:
+            int or None: Confirmed part size, or None if not needed or not reported
+        """
+        if not self.needs_part_size(size, etag):
+            return None
+        try:
+            return confirmed_part_size(etag, size, self.transport.first_part_size(remote_path))
+        except TransportError:
+            return None
+
+    def ranged_part_size(self, size, etag, part_size=None):
+        """
+        Decide how to fetch a file.
+
+        Args:
+            size: Object size in bytes from the listing
+            etag: ETag from the listing
+            part_size: Upload part size confirmed by the server, or None
+
+        Returns:
+            tuple: (use a ranged download, bytes per range or None for PART_SIZE)
+        """
+        threshold = self.settings.LARGE_FILE_THRESHOLD
+        if not (threshold and self.transport.supports_ranges and size is not None and size >= threshold):
+            return False, None
+        if self.verify and parse_etag(etag) is not None:
+            # Ranges can only be hashed as they arrive when each one is an upload
+            # part of a multipart ETag; anything else streams through one GET
+            part_size = part_size or aligned_part_size(etag, size)
+            return part_size is not None, part_size
+        return True, None
+
+    def record_download_result(self, remote_path, error, verified, stats):
+        """
+        Print the outcome of one download attempt and count its verification.
+
+        Returns:
+            bool: True if the download succeeded
+        """
+        relayed = self.relay is not None
+        if error is None:
+            print(f"  ✓ {'Relayed' if relayed else 'Downloaded'}: {remote_path}"
+                  + (" (checksum verified)" if verified else ""))
+            if stats is not None and self.verify:
+                stats.record_verification('verified' if verified else 'unverified')
+            return True
+        if isinstance(error, ChecksumMismatch) and stats is not None:
+            stats.record_verification('mismatch')
+        if isinstance(error, TransportError):
+            print(f"  ✗ Failed to {'relay' if relayed else 'download'} {remote_path}: {error}")
+        else:
+            print(f"  ✗ Unexpected error {'relaying' if relayed else 'downloading'} {remote_path}: {error!r}")
+        return False
+
+    def attempt_download(self, remote_path, local_path, size=None, etag=None):
+        """
+        Download a file once (or in relay mode, copy it to the relay bucket),
+        holding room in the disk budget and an adaptive concurrency slot if
+        enabled, and a shared transfer slot if the daemon set one up.
+
+        Returns:
+            tuple: (the error the download failed with or None on success,
+                    True if the content was verified against the ETag)
+        """
+        if self.disk_budget is not None:
+            self.disk_budget.acquire(size)
+        if self.concurrency is not None:
+            self.concurrency.acquire()
+        if self.transfer_slots is not None:
+            self.transfer_slots.acquire(self)
+        start_time = time.monotonic()
+        error = None
+        verified = False
+        try:
+            part_size = self.upload_part_size(remote_path, size, etag)
+            if self.relay is not None:
+                checksum = StreamChecksum(remote_path, etag, size, part_size) if self.verify else None
+                verified = self.relay.copy(self.transport, remote_path, size, checksum)
+                verified = verified and (checksum is None or checksum.verified)
+                return None, verified
+
+            # Create local directory if it doesn't exist
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+            ranged, range_size = self.ranged_part_size(size, etag, part_size)
+            if ranged:
+                verified = self.download_large_file(remote_path, local_path, size, etag, range_size,
+                                                    confirmed=part_size is not None)
+            else:
+                checksum = StreamChecksum(remote_path, etag, size, part_size) if self.verify else None
+                self.transport.download(remote_path, local_path, checksum)
+                verified = checksum is not None and checksum.verified
+
+        except Exception as e:
+            error = e
+        finally:
+            if self.transfer_slots is not None:
+                self.transfer_slots.release(self)
+            if self.concurrency is not None:
+                self.concurrency.release(time.monotonic() - start_time, size, error)
+            if self.disk_budget is not None:
+                self.disk_budget.release(size, [local_path] if error is None else ())
+        return error, verified
+
+    def download_large_file(self, remote_path, local_path, size, etag, part_size=None, confirmed=False):
+        """
+        Fetch a large file as concurrent byte ranges into a preallocated temporary file.
+        Completed parts are recorded in a state file next to the temporary file, so an
+        interrupted transfer resumes with the missing parts only. The finished file is
+        atomically renamed to local_path.
+
+        Args:
+            remote_path: Key (path) on the network volume
+            local_path: Local destination path
+            size: Object size in bytes
+            etag: Object ETag, used to detect a changed remote file
+            part_size: Upload part size of a multipart ETag to fetch and verify
+                part by part, or None for unverified PART_SIZE ranges
+            confirmed: True if the server confirmed part_size; a mismatch
+                against an inferred part size leaves the file unverified
+
+        Returns:
+            bool: True if the parts were verified against the ETag
+
+        Raises:
+            TransportError: If a range request fails or the parts do not match the ETag
+            IOError: If a range returns fewer bytes than requested
+        """
+        part_workers = self.settings.PART_WORKERS
+        partial = PartialDownload(local_path, size, etag, part_size or self.settings.PART_SIZE,
+                                  verify=part_size is not None, confirmed=confirmed)
+        partial.report(part_workers)
+
+        def fetch_part(index):
+            start, end = partial.part_range(index)
+            with open(partial.temp_path, 'r+b') as temp_file:
+                temp_file.seek(start)
+                for chunk in self.transport.get_range(remote_path, start, end, etag):
+                    with self.tracer.span('write', 'transfer', remote_path):
+                        temp_file.write(chunk)
+                    partial.add_written(index, chunk)
+            partial.mark_done(index)
+
+        with ThreadPoolExecutor(max_workers=max(1, part_workers)) as pool:
+            # list() re-raises the first failed part
+            list(pool.map(fetch_part, partial.missing))
+
+        return partial.finish(remote_path)
+
+    def remove_remote_file(self, remote_path):
+        """
+        Remove a file from the network volume.
+
+        Args:
+            remote_path: Key (path) on the network volume
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            self.transport.delete(remote_path)
+            print(f"  ✓ Removed: {remote_path}")
+            return True
+
+        except TransportError as e:
+            print(f"  ✗ Failed to remove {remote_path}: {e}")
+            return False
+        except Exception as e:
+            print(f"  ✗ Unexpected error removing {remote_path}: {e}")
+            return False
+
+    def already_downloaded(self, obj):
+        """Return True if the journal shows this ETag and size downloaded and the local copy is intact."""
+        local_path = os.path.join(self.settings.LOCAL_DOWNLOAD_DIR, obj['Key'])
+        return (
+            self.journal is not None
+            and self.journal.lookup(obj) == 'downloaded'
+            and os.path.isfile(local_path)
+            and os.path.getsize(local_path) == obj.get('Size')
+        )
+
+    def link_duplicate(self, obj, local_path, stats):
+        """
+        Create the local copy of a file from the dedup store if a file with
+        the same ETag and size was downloaded before.
+
+        Returns:
+            bool: True if no download is needed
+        """
+        if self.dedup is None or not self.dedup.link(obj, local_path):
+            return False
+        print(f"  ✓ Linked duplicate (same ETag and size): {obj['Key']}")
+        stats.record_dedup(obj['Size'])
+        if self.journal is not None:
+            self.journal.record(obj['Key'], 'downloaded', obj.get('ETag'), obj['Size'])
+        return True
+
+    def record_downloaded(self, obj, local_path, stats):
+        """Count a downloaded file, add it to the dedup store and journal it."""
+        stats.record_download(os.path.getsize(local_path))
+        if self.dedup is not None:
+            self.dedup.add(obj, local_path)
+        if self.journal is not None:
+            self.journal.record(obj['Key'], 'downloaded', obj.get('ETag'), obj.get('Size'))
+
+    def post_process(self, obj, local_path):
+        """Hand a file that landed in the download directory to the post-processing hooks, if any."""
+        if self.post_processor is not None:
+            # Waits while the stage is full, so slow hooks hold the downloads back
+            self.post_processor.submit(local_path, obj)
+
+    def finish_file(self, obj, stats, delete_batcher=None):
+        """
+        Remove a downloaded file from the network volume, or queue it for batch removal.
+
+        Args:
+            obj: Object entry from the listing (Key, Size, ETag)
+            stats: CycleStats for this cycle
+            delete_batcher: DeleteBatcher, or None to remove the file right away
+        """
+        remote_path = obj['Key']
+        if delete_batcher is not None:
+            delete_batcher.add(remote_path)
+        elif self.remove_remote_file(remote_path):
+            stats.record_removed(remote_path)
+        else:
+            print(f"  ⚠ File downloaded but not removed from remote: {remote_path}")
+            stats.record_failure(remote_path)
+
+    def process_file(self, obj, stats, delete_batcher=None):
+        """
+        Download a single file and remove it from the network volume.
+        The remote file is only removed (or queued for batch removal) after
+        its own download succeeded. If the journal shows the same ETag and size
+        was already downloaded and the local copy is intact, the transfer is skipped;
+        a file with the ETag and size of one in the dedup store is hardlinked from there.
+
+        Args:
+            obj: Object entry from the listing (Key, Size, ETag)
+            stats: CycleStats for this cycle
+            delete_batcher: DeleteBatcher, or None to remove the file right away
+        """
+        if self.relay is not None:
+            self.relay_file(obj, stats, delete_batcher)
+            return
+        remote_path = obj['Key']
+        size = obj.get('Size')
+        etag = obj.get('ETag')
+        journal = self.journal
+
+        # Create local path maintaining directory structure
+        local_path = os.path.join(self.settings.LOCAL_DOWNLOAD_DIR, remote_path)
+
+        print(f"\nProcessing: {remote_path}")
+
+        if self.already_downloaded(obj):
+            print(f"  ✓ Already downloaded (journal): {remote_path}")
+        elif self.link_duplicate(obj, local_path, stats):
+            self.post_process(obj, local_path)
+        else:
+            if journal is not None:
+                journal.record(remote_path, 'downloading', etag, size)
+
+            # Download the file
+            if not self.download_file(remote_path, local_path, size, etag, stats):
+                print(f"  ⚠ Skipping removal due to download failure: {remote_path}")
+                stats.record_failure(remote_path)
+                return
+            self.record_downloaded(obj, local_path, stats)
+            self.post_process(obj, local_path)
+
+        # Only remove if download was successful
+        self.finish_file(obj, stats, delete_batcher)
+
+    def relay_file(self, obj, stats, delete_batcher=None):
+        """
+        Copy a single file to the relay bucket and remove it from the network
+        volume once the copy is verified. The journal row moves from
+        'downloading' to 'relayed' once the copy is complete; if it already
+        shows 'relayed' for the same ETag and size, only the removal is left
+        to do.
+
+        Args:
+            obj: Object entry from the listing (Key, Size, ETag)
+            stats: CycleStats for this cycle
+            delete_batcher: DeleteBatcher, or None to remove the file right away
+        """
+        remote_path = obj['Key']
+        size = obj.get('Size')
+        etag = obj.get('ETag')
+        journal = self.journal
+
+        print(f"\nProcessing: {remote_path}")
+
+        if journal is not None and journal.lookup(obj) == 'relayed':
+            print(f"  ✓ Already relayed (journal): {remote_path}")
+        else:
+            if journal is not None:
+                journal.record(remote_path, 'downloading', etag, size)
+            if not self.download_file(remote_path, None, size, etag, stats):
+                print(f"  ⚠ Skipping removal due to relay failure: {remote_path}")
+                stats.record_failure(remote_path)
+                return
+            stats.record_download(size or 0)
+            if journal is not None:
+                journal.record(remote_path, 'relayed', etag, size)
+
+        self.finish_file(obj, stats, delete_batcher)
+
+    def process_folder_chunk(self, objs, stats, delete_batcher=None):
+        """
+        Download files of one folder with a single bulk transport call.
+        A file counts as downloaded only when the local copy exists and
+        matches the listed size; only those files are removed.
+
+        Args:
+            objs: Object entries from the listing, all in the same folder
+            stats: CycleStats for this cycle
+            delete_batcher: DeleteBatcher, or None to remove files one by one
+        """
+        settings = self.settings
+        journal = self.journal
+        local_root = settings.LOCAL_DOWNLOAD_DIR
+        prefix = objs[0]['Key'][:objs[0]['Key'].rfind('/') + 1]
+        print(f"\nProcessing folder: {prefix or '(root)'} ({len(objs)} file(s))")
+
+        pending = []
+        for obj in objs:
+            if self.already_downloaded(obj):
+                print(f"  ✓ Already downloaded (journal): {obj['Key']}")
+                self.finish_file(obj, stats, delete_batcher)
+            elif self.link_duplicate(obj, os.path.join(local_root, obj['Key']), stats):
+                self.post_process(obj, os.path.join(local_root, obj['Key']))
+                self.finish_file(obj, stats, delete_batcher)
+            else:
+                pending.append(obj)
+                if journal is not None:
+                    journal.record(obj['Key'], 'downloading', obj.get('ETag'), obj.get('Size'))
+        if not pending:
+            return
+
+        # Files still missing after a bulk call are retried after a backoff
+        attempts = max(1, settings.RETRY_ATTEMPTS)
+        local_dir = os.path.join(local_root, prefix)
+        for attempt in range(attempts):
+            error = self.attempt_folder_download(prefix, pending, local_dir)
+            if error is not None:
+                print(f"  ✗ Bulk download reported errors in {prefix or '(root)'}: {error}")
+
+            missing = []
+            for obj in pending:
+                remote_path = obj['Key']
+                local_path = os.path.join(local_root, remote_path)
+                if os.path.isfile(local_path) and os.path.getsize(local_path) == obj.get('Size'):
+                    print(f"  ✓ Downloaded: {remote_path}")
+                    self.record_downloaded(obj, local_path, stats)
+                    self.post_process(obj, local_path)
+                    self.finish_file(obj, stats, delete_batcher)
+                else:
+                    missing.append(obj)
+            pending = missing
+            if not pending or attempt + 1 == attempts:
+                break
+            delay = retry_delay(attempt, settings.RETRY_BASE_DELAY, settings.RETRY_MAX_DELAY)
+            print(f"  ↻ Retrying {len(pending)} file(s) in {prefix or '(root)'} in {delay:.1f}s "
+                  f"(attempt {attempt + 2}/{attempts})")
+            stats.record_retry(len(pending))
+            time.sleep(delay)
+
+        for obj in pending:
+            remote_path = obj['Key']
+            print(f"  ✗ Failed to download {remote_path}")
+            print(f"  ⚠ Skipping removal due to download failure: {remote_path}")
+            stats.record_failure(remote_path)
+
+    def attempt_folder_download(self, prefix, objs, local_dir):
+        """
+        Run one bulk download of files in a folder, holding room in the disk
+        budget and an adaptive concurrency slot if enabled, and a shared
+        transfer slot if the daemon set one up.
+
+        Returns:
+            Exception or None: The error the bulk call reported, or None
+        """
+        size = sum(obj.get('Size') or 0 for obj in objs)
+        if self.disk_budget is not None:
+            self.disk_budget.acquire(size)
+        if self.concurrency is not None:
+            self.concurrency.acquire()
+        if self.transfer_slots is not None:
+            self.transfer_slots.acquire(self)
+        start_time = time.monotonic()
+        error = None
+        try:
+            os.makedirs(local_dir, exist_ok=True)
+            self.transport.download_folder(prefix, [obj['Key'] for obj in objs], local_dir)
+        except Exception as e:
+            error = e
+        finally:
+            if self.transfer_slots is not None:
+                self.transfer_slots.release(self)
+            if self.concurrency is not None:
+                self.concurrency.release(time.monotonic() - start_time, size, error)
+            if self.disk_budget is not None:
+                self.disk_budget.release(size, [os.path.join(local_dir, obj['Key'][len(prefix):]) for obj in objs])
+        return error
+
+    def download_worker(self, key_queue, stats, delete_batcher, queued_keys=None):
+        """
+        Take work items from the queue and process them until a None sentinel arrives.
+
+        Args:
+            key_queue: Queue of object entries (or lists of them in bulk mode)
+            stats: CycleStats shared by all workers
+            delete_batcher: DeleteBatcher shared by all workers, or None
+            queued_keys: QueuedKeys told about every processed key, or None
+        """
+        while True:
+            item = key_queue.get()
+            if item is None:
+                return
+            objs = item if isinstance(item, list) else [item]
+            try:
+                if isinstance(item, list):
+                    item = [obj for obj in item if self.still_owned(obj)]
+                    if item:
+                        with self.tracer.span('folder', 'engine', item[0]['Key'].rpartition('/')[0]):
+                            self.process_folder_chunk(item, stats, delete_batcher)
+                elif self.still_owned(item):
+                    with self.tracer.span('file', 'engine', item['Key']):
+                        self.process_file(item, stats, delete_batcher)
+            finally:
+                if queued_keys is not None:
+                    for obj in objs:
+                        queued_keys.release(obj['Key'])
+
+    def record_queued(self, obj, stats):
+        """Count a file about to be queued and record it as listed in the journal and metrics."""
+        with stats.lock:
+            stats.listed_count += 1
+        if self.journal is not None:
+            self.journal.record(obj['Key'], 'listed', obj.get('ETag'), obj.get('Size'))
+        if self.metrics is not None:
+            self.metrics.file_listed(obj)
+
+    def feed_triggers(self, key_queue, stats, queued_keys, listing_done):
+        """
+        Queue keys announced through the trigger endpoint into the running
+        cycle until its listing ends; keys announced after that are fetched
+        by wait_for_triggers() once the cycle is over.
+
+        Args:
+            key_queue: Work queue of the cycle
+            stats: CycleStats of the cycle
+            queued_keys: QueuedKeys of the cycle, shared with the listing
+            listing_done: Event set once the listing has queued its last file
+        """
+        while not listing_done.is_set():
+            keys = self.triggers.wait(1.0)
+            if not keys:
+                continue
+            print(f"  Triggered: {len(keys)} key(s), joining the running cycle")
+            try:
+                objs = self.triggered_objects(keys)
+            except Exception as e:
+                print(f"  ✗ Error checking triggered keys, leaving them to the listing: {e}")
+                continue
+            for obj in objs:
+                if queued_keys.claim(obj['Key'], triggered=True):
+                    self.record_queued(obj, stats)
+                    key_queue.put(obj)
+
+    def iter_work_items(self):
+        """
+        Yield listed files as work items: single entries, or in bulk mode lists
+        of up to BULK_COPY_CHUNK_SIZE entries from the same folder.
+        """
+        if not self.bulk:
+            yield from self.iter_owned_files()
+            return
+        chunk_size = max(1, self.settings.BULK_COPY_CHUNK_SIZE)
+        chunk = []
+        chunk_folder = None
+        for obj in self.iter_owned_files():
+            folder = obj['Key'][:obj['Key'].rfind('/') + 1]
+            if chunk and (len(chunk) >= chunk_size or folder != chunk_folder):
+                yield chunk
+                chunk = []
+            chunk.append(obj)
+            chunk_folder = folder
+        if chunk:
+            yield chunk
+
+    def triggered_objects(self, keys):
+        """
+        Turn keys announced through the trigger endpoint into object entries.
+        The size and ETag of the keys select_triggered() accepts are read with
+        one HEAD request per key.
+
+        Args:
+            keys: Full keys on the volume
+
+        Returns:
+            list: Object entries (Key, Size, ETag) of the keys to fetch
+        """
+        return self.describe_triggered(self.select_triggered(keys))
+
+    def select_triggered(self, keys):
+        """
+        Pick the announced keys this instance fetches. Keys outside
+        REMOTE_FOLDER, rejected by the path filters, naming a folder or leaving
+        the download directory are skipped with a warning; keys owned by
+        another fleet member are left to its next listing.
+
+        Args:
+            keys: Full keys on the volume
+
+        Returns:
+            list: Object entries with only a Key
+        """
+        prefix = self.root_prefix()
+        path_filter = self.path_filter()
+        objs = []
+        for key in keys:
+            relative_path = key[len(prefix):]
+            if (not key.startswith(prefix) or not relative_path or key.endswith('/')
+                    or key.startswith('/') or '..' in key.split('/')):
+                print(f"  ⚠ Ignoring triggered key outside {prefix or 'the volume'}: {key}")
+            elif path_filter.active and not path_filter.matches_file(relative_path):
+                print(f"  ⚠ Ignoring triggered key excluded by filters: {key}")
+            elif self.fleet is not None and not self.fleet.owns(key):
+                print(f"  Leaving triggered key to its fleet member: {key}")
+            else:
+                objs.append({'Key': key})
+        return objs
+
+    def describe_triggered(self, objs):
+        """
+        Fill in the Size and ETag of triggered entries with HEAD requests, so they
+        are verified, deduplicated and budgeted like listed files.
+
+        Returns:
+            list: Entries of the objects found; keys that are gone or cannot be
+                checked are skipped with a warning (the next listing retries them)
+        """
+        found = []
+        for obj in objs:
+            try:
+                size, etag = self.transport.head_object(obj['Key'])
+            except TransportError as e:
+                report_missing_trigger(obj['Key'], e)
+                continue
+            found.append(dict(obj, Size=size, ETag=etag))
+        return found
+
+    def process_files(self, objs=None):
+        """
+        Download and remove all files from the remote folder.
+        Keys stream from the lister into a bounded queue that DOWNLOAD_WORKERS
+        threads (sharing one transport) drain, so transfers start while listing
+        is still running and memory stays bounded by DOWNLOAD_QUEUE_SIZE.
+        With the trigger endpoint, keys announced while the folder is listed
+        join the same queue (see feed_triggers).
+
+        Args:
+            objs: Object entries to process instead of listing the folder
+                (keys announced through the trigger endpoint), or None
+
+        Returns:
+            int: Number of files processed
+        """
+        settings = self.settings
+        journal = self.journal
+        metrics = self.metrics
+        stats = CycleStats(journal, self.watermarks, metrics)
+        delete_batcher = None
+        if settings.DELETE_BATCH_SIZE > 1:
+            delete_batcher = DeleteBatcher(self.transport, settings, stats.record_removed, stats.record_failure)
+        worker_count = self.worker_count()
+        key_queue = queue.Queue(maxsize=max(1, settings.DOWNLOAD_QUEUE_SIZE))
+        self.work_queue = key_queue
+        queued_keys = feeder = None
+        if self.triggers is not None and objs is None:
+            queued_keys = QueuedKeys()
+            listing_done = threading.Event()
+            feeder = threading.Thread(
+                target=self.feed_triggers,
+                args=(key_queue, stats, queued_keys, listing_done),
+                daemon=True
+            )
+        workers = [
+            threading.Thread(
+                target=self.download_worker,
+                args=(key_queue, stats, delete_batcher, queued_keys),
+                daemon=True
+            )
+            for _ in range(worker_count)
+        ]
+
+        self.transport.take_counts()
+        if metrics is not None and objs is None:
+            metrics.cycle_started()
+        self.tracer.begin_cycle()
+        start_time = time.monotonic()
+        for worker in workers:
+            worker.start()
+        if feeder is not None:
+            feeder.start()
+        try:
+            for item in self.iter_work_items() if objs is None else objs:
+                if queued_keys is not None:
+                    # Skip files a trigger already queued
+                    claimed = [obj for obj in (item if isinstance(item, list) else [item])
+                               if queued_keys.claim(obj['Key'])]
+                    if not claimed:
+                        continue
+                    item = claimed if isinstance(item, list) else claimed[0]
+                for obj in item if isinstance(item, list) else [item]:
+                    self.record_queued(obj, stats)
+                # Blocks while the queue is full, which pauses listing
+                key_queue.put(item)
+        finally:
+            if feeder is not None:
+                listing_done.set()
+                self.triggers.wake()
+                feeder.join()
+            for _ in workers:
+                key_queue.put(None)
+            for worker in workers:
+                worker.join()
+            if delete_batcher is not None:
+                delete_batcher.close()
+            if journal is not None:
+                journal.flush()
+        elapsed = max(time.monotonic() - start_time, 1e-6)
+
+        self.report_transfer(stats, elapsed, worker_count)
+        self.prune_dedup_store()
+        self.tracer.end_cycle()
+
+        processed_count = stats.processed_count
+
+        return processed_count
+
+    def report_transfer(self, stats, elapsed, worker_count):
+        """Print the throughput of a cycle and the requests it needed."""
+        downloaded_count = stats.downloaded_count
+        counts = self.transport.take_counts()
+        if downloaded_count:
+            megabytes = stats.bytes_downloaded / (1024 * 1024)
+            print(f"\nTransferred {downloaded_count} file(s), {megabytes:.1f} MB in {elapsed:.1f}s "
+                  f"({downloaded_count / elapsed:.1f} files/s, {megabytes / elapsed:.1f} MB/s, "
+                  f"{worker_count} worker(s))")
+            print(f"Backend {self.transport.name}: "
+                  + ", ".join(f"{counts[operation]} {operation}" for operation in sorted(counts))
+                  + " request(s)")
+        if self.bulk and self.transport.name == 'cli' and stats.listed_count:
+            # Per-file mode launches one `aws s3 cp` and one `aws s3 rm` per file
+            launches = counts.get('get', 0) + counts.get('delete', 0)
+            per_file_launches = 2 * stats.listed_count
+            print(f"Bulk mode used {launches} aws process(es) instead of {per_file_launches} "
+                  f"(saved {per_file_launches - launches})")
+        if self.concurrency is not None:
+            limit, low, high, throttled = self.concurrency.take_cycle_stats()
+            if downloaded_count or stats.retry_count or throttled:
+                print(f"Concurrency: {limit} download(s) in flight (range {low}-{high} this cycle), "
+                      f"{throttled} throttled response(s), {stats.retry_count} retried download(s)")
+        elif stats.retry_count:
+            print(f"Retried {stats.retry_count} download(s)")
+        verification_counts = stats.verification_counts
+        if verification_counts:
+            print("Integrity: " + ", ".join(
+                f"{verification_counts[result]} {result}" for result in ('verified', 'unverified', 'mismatch')
+                if result in verification_counts) + " download(s)")
+        if stats.dedup_count:
+            print(f"Dedup: linked {stats.dedup_count} duplicate file(s), "
+                  f"saved {stats.bytes_deduplicated / (1024 * 1024):.1f} MB of transfer")
+        if self.post_processor is not None:
+            processed, failed, wait_seconds, stages, pending = self.post_processor.take_stats()
+            if processed or failed:
+                print(f"Post-processing: {processed} file(s) done, {failed} failed, {pending} queued, "
+                      f"{wait_seconds / (processed + failed):.2f}s average wait; "
+                      + ", ".join(f"{name} {stage.seconds / stage.count:.2f}s average "
+                                  f"({stage.max_seconds:.2f}s max)" for name, stage in stages.items()))
+            elif pending:
+                print(f"Post-processing: {pending} file(s) queued")
+        budget = self.disk_budget
+        if budget is not None and (downloaded_count or budget.paused):
+            print(f"Disk budget: {format_size(budget.used)} of {format_size(budget.budget)} on disk"
+                  + (", downloads paused" if budget.paused else "")
+                  + (f", {budget.evicted_count} file(s) evicted so far" if budget.evicted_count else ""))
+
+    def prune_dedup_store(self):
+        """Remove dedup store entries no longer linked from the downloads (at most hourly)."""
+        if self.dedup is None:
+            return
+        pruned = self.dedup.prune()
+        if pruned:
+            print(f"Dedup: removed {pruned} stored file(s) no longer linked from the downloads")
+
+    def check_bucket(self):
+        """Send a HeadBucket request for the network volume."""
+        self.transport.head_bucket()
+
+    def test_connection(self):
+        """
+        Test the connection to the network volume.
+
+        Returns:
+            bool: True if connection successful
+        """
+        volume_id = self.settings.NETWORK_VOLUME_ID
+        try:
+            self.check_bucket()
+            print(f"✓ Successfully connected to network volume: {volume_id}")
+            return True
+        except TransportError as e:
+            if e.code in ('404', 'NoSuchBucket'):
+                print(f"✗ Network volume '{volume_id}' not found")
+            elif e.code in ('403', 'AccessDenied'):
+                print(f"✗ Access denied to network volume '{volume_id}'")
+                print("  Check your credentials and permissions")
+            else:
+                print(f"✗ Error connecting to network volume: {e}")
+            return False
+        except Exception as e:
+            print(f"✗ Unexpected error testing connection: {e}")
+            return False
+
+
+def report_missing_trigger(key, error):
+    """Print why a triggered key is not fetched after its HEAD request failed."""
+    if error.code in ('404', 'NoSuchKey', 'NotFound'):
+        print(f"  ⚠ Ignoring triggered key not on the volume: {key}")
+    else:
+        print(f"  ⚠ Could not check triggered key {key}, leaving it to the next listing: {error}")
+
+
+def wait_for_triggers(engine, triggers, wait_time):
+    """
+    Wait until the next check, fetching keys announced through the trigger
+    endpoint as soon as they arrive.
+
+    Args:
+        engine: SyncEngine (or AsyncEngine) of the volume
+        triggers: TriggerServer receiving the keys
+        wait_time: Seconds until the next full check
+
+    Returns:
+        int: Number of announced files processed
+    """
+    processed = 0
+    deadline = time.monotonic() + wait_time
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return processed
+        keys = triggers.wait(remaining)
+        if not keys:
+            continue
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        print(f"\n[{timestamp}] Triggered: {len(keys)} key(s)")
+        objs = engine.triggered_objects(keys)
+        if objs:
+            count = engine.process_files(objs)
+            processed += count
+            print(f"\n✓ Processed {count} triggered file(s)")
+
+
+def run(settings, title):
+    """
+    Main loop that continuously monitors and downloads files.
+
+    Args:
+        settings: Settings for the network volume
+        title: Banner title printed at startup
+    """
+    print("=" * 60)
+    print(title)
+    print("=" * 60)
+    print(f"Network Volume: {settings.NETWORK_VOLUME_ID}")
+    print(f"Datacenter: {settings.DATACENTER}")
+    print(f"Endpoint: {settings.ENDPOINT_URL}")
+    print(f"Remote folder: {settings.REMOTE_FOLDER or '(root)'}")
+    if settings.RELAY_ENDPOINT_URL:
+        print(f"Relay target: {settings.RELAY_ENDPOINT_URL} {settings.RELAY_BUCKET}/{settings.RELAY_PREFIX}")
+    else:
+        print(f"Local directory: {settings.LOCAL_DOWNLOAD_DIR}")
+    if settings.ADAPTIVE_POLLING:
+        print(f"Check interval: {settings.MIN_CHECK_INTERVAL}-{settings.CHECK_INTERVAL}s (adaptive)")
+    else:
+        print(f"Check interval: {settings.CHECK_INTERVAL}s")
+    if settings.ENGINE == 'asyncio':
+        print(f"Engine: asyncio ({settings.ASYNC_DOWNLOAD_TASKS} download task(s), "
+              f"{settings.ASYNC_MAX_CONNECTIONS} connection(s))")
+    else:
+        print(f"Transport: {settings.TRANSPORT}")
+        print(f"Download workers: {settings.DOWNLOAD_WORKERS}")
+    if settings.ADAPTIVE_CONCURRENCY:
+        print(f"Adaptive concurrency: from {settings.MIN_CONCURRENCY} download(s) in flight, "
+              f"retrying failed downloads up to {settings.RETRY_ATTEMPTS} attempt(s)")
+    print(f"List workers: {settings.LIST_WORKERS}")
+    print("=" * 60)
+
+    if settings.RELAY_ENDPOINT_URL and settings.ENGINE == 'asyncio':
+        print("⚠ The asyncio engine cannot relay files; using worker threads")
+        settings.ENGINE = 'threads'
+
+    if settings.ENGINE == 'asyncio':
+        # The asyncio engine brings its own SigV4 client, so TRANSPORT does not apply
+        from async_engine import AsyncEngine
+        engine = AsyncEngine(settings)
+    else:
+        # Check prerequisites and pick the transport backend
+        transport = create_transport(settings)
+        if transport is None:
+            sys.exit(1)
+        engine = SyncEngine(settings, transport)
+    transport = engine.transport
+
+    # Test connection
+    if not engine.test_connection():
+        sys.exit(1)
+
+    if settings.LARGE_FILE_THRESHOLD and transport.supports_ranges:
+        print(f"✓ Ranged downloads: files >= {settings.LARGE_FILE_THRESHOLD // (1024 * 1024)} MB, "
+              f"{settings.PART_SIZE // (1024 * 1024)} MB parts, {settings.PART_WORKERS} parallel")
+    if engine.verify:
+        print("✓ Download verification: MD5 / multipart ETags checked while streaming, before removal")
+    elif settings.VERIFY_DOWNLOADS:
+        print(f"⚠ Download verification unavailable with the {transport.name} backend; "
+              f"files are not checked against their ETag")
+    if settings.RELAY_ENDPOINT_URL:
+        if not transport.supports_relay:
+            print(f"✗ Relay mode needs the http or boto3 transport, not {transport.name}")
+            sys.exit(1)
+        engine.relay = create_relay(settings)
+        if engine.relay is None:
+            sys.exit(1)
+        print(f"✓ Relay: streaming files to {settings.RELAY_BUCKET} in "
+              f"{engine.relay.part_size // (1024 * 1024)} MB parts, up to {engine.relay.window} uploading per file; "
+              f"nothing is written to disk")
+        if settings.DEDUP_DIR:
+            print("⚠ DEDUP_DIR is not used in relay mode")
+        if engine.disk_budget is not None:
+            print("⚠ DISK_BUDGET is not used in relay mode")
+            engine.disk_budget = None
+        if settings.POST_PROCESS_HOOKS:
+            print("⚠ POST_PROCESS_HOOKS are not run in relay mode; no file lands on disk")
+    if engine.bulk:
+        print(f"✓ Bulk mode: up to {settings.BULK_COPY_CHUNK_SIZE} file(s) of a folder per download call")
+
+    if engine.relay is None:
+        # Create local download directory
+        os.makedirs(settings.LOCAL_DOWNLOAD_DIR, exist_ok=True)
+        print(f"✓ Local download directory ready: {settings.LOCAL_DOWNLOAD_DIR}")
+    if engine.disk_budget is not None:
+        budget = engine.disk_budget
+        print(f"✓ Disk budget: {format_size(budget.budget)}, pausing downloads above {format_size(budget.high)} "
+              f"until below {format_size(budget.low)}; {format_size(budget.used)} in use")
+        if budget.eviction:
+            print(f"✓ Eviction: consumed files older than {settings.DISK_MIN_RETENTION}s are deleted while paused")
+    if settings.POST_PROCESS_HOOKS and engine.relay is None:
+        try:
+            engine.post_processor = PostProcessor(settings)
+        except ValueError as e:
+            print(f"✗ {e}")
+            engine.close()
+            sys.exit(1)
+        engine.post_processor.disk_budget = engine.disk_budget
+        print(f"✓ Post-processing: {', '.join(hook_name(hook) for hook in engine.post_processor.hooks)} "
+              f"on {engine.post_processor.workers} process(es), up to {engine.post_processor.queue_size} "
+              f"file(s) queued")
+
+    if engine.journal is not None:
+        print(f"✓ State journal ready: {settings.JOURNAL_PATH}")
+
+    metrics = None
+    if settings.METRICS_PORT:
+        metrics = Metrics(engine)
+        try:
+            metrics.serve(settings.METRICS_HOST, settings.METRICS_PORT)
+        except OSError as e:
+            print(f"✗ Cannot serve metrics on {settings.METRICS_HOST}:{settings.METRICS_PORT}: {e}")
+            engine.close()
+            sys.exit(1)
+        engine.metrics = transport.metrics = metrics
+        if engine.relay is not None:
+            engine.relay.target.metrics = metrics
+        if engine.post_processor is not None:
+            engine.post_processor.metrics = metrics
+        print(f"✓ Metrics: http://{settings.METRICS_HOST}:{settings.METRICS_PORT}/metrics")
+
+    if settings.TRACE_DIR:
+        engine.tracer = transport.tracer = Tracer(settings)
+        if engine.relay is not None:
+            engine.relay.target.tracer = engine.tracer
+        print(f"✓ Tracing: one Chrome trace per cycle in {settings.TRACE_DIR}")
+
+    triggers = None
+    if settings.TRIGGER_PORT or settings.TRIGGER_SOCKET:
+        triggers = engine.triggers = TriggerServer(settings)
+        try:
+            triggers.serve()
+        except OSError as e:
+            print(f"✗ Cannot serve the trigger endpoint on {triggers.address}: {e}")
+            engine.close()
+            if metrics is not None:
+                metrics.close()
+            sys.exit(1)
+        print(f"✓ Trigger endpoint: POST keys to {triggers.address}")
+
+    if settings.FLEET_DIR:
+        try:
+            engine.fleet = Fleet(settings)
+        except OSError as e:
+            print(f"✗ Cannot join the fleet in {settings.FLEET_DIR}: {e}")
+            engine.close()
+            if metrics is not None:
+                metrics.close()
+            if triggers is not None:
+                triggers.close()
+            sys.exit(1)
+        others = len(engine.fleet.records) - 1
+        print(f"✓ Fleet: member {engine.fleet.member_id}, {others} other member(s) in {engine.fleet.store.path}")
+
+    print("\nStarting monitoring loop (Press Ctrl+C to stop)...\n")
+
+    cycle_count = 0
+    total_processed = 0
+
+    try:
+        if engine.fleet is not None and engine.fleet.join_delay() > 0:
+            # The other members pick up a new member at their next heartbeat
+            print(f"Joining the fleet in {engine.fleet.join_delay():.0f}s...")
+            time.sleep(engine.fleet.join_delay())
+
+        while True:
+            cycle_count += 1
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+            print(f"\n[{timestamp}] Cycle #{cycle_count}")
+            print("-" * 60)
+
+            cycle_start = time.monotonic()
+            processed = engine.process_files()
+            total_processed += processed
+            if metrics is not None:
+                metrics.cycle_finished(time.monotonic() - cycle_start)
+
+            if processed > 0:
+                print(f"\n✓ Processed {processed} file(s) this cycle")
+                print(f"  Total processed: {total_processed}")
+            else:
+                print("No files found")
+
+            if engine.scheduler is not None:
+                wait_time = engine.scheduler.next_wait(processed)
+            else:
+                wait_time = settings.CHECK_INTERVAL
+            print(f"\nWaiting {wait_time}s before next check...")
+            if triggers is None:
+                time.sleep(wait_time)
+            else:
+                total_processed += wait_for_triggers(engine, triggers, wait_time)
+
+    except KeyboardInterrupt:
+        print("\n\n" + "=" * 60)
+        print("Shutting down gracefully...")
+        print(f"Total files processed: {total_processed}")
+        print("=" * 60)
+        sys.exit(0)
+    except Exception as e:
+        print(f"\n\n✗ Unexpected error: {e}")
+        print(f"Total files processed before error: {total_processed}")
+        sys.exit(1)
+    finally:
+        engine.close()
+        if metrics is not None:
+            metrics.close()
+        if triggers is not None:
+            triggers.close()
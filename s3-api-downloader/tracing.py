@@ -0,0 +1,144 @@
+"""
+Per-phase tracing of download cycles for the Runpod network volume downloaders.
+
+With TRACE_DIR set, every cycle is written as a Chrome trace
+(chrome://tracing or https://ui.perfetto.dev) to TRACE_DIR/cycle-<n>-<time>.json
+and the TRACE_TOP_N slowest spans are printed. Spans:
+
+- file: one key from start of download to removal (or batch queueing)
+- list, get, delete, head: one S3 request until its response arrives
+  (time to first byte); for the AWS CLI the whole `aws` process, including its startup
+- body: reading one chunk of a response body
+- write: writing one chunk to disk
+
+Cycles that found no files are not written. Each worker thread (or asyncio
+task) gets its own row. When tracing is off, the engine uses NULL_TRACER,
+whose spans are a shared no-op context manager.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+NULL_SPAN = nullcontext()
+
+
+class NullTracer:
+    """Tracer used when tracing is disabled; every method does nothing."""
+
+    def span(self, name, category='engine', detail=None):
+        return NULL_SPAN
+
+    def begin_cycle(self):
+        pass
+
+    def end_cycle(self):
+        pass
+
+
+NULL_TRACER = NullTracer()
+
+
+class Tracer:
+    """Collects spans for one cycle at a time and writes them as a Chrome trace."""
+
+    def __init__(self, settings):
+        """
+        Args:
+            settings: Settings with TRACE_DIR and TRACE_TOP_N
+        """
+        self.trace_dir = settings.TRACE_DIR
+        self.top_n = settings.TRACE_TOP_N
+        self.lock = threading.Lock()
+        self.events = []
+        self.lanes = {}  # thread ident or task id -> trace row
+        self.cycle_count = 0
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        os.makedirs(self.trace_dir, exist_ok=True)
+
+    def lane(self):
+        """Return the trace row of the calling thread, or of the running asyncio task."""
+        try:
+            owner = ('task', id(asyncio.current_task()))
+        except RuntimeError:
+            owner = ('thread', threading.get_ident())
+        with self.lock:
+            lane = self.lanes.get(owner)
+            if lane is None:
+                lane = self.lanes[owner] = len(self.lanes) + 1
+            return lane
+
+    @contextmanager
+    def span(self, name, category='engine', detail=None):
+        """
+        Record the enclosed block as one span.
+
+        Args:
+            name: Phase name (e.g. 'get', 'write')
+            category: Trace category ('engine', 'request' or 'transfer')
+            detail: Key, prefix or other detail shown with the span
+        """
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.add(name, category, start, time.perf_counter(), detail, error)
+
+    def add(self, name, category, start, end, detail=None, error=None):
+        """Record a span from perf_counter() start to end."""
+        args = {}
+        if detail is not None:
+            args['detail'] = detail
+        if error is not None:
+            args['error'] = str(error)
+        event = {
+            'name': name, 'cat': category, 'ph': 'X', 'pid': self.pid, 'tid': self.lane(),
+            'ts': round((start - self.origin) * 1e6, 1), 'dur': round((end - start) * 1e6, 1), 'args': args,
+        }
+        with self.lock:
+            self.events.append(event)
+
+    def begin_cycle(self):
+        """Start collecting the spans of a new cycle."""
+        with self.lock:
+            self.events = []
+            # Rows are numbered per cycle; asyncio tasks do not outlive one
+            self.lanes = {}
+            self.cycle_count += 1
+
+    def end_cycle(self):
+        """Write the cycle's trace file and print the phase totals and slowest spans."""
+        with self.lock:
+            events, self.events = self.events, []
+            lanes = dict(self.lanes)
+        # Idle cycles (listing only) are not worth a file
+        if not any(event['cat'] == 'engine' for event in events):
+            return
+        path = os.path.join(self.trace_dir, f"cycle-{self.cycle_count:04d}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': lane,
+             'args': {'name': f"{kind} {lane}"}}
+            for (kind, _), lane in lanes.items()
+        ]
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, trace_file)
+
+        print(f"\nTrace: {path} ({len(events)} span(s))")
+        totals = {}
+        for event in events:
+            count, total, longest = totals.get(event['name'], (0, 0.0, 0.0))
+            totals[event['name']] = (count + 1, total + event['dur'], max(longest, event['dur']))
+        for name, (count, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            print(f"  {name:<10} {count:>6} span(s) {total / 1e6:>9.3f}s total {longest / 1e6:>8.3f}s max")
+        if self.top_n:
+            print(f"  Slowest {min(self.top_n, len(events))} span(s):")
+            for event in sorted(events, key=lambda event: -event['dur'])[:self.top_n]:
+                print(f"    {event['dur'] / 1e6:8.3f}s {event['name']:<10} {event['args'].get('detail', '')}")
@@ -0,0 +1,976 @@
+"""
+Transport backends for the Runpod network volume downloaders.
+
+Every backend talks to the S3-compatible API through the same small interface,
+so the shared engine (sync_engine.py) runs unchanged on top of any of them:
+
+- 'cli': the AWS CLI, one `aws` process per request (no Python dependencies)
+- 'boto3': a pooled Boto3 client
+- 'http': a minimal SigV4-signed HTTP client on the standard library, with one
+  keep-alive connection per thread
+- 'auto': probe every available backend at startup and use the fastest
+
+Object entries returned by list_page use the list_objects_v2 field names
+(Key, Size, ETag), and failures are raised as TransportError.
+"""
+
+import base64
+import copy
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from tracing import NULL_SPAN
+
+
+class TransportError(Exception):
+    """A request the remote rejected or that could not be completed."""
+
+    def __init__(self, message, code=None):
+        """
+        Args:
+            message: Human-readable description
+            code: S3 error code (e.g. 'NoSuchBucket', '404', 'PreconditionFailed'), if known
+        """
+        super().__init__(message)
+        self.code = code
+
+
+class RequestCounter:
+    """
+    Requests counted per operation ('list', 'get', 'delete', 'head', 'put'), so the
+    engine can report how many calls a cycle needed. If metrics is set (see
+    metrics.py), timed() also records each request's latency and errors; if
+    tracer is set (see tracing.py), requests and body chunks become spans.
+    """
+
+    def __init__(self):
+        self.counts_lock = threading.Lock()
+        self.request_counts = {}
+        self.metrics = None
+        self.tracer = None
+
+    def count(self, operation, requests=1):
+        """Count requests of one operation."""
+        with self.counts_lock:
+            self.request_counts[operation] = self.request_counts.get(operation, 0) + requests
+
+    @contextmanager
+    def timed(self, operation, detail=None):
+        """
+        Count a request of one operation and time the block sending it.
+
+        Args:
+            operation: 'list', 'get', 'delete', 'head' or 'put' (relay uploads)
+            detail: Key or prefix the request is for, shown in traces
+        """
+        self.count(operation)
+        if self.metrics is None and self.tracer is None:
+            yield
+            return
+        start_time = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            end_time = time.perf_counter()
+            if self.metrics is not None:
+                self.metrics.observe_request(operation, end_time - start_time, error)
+            if self.tracer is not None:
+                self.tracer.add(self.span_name(operation), 'request', start_time, end_time, detail, error)
+
+    def span_name(self, operation):
+        """Trace span name of a request."""
+        return operation
+
+    def span(self, name, detail=None):
+        """Return a trace span for a transfer phase ('body' or 'write'), or a no-op if not tracing."""
+        return NULL_SPAN if self.tracer is None else self.tracer.span(name, 'transfer', detail)
+
+    def take_counts(self):
+        """Return the request counts since the last call and reset them."""
+        with self.counts_lock:
+            counts, self.request_counts = self.request_counts, {}
+        return counts
+
+
+class Transport(RequestCounter):
+    """Interface shared by all backends."""
+
+    name = ''
+    # True if get_range is implemented (resumable ranged downloads)
+    supports_ranges = False
+    # True if download_folder is implemented (one call for many files of a folder)
+    supports_bulk = False
+    # True if download feeds every chunk to a checksum (see integrity.py)
+    supports_verify = False
+    # True if get_stream and the upload methods are implemented (see relay.py)
+    supports_relay = False
+
+    def __init__(self, settings):
+        """
+        Args:
+            settings: Settings with the volume, endpoint and credentials
+        """
+        super().__init__()
+        self.settings = settings
+        self.bucket = settings.NETWORK_VOLUME_ID
+        self.region = settings.DATACENTER.lower()  # S3 clients expect a lowercase region
+
+    @staticmethod
+    def check():
+        """Check the backend's prerequisites, printing the result. Returns True if usable."""
+        return True
+
+    def for_volume(self, settings):
+        """
+        Return a backend for another network volume on the same endpoint with
+        the same credentials. It shares this backend's client and connections
+        but counts its own requests.
+
+        Args:
+            settings: Settings of the other volume
+        """
+        transport = copy.copy(self)
+        RequestCounter.__init__(transport)
+        transport.settings = settings
+        transport.bucket = settings.NETWORK_VOLUME_ID
+        return transport
+
+    def head_bucket(self):
+        """Check that the network volume exists and is accessible."""
+        raise NotImplementedError
+
+    def list_page(self, prefix, start_after=None):
+        """
+        Request one delimiter-based page (up to 1000 entries) of a folder listing.
+
+        Args:
+            prefix: S3 prefix (folder path) to list
+            start_after: Only list keys that sort after this key, or None for all
+
+        Returns:
+            dict: Contents (Key, Size, ETag entries), CommonPrefixes (Prefix entries),
+                  IsTruncated and ResponseBytes
+        """
+        raise NotImplementedError
+
+    def download(self, key, local_path, checksum=None):
+        """
+        Download a whole object to local_path.
+
+        Args:
+            key: Object key
+            local_path: Local destination path
+            checksum: StreamChecksum fed every chunk and verified before the
+                file is renamed into place, or None (see integrity.py)
+        """
+        raise NotImplementedError
+
+    def get_range(self, key, start, end, etag=None):
+        """
+        Fetch an inclusive byte range of an object.
+
+        Args:
+            key: Object key
+            start: First byte
+            end: Last byte
+            etag: Fail with code 'PreconditionFailed' unless the object still has this ETag
+
+        Yields:
+            bytes: Chunks of the range, in order
+        """
+        raise NotImplementedError
+
+    def get_stream(self, key):
+        """
+        Fetch a whole object without writing it to disk.
+
+        Yields:
+            bytes: Chunks of the body, in order
+        """
+        raise NotImplementedError
+
+    def head_object(self, key):
+        """
+        Return the size and ETag of an object.
+
+        Returns:
+            tuple: (size in bytes, ETag)
+        """
+        raise NotImplementedError
+
+    def first_part_size(self, key):
+        """
+        Return the size of upload part 1 of an object (`HEAD ?partNumber=1`),
+        which is the upload part size of a multipart object.
+
+        Returns:
+            int or None: Part size in bytes, or None if the transport cannot ask
+        """
+        return None
+
+    def put_object(self, key, body, digest):
+        """
+        Upload an object in one request.
+
+        Args:
+            key: Object key
+            body: Object content
+            digest: Binary MD5 of body, sent as Content-MD5 so the target rejects a corrupt body
+
+        Returns:
+            str: ETag of the new object
+        """
+        raise NotImplementedError
+
+    def create_multipart_upload(self, key):
+        """Start a multipart upload and return its upload id."""
+        raise NotImplementedError
+
+    def upload_part(self, key, upload_id, number, body, digest):
+        """
+        Upload one part of a multipart upload.
+
+        Args:
+            key: Object key
+            upload_id: Id returned by create_multipart_upload
+            number: Part number, starting at 1
+            body: Part content
+            digest: Binary MD5 of body, sent as Content-MD5
+
+        Returns:
+            str: ETag of the part
+        """
+        raise NotImplementedError
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        """
+        Assemble the uploaded parts into the object.
+
+        Args:
+            key: Object key
+            upload_id: Id returned by create_multipart_upload
+            parts: (part number, ETag) pairs in order
+        """
+        raise NotImplementedError
+
+    def abort_multipart_upload(self, key, upload_id):
+        """Discard a multipart upload and its parts."""
+        raise NotImplementedError
+
+    def download_folder(self, prefix, keys, local_dir):
+        """
+        Download several files of one folder in bulk. The caller verifies the results.
+
+        Args:
+            prefix: Folder prefix on the network volume
+            keys: Keys of files directly in the folder
+            local_dir: Local directory matching the folder
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove one object."""
+        raise NotImplementedError
+
+    def delete_many(self, keys):
+        """
+        Remove up to 1000 objects in one call.
+
+        Returns:
+            tuple: (set of keys confirmed deleted, dict of key to error message)
+        """
+        raise NotImplementedError
+
+
+class Boto3Transport(Transport):
+    """Backend using a Boto3 client with one pooled connection per worker thread."""
+
+    name = 'boto3'
+    supports_ranges = True
+    supports_verify = True
+    supports_relay = True
+
+    @staticmethod
+    def check():
+        """Check if Boto3 is installed."""
+        try:
+            import boto3
+            print(f"✓ Boto3 found: version {boto3.__version__}")
+            return True
+        except ImportError:
+            print("✗ Boto3 not found. Please install it first:")
+            print("  pip install boto3")
+            return False
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        import boto3
+        from botocore.config import Config
+        from botocore.exceptions import ClientError
+
+        self.client_error = ClientError
+        self.client = boto3.client(
+            's3',
+            aws_access_key_id=settings.ACCESS_KEY,
+            aws_secret_access_key=settings.SECRET_KEY,
+            region_name=self.region,
+            endpoint_url=settings.ENDPOINT_URL,
+            # One pooled connection per worker so threads never wait on each
+            # other; every download worker may be fetching PART_WORKERS ranges
+            config=Config(max_pool_connections=max(
+                10, settings.DOWNLOAD_WORKERS * max(1, settings.PART_WORKERS)
+                + settings.LIST_WORKERS + settings.LIST_SHARD_WORKERS))
+        )
+
+    def _call(self, operation, method, **request):
+        """Call a client method on the volume, translating ClientError."""
+        with self.timed(operation, request.get('Key', request.get('Prefix'))):
+            try:
+                return getattr(self.client, method)(Bucket=self.bucket, **request)
+            except self.client_error as e:
+                raise TransportError(str(e), e.response['Error']['Code']) from e
+
+    def head_bucket(self):
+        self._call('head', 'head_bucket')
+
+    def list_page(self, prefix, start_after=None):
+        # Use delimiter to list one level at a time (avoids pagination bug)
+        request = {'Prefix': prefix, 'Delimiter': '/'}
+        if start_after:
+            request['StartAfter'] = start_after
+        response = self._call('list', 'list_objects_v2', **request)
+        headers = response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+        return {
+            'Contents': response.get('Contents', []),
+            'CommonPrefixes': response.get('CommonPrefixes', []),
+            'IsTruncated': response.get('IsTruncated', False),
+            'ResponseBytes': int(headers.get('content-length', 0)),
+        }
+
+    def download(self, key, local_path, checksum=None):
+        if checksum is None:
+            with self.timed('get', key):
+                try:
+                    self.client.download_file(self.bucket, key, local_path)
+                except self.client_error as e:
+                    raise TransportError(str(e), e.response['Error']['Code']) from e
+            return
+        # download_file hides the bytes; stream the body to hash it on the way to disk
+        chunks = self._call('get', 'get_object', Key=key)['Body'].iter_chunks(1024 * 1024)
+        write_stream(key, local_path, chunks, checksum, self.span)
+
+    def get_range(self, key, start, end, etag=None):
+        request = {'Key': key, 'Range': f"bytes={start}-{end}"}
+        if etag:
+            request['IfMatch'] = etag
+        chunks = self._call('get', 'get_object', **request)['Body'].iter_chunks(1024 * 1024)
+        while True:
+            with self.span('body', key):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    def get_stream(self, key):
+        chunks = self._call('get', 'get_object', Key=key)['Body'].iter_chunks(1024 * 1024)
+        while True:
+            with self.span('body', key):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    def head_object(self, key):
+        response = self._call('head', 'head_object', Key=key)
+        return response['ContentLength'], response.get('ETag')
+
+    def first_part_size(self, key):
+        return self._call('head', 'head_object', Key=key, PartNumber=1)['ContentLength']
+
+    def put_object(self, key, body, digest):
+        return self._call('put', 'put_object', Key=key, Body=body,
+                          ContentMD5=base64.b64encode(digest).decode())['ETag']
+
+    def create_multipart_upload(self, key):
+        return self._call('put', 'create_multipart_upload', Key=key)['UploadId']
+
+    def upload_part(self, key, upload_id, number, body, digest):
+        return self._call('put', 'upload_part', Key=key, UploadId=upload_id, PartNumber=number, Body=body,
+                          ContentMD5=base64.b64encode(digest).decode())['ETag']
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        self._call('put', 'complete_multipart_upload', Key=key, UploadId=upload_id, MultipartUpload={
+            'Parts': [{'PartNumber': number, 'ETag': etag} for number, etag in parts]
+        })
+
+    def abort_multipart_upload(self, key, upload_id):
+        self._call('put', 'abort_multipart_upload', Key=key, UploadId=upload_id)
+
+    def delete(self, key):
+        self._call('delete', 'delete_object', Key=key)
+
+    def delete_many(self, keys):
+        response = self._call('delete', 'delete_objects', Delete={
+            'Objects': [{'Key': key} for key in keys], 'Quiet': False
+        })
+        deleted = {obj['Key'] for obj in response.get('Deleted', [])}
+        errors = {error['Key']: f"{error.get('Code')}: {error.get('Message')}"
+                  for error in response.get('Errors', [])}
+        return deleted, errors
+
+
+class AwsCliTransport(Transport):
+    """
+    Backend that runs the AWS CLI, one process per request.
+    Folders can be downloaded in bulk with a filtered `aws s3 cp --recursive`,
+    which saves one process launch per file.
+    """
+
+    name = 'cli'
+    supports_bulk = True
+
+    @staticmethod
+    def check():
+        """Check if AWS CLI is installed."""
+        try:
+            result = subprocess.run(
+                ['aws', '--version'],
+                capture_output=True,
+                text=True,
+                check=False
+            )
+            if result.returncode == 0:
+                print(f"✓ AWS CLI found: {result.stdout.strip()}")
+                return True
+            else:
+                print("✗ AWS CLI not responding correctly")
+                return False
+        except FileNotFoundError:
+            print("✗ AWS CLI not found. Please install it first:")
+            print("  pip install awscli")
+            print("  or visit: https://aws.amazon.com/cli/")
+            return False
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        # Credentials are passed to every aws process through its environment
+        self.env = dict(os.environ, AWS_ACCESS_KEY_ID=settings.ACCESS_KEY,
+                        AWS_SECRET_ACCESS_KEY=settings.SECRET_KEY)
+
+    def span_name(self, operation):
+        # Each span is a whole process, so the CLI's startup is part of it
+        return f"aws {operation}"
+
+    def run(self, operation, command, detail=None):
+        """
+        Execute an AWS CLI command against the endpoint and return the result.
+
+        Args:
+            operation: Operation name the launch is counted under
+            command: List of command arguments after 'aws'
+            detail: Key or prefix the command is for, shown in traces
+
+        Returns:
+            str: Standard output
+
+        Raises:
+            TransportError: If the command fails
+        """
+        command = ['aws'] + command + [
+            '--endpoint-url', self.settings.ENDPOINT_URL,
+            '--region', self.region  # AWS CLI expects lowercase region
+        ]
+        with self.timed(operation, detail):
+            try:
+                result = subprocess.run(command, capture_output=True, text=True, check=False, env=self.env)
+            except OSError as e:
+                raise TransportError(str(e)) from e
+            if result.returncode != 0:
+                error = result.stderr.strip()
+                code = next((code for code in ('NoSuchBucket', 'NoSuchKey', 'AccessDenied', 'SlowDown',
+                                               'ServiceUnavailable', '403', '404', '503')
+                             if code in error), None)
+                raise TransportError(error or f"aws exited with status {result.returncode}", code)
+        return result.stdout
+
+    def head_bucket(self):
+        self.run('head', ['s3api', 'head-bucket', '--bucket', self.bucket])
+
+    def head_object(self, key):
+        output = self.run('head', ['s3api', 'head-object', '--bucket', self.bucket, '--key', key,
+                                   '--output', 'json'], key)
+        response = json.loads(output) if output.strip() else {}
+        return response.get('ContentLength', 0), response.get('ETag')
+
+    def list_page(self, prefix, start_after=None):
+        # One ListObjectsV2 call per process; never follows continuation tokens
+        command = ['s3api', 'list-objects-v2', '--bucket', self.bucket, '--prefix', prefix,
+                   '--delimiter', '/', '--no-paginate', '--output', 'json']
+        if start_after:
+            command += ['--start-after', start_after]
+        output = self.run('list', command, prefix)
+        response = json.loads(output) if output.strip() else {}
+        return {
+            'Contents': response.get('Contents', []),
+            'CommonPrefixes': response.get('CommonPrefixes', []),
+            'IsTruncated': response.get('IsTruncated', False),
+            'ResponseBytes': len(output),
+        }
+
+    def download(self, key, local_path, checksum=None):
+        self.run('get', ['s3', 'cp', f"s3://{self.bucket}/{key}", local_path, '--only-show-errors'], key)
+
+    def download_folder(self, prefix, keys, local_dir):
+        # Only the given files are included, so subfolders and new files are left alone
+        command = ['s3', 'cp', f"s3://{self.bucket}/{prefix}", local_dir,
+                   '--recursive', '--only-show-errors', '--exclude', '*']
+        for key in keys:
+            command += ['--include', escape_filter_pattern(key[len(prefix):])]
+        self.run('get', command, f"{prefix} ({len(keys)} file(s))")
+
+    def delete(self, key):
+        self.run('delete', ['s3', 'rm', f"s3://{self.bucket}/{key}", '--only-show-errors'], key)
+
+    def delete_many(self, keys):
+        request = {'Objects': [{'Key': key} for key in keys], 'Quiet': False}
+        # Pass the key list as a file; it can exceed the per-argument length limit
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as request_file:
+            json.dump(request, request_file)
+        try:
+            output = self.run('delete', ['s3api', 'delete-objects', '--bucket', self.bucket,
+                                         '--delete', f"file://{request_file.name}", '--output', 'json'],
+                              f"{len(keys)} key(s)")
+        finally:
+            os.remove(request_file.name)
+        try:
+            response = json.loads(output) if output.strip() else {}
+        except ValueError:
+            response = {}
+        deleted = {obj['Key'] for obj in response.get('Deleted', [])}
+        errors = {obj['Key']: obj.get('Message', obj.get('Code')) for obj in response.get('Errors', [])}
+        return deleted, errors
+
+
+def write_stream(key, local_path, chunks, checksum, span):
+    """
+    Write a downloaded body to local_path through a temporary file, so a
+    broken or corrupt transfer never looks like a finished one.
+
+    Args:
+        key: Object key (detail of the trace spans)
+        local_path: Local destination path
+        chunks: Iterator over the body
+        checksum: StreamChecksum fed every chunk and verified before the rename, or None
+        span: Transport.span, recording body reads and disk writes
+
+    Raises:
+        ChecksumMismatch: If the body does not match the checksum
+    """
+    temp_path = local_path + '.download'
+    try:
+        with open(temp_path, 'wb') as local_file:
+            while True:
+                with span('body', key):
+                    chunk = next(chunks, None)
+                if not chunk:
+                    break
+                with span('write', key):
+                    local_file.write(chunk)
+                if checksum is not None:
+                    checksum.update(chunk)
+        if checksum is not None:
+            checksum.verify()
+        os.replace(temp_path, local_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def escape_filter_pattern(name):
+    """
+    Escape a file name for use as an AWS CLI --include pattern.
+
+    Args:
+        name: Literal file name
+
+    Returns:
+        str: Pattern that only matches the given name
+    """
+    return ''.join(f"[{char}]" if char in '*?[' else char for char in name)
+
+
+class SigV4Signer:
+    """AWS Signature Version 4 signing of path-style S3 requests to one endpoint."""
+
+    def __init__(self, settings):
+        """
+        Args:
+            settings: Settings with the endpoint, datacenter and credentials
+        """
+        endpoint = urlsplit(settings.ENDPOINT_URL)
+        self.secure = endpoint.scheme == 'https'
+        self.host = endpoint.netloc
+        self.base_path = endpoint.path.rstrip('/')
+        self.bucket = settings.NETWORK_VOLUME_ID
+        self.region = settings.DATACENTER.lower()
+        self.access_key = settings.ACCESS_KEY
+        self.secret_key = settings.SECRET_KEY
+        self.signing_keys = {}
+
+    def path(self, key=''):
+        """Return the unencoded request path of the volume or one of its objects."""
+        return f"{self.base_path}/{self.bucket}" + (f"/{key}" if key else '')
+
+    def _signing_key(self, date):
+        """Derive (and cache) the SigV4 signing key for a day."""
+        key = self.signing_keys.get(date)
+        if key is None:
+            key = ('AWS4' + self.secret_key).encode()
+            for part in (date, self.region, 's3', 'aws4_request'):
+                key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+            self.signing_keys = {date: key}
+        return key
+
+    def sign(self, method, path, query, headers, body=b''):
+        """
+        Add the host, SigV4 date, payload hash and Authorization headers to a request.
+
+        Args:
+            method: HTTP method
+            path: Unencoded request path
+            query: Dict of query parameters
+            headers: Dict of lowercase header names to values, updated in place
+            body: Request body
+
+        Returns:
+            str: Encoded request target (path and query string)
+        """
+        amz_date = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+        headers['host'] = self.host
+        headers['x-amz-date'] = amz_date
+        headers['x-amz-content-sha256'] = hashlib.sha256(body).hexdigest()
+
+        canonical_query = '&'.join(f"{quote(name, safe='')}={quote(value, safe='')}"
+                                   for name, value in sorted(query.items()))
+        signed_names = sorted(headers)
+        canonical_request = '\n'.join([
+            method,
+            quote(path),
+            canonical_query,
+            ''.join(f"{name}:{str(headers[name]).strip()}\n" for name in signed_names),
+            ';'.join(signed_names),
+            headers['x-amz-content-sha256'],
+        ])
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        string_to_sign = '\n'.join([
+            'AWS4-HMAC-SHA256', amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()
+        ])
+        signature = hmac.new(self._signing_key(amz_date[:8]), string_to_sign.encode(), hashlib.sha256).hexdigest()
+        headers['authorization'] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={';'.join(signed_names)}, Signature={signature}")
+        return quote(path) + (f"?{canonical_query}" if canonical_query else '')
+
+
+def list_query(prefix, start_after=None):
+    """Return the query parameters of a delimiter-based ListObjectsV2 request."""
+    # Use delimiter to list one level at a time (avoids pagination bug)
+    query = {'list-type': '2', 'prefix': prefix, 'delimiter': '/'}
+    if start_after:
+        query['start-after'] = start_after
+    return query
+
+
+def parse_list_page(body):
+    """Parse a ListObjectsV2 XML response into the dict returned by Transport.list_page."""
+    root = ElementTree.fromstring(body)
+    return {
+        'Contents': [
+            {'Key': entry.findtext('{*}Key'), 'Size': int(entry.findtext('{*}Size') or 0),
+             'ETag': entry.findtext('{*}ETag'), 'LastModified': entry.findtext('{*}LastModified')}
+            for entry in root.iterfind('{*}Contents')
+        ],
+        'CommonPrefixes': [{'Prefix': entry.findtext('{*}Prefix')} for entry in root.iterfind('{*}CommonPrefixes')],
+        'IsTruncated': root.findtext('{*}IsTruncated') == 'true',
+        'ResponseBytes': len(body),
+    }
+
+
+def delete_request(keys):
+    """
+    Build a DeleteObjects request.
+
+    Returns:
+        tuple: (XML body, dict of headers)
+    """
+    body = ('<Delete><Quiet>false</Quiet>'
+            + ''.join(f"<Object><Key>{escape(key)}</Key></Object>" for key in keys)
+            + '</Delete>').encode()
+    headers = {
+        'Content-Type': 'application/xml',
+        'Content-MD5': base64.b64encode(hashlib.md5(body).digest()).decode(),
+    }
+    return body, headers
+
+
+def parse_delete_result(body):
+    """
+    Parse a DeleteObjects XML response.
+
+    Returns:
+        tuple: (set of keys confirmed deleted, dict of key to error message)
+    """
+    root = ElementTree.fromstring(body)
+    deleted = {entry.findtext('{*}Key') for entry in root.iterfind('{*}Deleted')}
+    errors = {entry.findtext('{*}Key'): f"{entry.findtext('{*}Code')}: {entry.findtext('{*}Message')}"
+              for entry in root.iterfind('{*}Error')}
+    return deleted, errors
+
+
+def error_code(status, body):
+    """Return the S3 error code of an error response, or the status as a string."""
+    try:
+        return ElementTree.fromstring(body).findtext('{*}Code') or str(status)
+    except ElementTree.ParseError:
+        return str(status)
+
+
+class SigV4HttpTransport(Transport):
+    """
+    Minimal S3 client on http.client with AWS Signature Version 4.
+    Uses path-style URLs and one persistent connection per thread; a
+    connection the server closed while idle is reopened once per request.
+    """
+
+    name = 'http'
+    supports_ranges = True
+    supports_verify = True
+    supports_relay = True
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.signer = SigV4Signer(settings)
+        self.local = threading.local()
+
+    def for_volume(self, settings):
+        transport = super().for_volume(settings)
+        transport.signer = copy.copy(self.signer)
+        transport.signer.bucket = transport.bucket
+        return transport
+
+    def _connection(self, fresh=False):
+        """Return this thread's connection, opening a new one if needed."""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or fresh:
+            if connection is not None:
+                connection.close()
+            secure = self.signer.secure
+            connection_class = http.client.HTTPSConnection if secure else http.client.HTTPConnection
+            connection = connection_class(self.signer.host, timeout=60)
+            self.local.connection = connection
+        return connection
+
+    def _request(self, operation, method, key='', query=None, headers=None, body=b''):
+        """
+        Send a signed request and return the response with its body unread.
+
+        Raises:
+            TransportError: If the request fails or returns an error status
+        """
+        path = self.signer.path(key)
+        with self.timed(operation, key or (query or {}).get('prefix')):
+            for attempt in range(2):
+                request_headers = {name.lower(): value for name, value in (headers or {}).items()}
+                target = self.signer.sign(method, path, query or {}, request_headers, body)
+                connection = self._connection(fresh=attempt > 0)
+                try:
+                    connection.request(method, target, body=body or None, headers=request_headers)
+                    response = connection.getresponse()
+                    break
+                except (http.client.RemoteDisconnected, http.client.ImproperConnectionState,
+                        ConnectionResetError, BrokenPipeError) as e:
+                    # The server may close an idle keep-alive connection, and an abandoned
+                    # response leaves it unusable; retry once on a new connection
+                    if attempt:
+                        raise TransportError(f"{method} {path}: {e}") from e
+                except (OSError, http.client.HTTPException) as e:
+                    self._connection(fresh=True)
+                    raise TransportError(f"{method} {path}: {e}") from e
+
+            if response.status >= 300:
+                code = error_code(response.status, response.read())
+                raise TransportError(f"{method} {path} returned {response.status} ({code})", code)
+        return response
+
+    def head_bucket(self):
+        self._request('head', 'HEAD').read()
+
+    def list_page(self, prefix, start_after=None):
+        return parse_list_page(self._request('list', 'GET', query=list_query(prefix, start_after)).read())
+
+    def download(self, key, local_path, checksum=None):
+        response = self._request('get', 'GET', key)
+        try:
+            write_stream(key, local_path, iter(lambda: response.read(1024 * 1024), b''), checksum, self.span)
+        except BaseException:
+            self._connection(fresh=True)
+            raise
+
+    def get_range(self, key, start, end, etag=None):
+        headers = {'Range': f"bytes={start}-{end}"}
+        if etag:
+            headers['If-Match'] = etag
+        response = self._request('get', 'GET', key, headers=headers)
+        while True:
+            with self.span('body', key):
+                chunk = response.read(1024 * 1024)
+            if not chunk:
+                return
+            yield chunk
+
+    def get_stream(self, key):
+        response = self._request('get', 'GET', key)
+        try:
+            while True:
+                with self.span('body', key):
+                    chunk = response.read(1024 * 1024)
+                if not chunk:
+                    return
+                yield chunk
+        except BaseException:
+            # Abandoned mid-body (e.g. a failed upload); the connection cannot be reused
+            self._connection(fresh=True)
+            raise
+
+    def head_object(self, key):
+        response = self._request('head', 'HEAD', key)
+        response.read()
+        return int(response.getheader('Content-Length') or 0), response.getheader('ETag')
+
+    def first_part_size(self, key):
+        response = self._request('head', 'HEAD', key, query={'partNumber': '1'})
+        response.read()
+        return int(response.getheader('Content-Length') or 0) or None
+
+    def put_object(self, key, body, digest):
+        response = self._request('put', 'PUT', key, headers={'Content-MD5': base64.b64encode(digest).decode()},
+                                 body=body)
+        response.read()
+        return response.getheader('ETag')
+
+    def create_multipart_upload(self, key):
+        body = self._request('put', 'POST', key, query={'uploads': ''}).read()
+        return ElementTree.fromstring(body).findtext('{*}UploadId')
+
+    def upload_part(self, key, upload_id, number, body, digest):
+        response = self._request('put', 'PUT', key, query={'partNumber': str(number), 'uploadId': upload_id},
+                                 headers={'Content-MD5': base64.b64encode(digest).decode()}, body=body)
+        response.read()
+        return response.getheader('ETag')
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        body = ('<CompleteMultipartUpload>'
+                + ''.join(f"<Part><PartNumber>{number}</PartNumber><ETag>{escape(etag)}</ETag></Part>"
+                          for number, etag in parts)
+                + '</CompleteMultipartUpload>').encode()
+        result = self._request('put', 'POST', key, query={'uploadId': upload_id},
+                               headers={'Content-Type': 'application/xml'}, body=body).read()
+        # Completion can fail after the 200 status was sent; the error is then in the body
+        root = ElementTree.fromstring(result)
+        if root.tag.rpartition('}')[2] == 'Error':
+            code = root.findtext('{*}Code') or root.findtext('Code')
+            raise TransportError(f"completing the upload of {key} failed ({code})", code)
+
+    def abort_multipart_upload(self, key, upload_id):
+        self._request('put', 'DELETE', key, query={'uploadId': upload_id}).read()
+
+    def delete(self, key):
+        self._request('delete', 'DELETE', key).read()
+
+    def delete_many(self, keys):
+        body, headers = delete_request(keys)
+        return parse_delete_result(self._request('delete', 'POST', query={'delete': ''},
+                                                 headers=headers, body=body).read())
+
+
+TRANSPORTS = {
+    'cli': AwsCliTransport,
+    'boto3': Boto3Transport,
+    'http': SigV4HttpTransport,
+}
+
+
+def probe_transports(settings, names=None):
+    """
+    Time each available backend against the endpoint and return the fastest.
+    Every backend lists the remote folder PROBE_REQUESTS times after one
+    warm-up request; the median latency decides, since per-request overhead
+    dominates when many small files are synced.
+
+    Args:
+        settings: Settings with the volume, endpoint and credentials
+        names: Backend names to try, or None for all
+
+    Returns:
+        Transport: Fastest working backend, or None if none works
+    """
+    prefix = settings.REMOTE_FOLDER.rstrip('/') + '/' if settings.REMOTE_FOLDER else ''
+    best = None
+    best_latency = None
+    for name in names or TRANSPORTS:
+        transport_class = TRANSPORTS[name]
+        if not transport_class.check():
+            continue
+        try:
+            transport = transport_class(settings)
+            transport.head_bucket()
+            timings = []
+            for _ in range(max(1, settings.PROBE_REQUESTS)):
+                start = time.monotonic()
+                transport.list_page(prefix)
+                timings.append(time.monotonic() - start)
+        except Exception as e:
+            print(f"⚠ Backend {name} failed the probe: {e}")
+            continue
+        latency = statistics.median(timings)
+        print(f"  Backend {name}: {latency * 1000:.1f} ms per listing")
+        if best is None or latency < best_latency:
+            best, best_latency = transport, latency
+    if best is not None:
+        print(f"✓ Selected backend: {best.name}")
+    return best
+
+
+def create_transport(settings):
+    """
+    Create the backend named by settings.TRANSPORT, probing all of them for 'auto'.
+
+    Returns:
+        Transport: Backend, or None if its prerequisites are missing
+    """
+    if settings.TRANSPORT == 'auto':
+        print("Probing transport backends...")
+        return probe_transports(settings)
+    transport_class = TRANSPORTS.get(settings.TRANSPORT)
+    if transport_class is None:
+        print(f"✗ Unknown transport '{settings.TRANSPORT}' (choose from: auto, {', '.join(TRANSPORTS)})")
+        return None
+    if not transport_class.check():
+        return None
+    return transport_class(settings)
@@ -0,0 +1,168 @@
+"""
+Local trigger endpoint for the Runpod network volume downloaders.
+
+With TRIGGER_PORT (HTTP on TRIGGER_HOST) or TRIGGER_SOCKET (HTTP over a Unix
+socket) set, producers such as a ComfyUI post-save hook can announce the keys
+they just wrote:
+
+    curl -X POST --data-binary 'ComfyUI/output/ComfyUI_00001_.png' http://127.0.0.1:9467/keys
+    curl -X POST --unix-socket /tmp/runpod-sync.sock -d '{"keys": ["ComfyUI/output/a.png"]}' http://localhost/keys
+
+The body is one key per line, or JSON {"keys": [...]}. Keys are full keys on
+the volume. run() fetches and removes announced keys right away instead of
+waiting for the next listing: keys announced during a cycle join its work
+queue, the others are fetched between cycles. Polling keeps running as a
+reconciliation sweep for files that were never announced or whose fast-path
+download failed.
+"""
+
+import json
+import os
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 1024 * 1024
+
+
+def parse_keys(body, content_type=''):
+    """
+    Parse the keys of a trigger request.
+
+    Args:
+        body: Request body
+        content_type: Content-Type header of the request
+
+    Returns:
+        list: Keys in the order given
+
+    Raises:
+        ValueError: If the body is not valid UTF-8 or malformed JSON
+    """
+    text = body.decode('utf-8')
+    if 'json' in content_type or text.lstrip().startswith('{'):
+        data = json.loads(text)
+        keys = data.get('keys') if isinstance(data, dict) else None
+        if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+            raise ValueError("expected {\"keys\": [\"...\"]}")
+    else:
+        keys = text.splitlines()
+    return [key.strip() for key in keys if key.strip()]
+
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    """Threaded HTTP server on a Unix socket."""
+    daemon_threads = True
+
+
+class TriggerServer:
+    """
+    Receives announced keys from producers and hands them to run() in batches.
+    A key announced again before it is taken is only kept once.
+    """
+
+    def __init__(self, settings):
+        """
+        Args:
+            settings: Settings with TRIGGER_PORT, TRIGGER_HOST and TRIGGER_SOCKET
+        """
+        self.settings = settings
+        self.condition = threading.Condition()
+        self.keys = {}  # dict as an insertion-ordered set
+        self.server = None
+
+    @property
+    def address(self):
+        """Describe where producers reach the endpoint."""
+        if self.settings.TRIGGER_SOCKET:
+            return f"unix:{self.settings.TRIGGER_SOCKET} /keys"
+        return f"http://{self.settings.TRIGGER_HOST}:{self.settings.TRIGGER_PORT}/keys"
+
+    def add(self, keys):
+        """Queue announced keys and wake up wait()."""
+        with self.condition:
+            for key in keys:
+                self.keys[key] = None
+            self.condition.notify_all()
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds for announced keys and take all of them.
+
+        Returns:
+            list: Keys announced since the last call (empty on timeout)
+        """
+        with self.condition:
+            if not self.keys:
+                self.condition.wait(timeout)
+            keys, self.keys = list(self.keys), {}
+            return keys
+
+    def wake(self):
+        """Wake up wait() without keys, so a cycle that stops taking them need not wait out its timeout."""
+        with self.condition:
+            self.condition.notify_all()
+
+    def serve(self):
+        """
+        Serve POST /keys from a daemon thread.
+
+        Raises:
+            OSError: If the address cannot be bound
+        """
+        trigger = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def reply(self, status, message):
+                body = (message + '\n').encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/plain; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path.split('?')[0] != '/keys':
+                    self.reply(404, "POST keys to /keys")
+                    return
+                length = int(self.headers.get('Content-Length') or 0)
+                if length > MAX_BODY_SIZE:
+                    self.reply(413, f"body larger than {MAX_BODY_SIZE} bytes")
+                    return
+                try:
+                    keys = parse_keys(self.rfile.read(length), self.headers.get('Content-Type', ''))
+                except ValueError as e:
+                    self.reply(400, f"cannot parse keys: {e}")
+                    return
+                trigger.add(keys)
+                self.reply(202, f"queued {len(keys)} key(s)")
+
+        socket_path = self.settings.TRIGGER_SOCKET
+        if socket_path:
+            # Replace a socket left behind by an earlier run
+            try:
+                os.unlink(socket_path)
+            except FileNotFoundError:
+                pass
+            self.server = UnixHTTPServer(socket_path, Handler)
+            os.chmod(socket_path, 0o660)
+        else:
+            self.server = ThreadingHTTPServer((self.settings.TRIGGER_HOST, self.settings.TRIGGER_PORT), Handler)
+            self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        """Stop serving and remove the Unix socket."""
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        if self.settings.TRIGGER_SOCKET:
+            try:
+                os.unlink(self.settings.TRIGGER_SOCKET)
+            except FileNotFoundError:
+                pass